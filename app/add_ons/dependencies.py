@@ -3,6 +3,7 @@ Add-ons dependencies for FastAPI route protection.
 
 Provides reusable dependencies to enforce add-on requirements.
 """
+import asyncio
 from fastapi import Depends, HTTPException, status
 from typing import Tuple
 import structlog
@@ -49,7 +50,7 @@ async def require_sync_addon(
     """
     user_id, _ = current_user
 
-    if not add_ons_service.is_add_on_active(user_id, AddOnType.SYNC):
+    if not await asyncio.to_thread(add_ons_service.is_add_on_active, user_id, AddOnType.SYNC):
         logger.warning(
             "sync_addon_required",
             user_id=user_id,
@@ -89,7 +90,7 @@ async def require_ai_addon(
     """
     user_id, _ = current_user
 
-    if not add_ons_service.is_add_on_active(user_id, AddOnType.AI):
+    if not await asyncio.to_thread(add_ons_service.is_add_on_active, user_id, AddOnType.AI):
         logger.warning(
             "ai_addon_required",
             user_id=user_id,
@@ -134,7 +135,7 @@ async def check_add_on(
         True if add-on is active
     """
     user_id, _ = current_user
-    return add_ons_service.is_add_on_active(user_id, add_on_type)
+    return await asyncio.to_thread(add_ons_service.is_add_on_active, user_id, add_on_type)
 
 
 async def get_user_feature_flags(
@@ -164,5 +165,5 @@ async def get_user_feature_flags(
         FeatureFlags object
     """
     user_id, _ = current_user
-    flags_response = add_ons_service.get_feature_flags(user_id)
+    flags_response = await asyncio.to_thread(add_ons_service.get_feature_flags, user_id)
     return flags_response.flags
@@ -3,6 +3,7 @@ Add-ons API routes.
 
 Provides endpoints for querying add-on status and feature flags.
 """
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import Tuple
 import structlog
@@ -50,7 +51,7 @@ async def get_add_ons_status(
     user_id, _ = current_user
 
     try:
-        status = add_ons_service.get_add_ons_status(user_id)
+        status = await asyncio.to_thread(add_ons_service.get_add_ons_status, user_id)
         return status
 
     except Exception as e:
@@ -80,7 +81,7 @@ async def get_feature_flags(
     user_id, _ = current_user
 
     try:
-        flags = add_ons_service.get_feature_flags(user_id)
+        flags = await asyncio.to_thread(add_ons_service.get_feature_flags, user_id)
         return flags
 
     except Exception as e:
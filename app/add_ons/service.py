@@ -91,7 +91,7 @@ class AddOnsService:
         """
         try:
             # Get add-ons from master database
-            add_ons_data = self.master_db.get_user_add_ons(user_id)
+            add_ons_data = self.master_db.get_user_add_ons(user_id, include_details=False)
 
             # Build feature flags
             flags = FeatureFlags(
@@ -165,7 +165,7 @@ class AddOnsService:
             True if activated successfully
         """
         try:
-            return self.master_db.activate_add_on(
+            activated = self.master_db.activate_add_on(
                 user_id=user_id,
                 add_on_type=add_on_type.value,
                 platform=platform.value,
@@ -177,6 +177,13 @@ class AddOnsService:
                 auto_renew=auto_renew
             )
 
+            if activated and add_on_type == AddOnType.AI:
+                # Inference quota caches the tier; make the upgrade visible now
+                from app.inference.service import invalidate_user_tier
+                invalidate_user_tier(user_id)
+
+            return activated
+
         except Exception as e:
             logger.error(
                 "activate_add_on_failed",
@@ -4,6 +4,7 @@ Authentication dependencies for FastAPI.
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Tuple
+import structlog
 
 from app.auth.crypto import verify_token
 
@@ -51,4 +52,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Every later log event of this request carries the caller
+    structlog.contextvars.bind_contextvars(user_id=user_id, device_id=device_id)
+
     return user_id, device_id
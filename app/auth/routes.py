@@ -1,8 +1,9 @@
 """
 Authentication API routes for OAuth-based authentication.
 """
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status, Form
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from typing import Tuple
 import structlog
 
@@ -146,7 +147,7 @@ async def refresh_token(
 
     Both access_token and refresh_token are rotated for security.
     """
-    result = auth_service.refresh_access_token(request.refresh_token)
+    result = await asyncio.to_thread(auth_service.refresh_access_token, request.refresh_token)
 
     if not result:
         raise HTTPException(
@@ -172,8 +173,10 @@ async def list_devices(
     user_id, _ = current_user
 
     try:
-        devices = auth_service.get_user_devices(user_id)
-        return DevicesResponse(devices=devices)
+        devices = await asyncio.to_thread(auth_service.get_user_devices, user_id)
+        # The DeviceInfo models are already validated; returning a response
+        # skips FastAPI's second dump-and-validate pass over response_model
+        return ORJSONResponse(DevicesResponse(devices=devices).model_dump())
 
     except Exception as e:
         logger.error("list_devices_error", user_id=user_id, error=str(e))
@@ -251,7 +254,7 @@ async def get_current_user_info(
     user_id, _ = current_user
 
     try:
-        user_info = auth_service.get_user_info(user_id)
+        user_info = await asyncio.to_thread(auth_service.get_user_info, user_id)
 
         if not user_info:
             raise HTTPException(
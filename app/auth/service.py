@@ -1,6 +1,7 @@
 """
 Authentication service business logic for OAuth-based authentication.
 """
+import asyncio
 import time
 import uuid
 import structlog
@@ -83,7 +84,8 @@ class AuthService:
         user_id = await self._get_or_create_user(oauth_user_info)
 
         # Step 3: Register device
-        self.master_db.register_device(
+        await asyncio.to_thread(
+            self.master_db.register_device,
             device_id=request.device_id,
             user_id=user_id,
             device_name=request.device_name,
@@ -95,7 +97,9 @@ class AuthService:
         await self.user_db_manager.create_user_database(user_id)
 
         # Step 5: Get user's add-ons
-        add_ons_data = self.master_db.get_user_add_ons(user_id)
+        add_ons_data = await asyncio.to_thread(
+            self.master_db.get_user_add_ons, user_id, include_details=False
+        )
         add_ons = UserAddOns(
             sync_enabled=add_ons_data["sync_enabled"],
             ai_enabled=add_ons_data["ai_enabled"],
@@ -197,7 +201,8 @@ class AuthService:
             User ID (UUID)
         """
         # Check if user exists
-        existing_user = self.master_db.get_user_by_provider(
+        existing_user = await asyncio.to_thread(
+            self.master_db.get_user_by_provider,
             provider=oauth_user_info.provider,
             provider_user_id=oauth_user_info.provider_user_id
         )
@@ -213,7 +218,8 @@ class AuthService:
         # Create new user
         user_id = str(uuid.uuid4())
 
-        self.master_db.create_user(
+        await asyncio.to_thread(
+            self.master_db.create_user,
             user_id=user_id,
             provider=oauth_user_info.provider,
             provider_user_id=oauth_user_info.provider_user_id,
@@ -331,7 +337,7 @@ class AuthService:
             True if deleted successfully
         """
         try:
-            result = self.master_db.delete_device(device_id, user_id)
+            result = await asyncio.to_thread(self.master_db.delete_device, device_id, user_id)
             logger.info("device_deleted", user_id=user_id, device_id=device_id)
             return result
 
@@ -354,7 +360,7 @@ class AuthService:
             if not user:
                 return None
 
-            add_ons_data = self.master_db.get_user_add_ons(user_id)
+            add_ons_data = self.master_db.get_user_add_ons(user_id, include_details=False)
             add_ons = UserAddOns(
                 sync_enabled=add_ons_data["sync_enabled"],
                 ai_enabled=add_ons_data["ai_enabled"],
@@ -1,6 +1,8 @@
 """
 Application configuration management.
 """
+import logging
+
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -13,6 +15,7 @@ class Settings(BaseSettings):
     environment: str = "development"
     debug: bool = False
     log_level: str = "info"
+    log_response_fingerprint: bool = False  # BLAKE2b fingerprint of LLM output in INFO logs
 
     # Server
     host: str = "0.0.0.0"
@@ -28,6 +31,13 @@ class Settings(BaseSettings):
     embedded_replica: bool = True
     sync_interval: int = 60  # seconds
     max_cached_connections: int = 100
+    master_db_pool_size: int = 8  # concurrent master DB connections
+    add_on_cache_ttl_seconds: int = 10  # is_add_on_active result cache; 0 disables
+    # SQLite tuning applied to local replica connections
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_size: int = -16000  # negative = KiB
+    sqlite_busy_timeout_ms: int = 10000
 
     # Authentication
     jwt_secret: str
@@ -49,6 +59,10 @@ class Settings(BaseSettings):
     openai_api_key: Optional[str] = None
     gemini_api_key: Optional[str] = None
 
+    # Outbound HTTP pool shared by the LLM providers
+    http_max_connections: int = 200
+    http_max_keepalive_connections: int = 50
+
     # Payment Configuration (Optional)
     apple_shared_secret: Optional[str] = None
     google_service_account_json: Optional[str] = None
@@ -69,6 +83,12 @@ class Settings(BaseSettings):
     # E2EE Inference Rate Limiting
     inference_free_tier_daily_limit: int = 100
     inference_paid_tier_daily_limit: int = 5000
+    inference_quota_flush_interval_ms: int = 500  # batch window for quota writes
+    inference_tier_cache_ttl_seconds: int = 60
+    inference_warm_up_timeout_seconds: float = 5.0  # 0 disables startup warm-up
+    inference_result_cache_size: int = 1024  # 0 disables the task result cache
+    inference_result_cache_ttl_seconds: int = 600
+    inference_max_content_chars: int = 32_000  # longer entries are rejected
 
     # General Rate Limiting
     rate_limit_per_minute: int = 100
@@ -81,6 +101,11 @@ class Settings(BaseSettings):
     # Storage
     data_dir: str = "./data"
 
+    @property
+    def log_level_value(self) -> int:
+        """Numeric logging level for log_level; unknown names fall back to INFO."""
+        return logging.getLevelNamesMapping().get(self.log_level.upper(), logging.INFO)
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -3,7 +3,7 @@ Turso database manager with per-user database architecture.
 Each user gets their own SQLite database in Turso.
 """
 import asyncio
-import httpx
+import sqlite3
 import structlog
 from functools import lru_cache
 from typing import Dict, Optional, List
@@ -12,11 +12,154 @@ from pathlib import Path
 import libsql
 
 from app.config import settings
+from app.http_client import get_http_client
 
 
 logger = structlog.get_logger()
 
 
+def connection_pragmas() -> tuple:
+    """PRAGMA statements applied to every local SQLite connection."""
+    return (
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        "PRAGMA temp_store=MEMORY",
+        f"PRAGMA cache_size={settings.sqlite_cache_size}",
+        f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+        "PRAGMA foreign_keys=ON",
+    )
+
+
+def apply_pragmas(conn, pragmas) -> None:
+    """
+    Apply PRAGMA statements to a connection.
+
+    Failures are logged and skipped; a pragma the backend does not support
+    must not prevent the connection from being used.
+    """
+    for pragma in pragmas:
+        try:
+            conn.execute(pragma)
+        except Exception as e:
+            logger.warning("pragma_failed", pragma=pragma, error=str(e))
+
+
+def _is_comment_only(sql: str) -> bool:
+    """True if a SQL fragment holds nothing but '--' comments and whitespace."""
+    return all(
+        not line.strip() or line.lstrip().startswith("--")
+        for line in sql.splitlines()
+    )
+
+
+def split_sql_script(sql: str) -> tuple:
+    """
+    Split a SQL script into individual statements.
+
+    A ';' only ends a statement where sqlite3.complete_statement agrees, so
+    semicolons inside string literals or comments are kept. Comment-only
+    fragments are dropped, since libsql rejects them.
+
+    Raises:
+        ValueError: If the script ends inside an unterminated statement
+            (e.g. an open string literal). Migrations are split at import,
+            so such a typo fails at startup instead of mid-migration.
+    """
+    statements = []
+    pending = ""
+    for piece in sql.split(";"):
+        pending += piece
+        if not sqlite3.complete_statement(pending + ";"):
+            pending += ";"
+            continue
+        if not _is_comment_only(pending):
+            statements.append(pending.strip())
+        pending = ""
+
+    # Drop the ';' appended after the final piece, which had none
+    leftover = pending[:-1]
+    if leftover and not _is_comment_only(leftover):
+        raise ValueError(f"Incomplete SQL statement: {leftover.strip()[:60]!r}")
+    return tuple(statements)
+
+
+_MIGRATION_V001_SQL = """
+-- Schema version tracking
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    applied_at INTEGER NOT NULL
+);
+
+-- Device information
+CREATE TABLE IF NOT EXISTS device_info (
+    device_id TEXT PRIMARY KEY,
+    device_name TEXT,
+    device_type TEXT,
+    platform TEXT,
+    public_key TEXT NOT NULL,
+    last_sync_at INTEGER,
+    created_at INTEGER NOT NULL
+);
+
+-- Synced entries (encrypted)
+CREATE TABLE IF NOT EXISTS synced_entries (
+    id TEXT PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    encrypted_data BLOB NOT NULL,
+    version INTEGER NOT NULL,
+    vector_clock TEXT,
+    is_deleted INTEGER DEFAULT 0,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    FOREIGN KEY (device_id) REFERENCES device_info(device_id)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_updated ON synced_entries(updated_at);
+CREATE INDEX IF NOT EXISTS idx_entries_deleted ON synced_entries(is_deleted, updated_at);
+
+-- Synced memories (encrypted)
+CREATE TABLE IF NOT EXISTS synced_memories (
+    id TEXT PRIMARY KEY,
+    encrypted_data BLOB NOT NULL,
+    version INTEGER NOT NULL,
+    is_deleted INTEGER DEFAULT 0,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_memories_updated ON synced_memories(updated_at);
+
+-- Synced tags (encrypted)
+CREATE TABLE IF NOT EXISTS synced_tags (
+    id TEXT PRIMARY KEY,
+    entry_id TEXT NOT NULL,
+    encrypted_data BLOB NOT NULL,
+    version INTEGER NOT NULL,
+    is_deleted INTEGER DEFAULT 0,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tags_entry ON synced_tags(entry_id);
+CREATE INDEX IF NOT EXISTS idx_tags_updated ON synced_tags(updated_at);
+
+-- LLM usage tracking
+CREATE TABLE IF NOT EXISTS llm_usage (
+    id TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cost_usd REAL,
+    created_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_usage_date ON llm_usage(created_at);
+
+-- Record migration
+INSERT INTO schema_version (version, applied_at)
+VALUES (1, strftime('%s', 'now'));
+"""
+
+# Split once at import; migrations run on every new user database
+_MIGRATION_V001_STATEMENTS = split_sql_script(_MIGRATION_V001_SQL)
+
+
 class TursoDatabaseManager:
     """
     Manages per-user Turso databases with embedded replicas.
@@ -34,6 +177,10 @@ class TursoDatabaseManager:
         self.embedded_replica = settings.embedded_replica
         self.sync_interval = settings.sync_interval
         self._connections: Dict[str, any] = {}
+        # URL pieces are fixed per process; bind them once
+        self._url_prefix = "libsql://"
+        self._url_suffix = f"-{self.turso_org_url}"
+        self._pragmas = connection_pragmas()
         self.data_dir = Path(settings.data_dir)
         self.data_dir.mkdir(exist_ok=True)
 
@@ -50,7 +197,7 @@ class TursoDatabaseManager:
 
     def _get_db_url(self, db_name: str) -> str:
         """Generate Turso database URL."""
-        return f"libsql://{db_name}-{self.turso_org_url}"
+        return self._url_prefix + db_name + self._url_suffix
 
     def _get_local_replica_path(self, db_name: str) -> str:
         """Get path for local embedded replica."""
@@ -98,21 +245,27 @@ class TursoDatabaseManager:
             if self.embedded_replica:
                 # Use embedded replica for local caching
                 local_path = self._get_local_replica_path(db_name)
+                has_local_copy = Path(local_path).exists()
                 conn = libsql.connect(
                     local_path,
                     sync_url=db_url,
-                    auth_token=self.auth_token
+                    auth_token=self.auth_token,
+                    sync_interval=self.sync_interval
                 )
-                # Sync with remote database
-                conn.sync()
-                logger.info("database_connected_with_replica", user_id=user_id, db_name=db_name)
+                # Freshness is maintained by libsql's background sync; only a
+                # brand-new replica needs a blocking pull so the schema check
+                # below sees the remote state.
+                if not has_local_copy:
+                    conn.sync()
+                apply_pragmas(conn, self._pragmas)
+                logger.debug("database_connected_with_replica", user_id=user_id, db_name=db_name)
             else:
                 # Direct connection without replica
                 conn = libsql.connect(
                     db_url,
                     auth_token=self.auth_token
                 )
-                logger.info("database_connected", user_id=user_id, db_name=db_name)
+                logger.debug("database_connected", user_id=user_id, db_name=db_name)
 
             # Store connection
             self._connections[db_name] = conn
@@ -139,40 +292,40 @@ class TursoDatabaseManager:
         db_name = self._get_db_name(user_id)
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"https://api.turso.tech/v1/organizations/{self.turso_org_url.split('.')[0]}/databases",
-                    headers={
-                        "Authorization": f"Bearer {self.auth_token}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "name": db_name,
-                        "group": "default"
-                    },
-                    timeout=30.0
-                )
+            client = get_http_client()
+            response = await client.post(
+                f"https://api.turso.tech/v1/organizations/{self.turso_org_url.split('.')[0]}/databases",
+                headers={
+                    "Authorization": f"Bearer {self.auth_token}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "name": db_name,
+                    "group": "default"
+                },
+                timeout=30.0
+            )
+
+            if response.status_code in (200, 201):
+                logger.info("database_created", user_id=user_id, db_name=db_name)
 
-                if response.status_code in (200, 201):
-                    logger.info("database_created", user_id=user_id, db_name=db_name)
-
-                    # Initialize schema
-                    db = self.get_user_db(user_id)
-                    self._ensure_schema(db, user_id)
-
-                    return True
-                elif response.status_code == 409:
-                    # Database already exists
-                    logger.info("database_already_exists", user_id=user_id, db_name=db_name)
-                    return True
-                else:
-                    logger.error(
-                        "database_creation_failed",
-                        user_id=user_id,
-                        status=response.status_code,
-                        response=response.text
-                    )
-                    return False
+                # Initialize schema
+                db = self.get_user_db(user_id)
+                self._ensure_schema(db, user_id)
+
+                return True
+            elif response.status_code == 409:
+                # Database already exists
+                logger.info("database_already_exists", user_id=user_id, db_name=db_name)
+                return True
+            else:
+                logger.error(
+                    "database_creation_failed",
+                    user_id=user_id,
+                    status=response.status_code,
+                    response=response.text
+                )
+                return False
 
         except Exception as e:
             logger.error("database_creation_error", user_id=user_id, error=str(e))
@@ -192,48 +345,48 @@ class TursoDatabaseManager:
         db_name = self._get_db_name(user_id)
 
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"https://api.turso.tech/v1/organizations/{self.turso_org_url.split('.')[0]}/databases/{db_name}/auth/tokens"
-                if expiration != "never":
-                    url += f"?expiration={expiration}"
-
-                # Retry loop
-                max_retries = 3
-                for attempt in range(max_retries):
-                    response = await client.post(
-                        url,
-                        headers={
-                            "Authorization": f"Bearer {self.auth_token}",
-                        },
-                        timeout=10.0
-                    )
+            client = get_http_client()
+            url = f"https://api.turso.tech/v1/organizations/{self.turso_org_url.split('.')[0]}/databases/{db_name}/auth/tokens"
+            if expiration != "never":
+                url += f"?expiration={expiration}"
+
+            # Retry loop
+            max_retries = 3
+            for attempt in range(max_retries):
+                response = await client.post(
+                    url,
+                    headers={
+                        "Authorization": f"Bearer {self.auth_token}",
+                    },
+                    timeout=10.0
+                )
                     
-                    if response.status_code == 200:
-                        break # Success
+                if response.status_code == 200:
+                    break # Success
                         
-                    if response.status_code == 404 and attempt < max_retries - 1:
-                        # Database might not be ready yet
-                        logger.warning("token_creation_retry", attempt=attempt+1, user_id=user_id, url=url)
-                        await asyncio.sleep(2.0)
-                        continue
+                if response.status_code == 404 and attempt < max_retries - 1:
+                    # Database might not be ready yet
+                    logger.warning("token_creation_retry", attempt=attempt+1, user_id=user_id, url=url)
+                    await asyncio.sleep(2.0)
+                    continue
                     
-                    # Stop if other error or max retries
-                    break
-
-                if response.status_code == 200:
-                    data = response.json()
-                    token = data.get("jwt")
-                    logger.info("token_created", user_id=user_id, db_name=db_name)
-                    return token
-                else:
-                    logger.error(
-                        "token_creation_failed",
-                        user_id=user_id,
-                        status=response.status_code,
-                        url=url,
-                        response=response.text
-                    )
-                    return None
+                # Stop if other error or max retries
+                break
+
+            if response.status_code == 200:
+                data = response.json()
+                token = data.get("jwt")
+                logger.info("token_created", user_id=user_id, db_name=db_name)
+                return token
+            else:
+                logger.error(
+                    "token_creation_failed",
+                    user_id=user_id,
+                    status=response.status_code,
+                    url=url,
+                    response=response.text
+                )
+                return None
 
         except Exception as e:
             logger.error("token_creation_error", user_id=user_id, error=str(e))
@@ -269,7 +422,7 @@ class TursoDatabaseManager:
                 version_rows = result.fetchall()
 
                 current_version = version_rows[0][0] if version_rows else 0
-                logger.info("schema_version_check", user_id=user_id, version=current_version)
+                logger.debug("schema_version_check", user_id=user_id, version=current_version)
 
                 # Run any pending migrations
                 if current_version < 1:
@@ -281,90 +434,16 @@ class TursoDatabaseManager:
 
     def _run_migration_v001(self, conn) -> None:
         """Run initial schema migration."""
-        migration_sql = """
-        -- Schema version tracking
-        CREATE TABLE IF NOT EXISTS schema_version (
-            version INTEGER PRIMARY KEY,
-            applied_at INTEGER NOT NULL
-        );
-
-        -- Device information
-        CREATE TABLE IF NOT EXISTS device_info (
-            device_id TEXT PRIMARY KEY,
-            device_name TEXT,
-            device_type TEXT,
-            platform TEXT,
-            public_key TEXT NOT NULL,
-            last_sync_at INTEGER,
-            created_at INTEGER NOT NULL
-        );
-
-        -- Synced entries (encrypted)
-        CREATE TABLE IF NOT EXISTS synced_entries (
-            id TEXT PRIMARY KEY,
-            device_id TEXT NOT NULL,
-            encrypted_data BLOB NOT NULL,
-            version INTEGER NOT NULL,
-            vector_clock TEXT,
-            is_deleted INTEGER DEFAULT 0,
-            created_at INTEGER NOT NULL,
-            updated_at INTEGER NOT NULL,
-            FOREIGN KEY (device_id) REFERENCES device_info(device_id)
-        );
-        CREATE INDEX IF NOT EXISTS idx_entries_updated ON synced_entries(updated_at);
-        CREATE INDEX IF NOT EXISTS idx_entries_deleted ON synced_entries(is_deleted, updated_at);
-
-        -- Synced memories (encrypted)
-        CREATE TABLE IF NOT EXISTS synced_memories (
-            id TEXT PRIMARY KEY,
-            encrypted_data BLOB NOT NULL,
-            version INTEGER NOT NULL,
-            is_deleted INTEGER DEFAULT 0,
-            created_at INTEGER NOT NULL,
-            updated_at INTEGER NOT NULL
-        );
-        CREATE INDEX IF NOT EXISTS idx_memories_updated ON synced_memories(updated_at);
-
-        -- Synced tags (encrypted)
-        CREATE TABLE IF NOT EXISTS synced_tags (
-            id TEXT PRIMARY KEY,
-            entry_id TEXT NOT NULL,
-            encrypted_data BLOB NOT NULL,
-            version INTEGER NOT NULL,
-            is_deleted INTEGER DEFAULT 0,
-            created_at INTEGER NOT NULL,
-            updated_at INTEGER NOT NULL
-        );
-        CREATE INDEX IF NOT EXISTS idx_tags_entry ON synced_tags(entry_id);
-        CREATE INDEX IF NOT EXISTS idx_tags_updated ON synced_tags(updated_at);
-
-        -- LLM usage tracking
-        CREATE TABLE IF NOT EXISTS llm_usage (
-            id TEXT PRIMARY KEY,
-            model TEXT NOT NULL,
-            input_tokens INTEGER NOT NULL,
-            output_tokens INTEGER NOT NULL,
-            cost_usd REAL,
-            created_at INTEGER NOT NULL
-        );
-        CREATE INDEX IF NOT EXISTS idx_usage_date ON llm_usage(created_at);
-
-        -- Record migration
-        INSERT INTO schema_version (version, applied_at)
-        VALUES (1, strftime('%s', 'now'));
-        """
-
-        self._execute_sql_script(conn, migration_sql)
+        self._execute_statements(conn, _MIGRATION_V001_STATEMENTS)
         logger.info("migration_v001_completed")
 
     @staticmethod
-    def _execute_sql_script(conn, sql: str) -> None:
+    def _execute_statements(conn, statements) -> None:
         """
-        Execute a SQL script containing multiple statements.
+        Execute pre-split SQL statements in order.
 
         libsql/Hrana requires one statement per execute call.
         """
-        statements = [s.strip() for s in sql.strip().split(";") if s.strip()]
         for statement in statements:
             conn.execute(statement)
 
@@ -376,26 +455,26 @@ class TursoDatabaseManager:
             List of database names
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"https://api.turso.tech/v1/organizations/{self.turso_org_url.split('.')[0]}/databases",
-                    headers={
-                        "Authorization": f"Bearer {self.auth_token}"
-                    },
-                    timeout=30.0
-                )
+            client = get_http_client()
+            response = await client.get(
+                f"https://api.turso.tech/v1/organizations/{self.turso_org_url.split('.')[0]}/databases",
+                headers={
+                    "Authorization": f"Bearer {self.auth_token}"
+                },
+                timeout=30.0
+            )
 
-                if response.status_code == 200:
-                    databases = response.json().get("databases", [])
-                    user_dbs = [
-                        db["name"] for db in databases
-                        if db["name"].startswith("user_")
-                    ]
-                    logger.info("listed_databases", count=len(user_dbs))
-                    return user_dbs
-                else:
-                    logger.error("list_databases_failed", status=response.status_code)
-                    return []
+            if response.status_code == 200:
+                databases = response.json().get("databases", [])
+                user_dbs = [
+                    db["name"] for db in databases
+                    if db["name"].startswith("user-")
+                ]
+                logger.info("listed_databases", count=len(user_dbs))
+                return user_dbs
+            else:
+                logger.error("list_databases_failed", status=response.status_code)
+                return []
 
         except Exception as e:
             logger.error("list_databases_error", error=str(e))
@@ -414,7 +493,7 @@ class TursoDatabaseManager:
         import time
         cutoff_time = time.time() - (days * 86400)
 
-        for db_file in self.data_dir.glob("user_*.db"):
+        for db_file in self.data_dir.glob("user-*.db"):
             if db_file.stat().st_atime < cutoff_time:
                 try:
                     db_file.unlink()
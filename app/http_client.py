@@ -0,0 +1,65 @@
+"""
+Shared outbound HTTP client.
+
+One pooled httpx.AsyncClient is opened in the application lifespan and reused
+by every outbound caller so keep-alive connections survive across requests.
+"""
+import importlib.util
+
+import httpx
+import structlog
+from typing import Optional
+
+from app.config import settings
+
+
+logger = structlog.get_logger()
+
+
+HTTP_LIMITS = httpx.Limits(
+    max_keepalive_connections=settings.http_max_keepalive_connections,
+    max_connections=settings.http_max_connections,
+)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# HTTP/2 lets concurrent provider calls share one TLS connection per host.
+# httpx needs the optional h2 package for it; fall back to HTTP/1.1 without.
+HTTP2_ENABLED = importlib.util.find_spec("h2") is not None
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def open_http_client() -> httpx.AsyncClient:
+    """Create the shared client. Called once from the application lifespan."""
+    global _http_client
+
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT, http2=HTTP2_ENABLED
+        )
+        logger.debug("http_client_opened", http2=HTTP2_ENABLED)
+
+    return _http_client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client.
+
+    Opens it on first use so scripts and tests that never run the lifespan
+    still work.
+    """
+    if _http_client is None or _http_client.is_closed:
+        return open_http_client()
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared client. Called on application shutdown."""
+    global _http_client
+
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        logger.debug("http_client_closed")
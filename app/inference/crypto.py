@@ -2,10 +2,12 @@
 E2EE cryptographic operations using X25519 and ChaCha20-Poly1305.
 """
 import base64
+import itertools
 import secrets
+import time
 import structlog
-from datetime import datetime, timedelta
-from typing import Tuple, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Tuple, Optional, Union
 from pathlib import Path
 
 from cryptography.hazmat.primitives.asymmetric import x25519
@@ -14,6 +16,7 @@ from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 
 from app.config import settings
+from app.inference.errors import DecryptionFailed
 
 
 logger = structlog.get_logger()
@@ -33,6 +36,17 @@ class E2EECrypto:
         self._key_id: Optional[str] = None
         self._key_created_at: Optional[datetime] = None
         self._key_expires_at: Optional[datetime] = None
+        # Derived from the current key; refreshed on generate/load
+        self._key_expires_at_ts: float = 0.0
+        self._public_key_info: Optional[dict] = None
+
+        # Response nonces: random per-process prefix + monotonically increasing
+        # counter. Every response nonce this process emits is unique, whatever
+        # the key, so a client that reuses its ephemeral key still never sees
+        # a repeated (key, nonce) pair. Counter starts at 1; the request side
+        # uses the client's own random nonce.
+        self._nonce_prefix = secrets.token_bytes(4)
+        self._nonce_counter = itertools.count(1)
 
         # Store path for key persistence
         self._key_file = Path(settings.data_dir) / "inference_key.bin"
@@ -51,7 +65,7 @@ class E2EECrypto:
                 self._load_key()
 
                 # Check if key needs rotation
-                if datetime.utcnow() > self._key_expires_at:
+                if time.time() > self._key_expires_at_ts:
                     logger.info("inference_key_expired_rotating")
                     self._generate_new_key()
             else:
@@ -75,6 +89,7 @@ class E2EECrypto:
 
         # Persist key
         self._save_key()
+        self._refresh_key_cache()
 
         logger.info(
             "inference_key_generated",
@@ -108,7 +123,7 @@ class E2EECrypto:
             # Set restrictive permissions
             self._key_file.chmod(0o600)
 
-            logger.info("inference_key_saved", path=str(self._key_file))
+            logger.debug("inference_key_saved", path=str(self._key_file))
 
         except Exception as e:
             logger.error("inference_key_save_failed", error=str(e))
@@ -133,8 +148,9 @@ class E2EECrypto:
             self._key_id = metadata_lines[0]
             self._key_created_at = datetime.fromisoformat(metadata_lines[1])
             self._key_expires_at = datetime.fromisoformat(metadata_lines[2])
+            self._refresh_key_cache()
 
-            logger.info(
+            logger.debug(
                 "inference_key_loaded",
                 key_id=self._key_id,
                 expires_at=self._key_expires_at.isoformat()
@@ -144,29 +160,39 @@ class E2EECrypto:
             logger.error("inference_key_load_failed", error=str(e))
             raise
 
-    def get_public_key_info(self) -> dict:
-        """
-        Get server's public key information for clients.
-
-        Returns:
-            Dict with public_key (base64), key_id, expires_at, algorithm
-        """
-        # Check for key rotation
-        if datetime.utcnow() > self._key_expires_at:
-            self._generate_new_key()
+    def _refresh_key_cache(self) -> None:
+        """Recompute expiry timestamp and public key info for the current key."""
+        # Stored datetimes are naive UTC
+        self._key_expires_at_ts = self._key_expires_at.replace(tzinfo=timezone.utc).timestamp()
 
         public_bytes = self._public_key.public_bytes(
             encoding=serialization.Encoding.Raw,
             format=serialization.PublicFormat.Raw
         )
 
-        return {
+        self._public_key_info = {
             "public_key": base64.b64encode(public_bytes).decode('utf-8'),
             "key_id": self._key_id,
             "expires_at": self._key_expires_at.isoformat() + "Z",
             "algorithm": "X25519"
         }
 
+    def get_public_key_info(self) -> dict:
+        """
+        Get server's public key information for clients.
+
+        The returned dict is shared and only replaced on rotation; callers
+        must not mutate it.
+
+        Returns:
+            Dict with public_key (base64), key_id, expires_at, algorithm
+        """
+        # Check for key rotation
+        if time.time() > self._key_expires_at_ts:
+            self._generate_new_key()
+
+        return self._public_key_info
+
     def derive_shared_secret(self, client_ephemeral_public_key_b64: str) -> bytes:
         """
         Derive shared secret using X25519 key exchange.
@@ -178,8 +204,29 @@ class E2EECrypto:
             32-byte encryption key derived via HKDF
         """
         try:
-            # Decode client's ephemeral public key
             client_public_bytes = base64.b64decode(client_ephemeral_public_key_b64)
+        except Exception as e:
+            logger.error(
+                "shared_secret_derivation_failed",
+                error=str(e),
+                client_pub_b64_len=len(client_ephemeral_public_key_b64 or ""),
+                key_id=self._key_id,
+            )
+            raise DecryptionFailed("Failed to derive shared secret") from e
+
+        return self.derive_shared_secret_raw(client_public_bytes)
+
+    def derive_shared_secret_raw(self, client_public_bytes: bytes) -> bytes:
+        """
+        Derive shared secret from a raw 32-byte client ephemeral public key.
+
+        Args:
+            client_public_bytes: Raw X25519 public key bytes
+
+        Returns:
+            32-byte encryption key derived via HKDF
+        """
+        try:
             client_public_key = x25519.X25519PublicKey.from_public_bytes(client_public_bytes)
 
             # Perform X25519 key exchange
@@ -200,10 +247,10 @@ class E2EECrypto:
             logger.error(
                 "shared_secret_derivation_failed",
                 error=str(e),
-                client_pub_b64_len=len(client_ephemeral_public_key_b64 or ""),
+                client_pub_len=len(client_public_bytes or b""),
                 key_id=self._key_id,
             )
-            raise ValueError("Failed to derive shared secret") from e
+            raise DecryptionFailed("Failed to derive shared secret") from e
 
     def decrypt_content(
         self,
@@ -225,59 +272,143 @@ class E2EECrypto:
             Decrypted plaintext string
         """
         try:
-            # Decode base64 inputs
             ciphertext = base64.b64decode(ciphertext_b64)
             nonce = base64.b64decode(nonce_b64)
             mac = base64.b64decode(mac_b64)
+        except Exception as e:
+            logger.error(
+                "decryption_failed",
+                error=str(e),
+                ciphertext_b64_len=len(ciphertext_b64 or ""),
+                nonce_b64_len=len(nonce_b64 or ""),
+                mac_b64_len=len(mac_b64 or ""),
+            )
+            raise DecryptionFailed("Decryption failed - invalid encryption") from e
 
-            # ChaCha20-Poly1305 expects ciphertext + tag
-            authenticated_ciphertext = ciphertext + mac
+        plaintext_bytes = self.decrypt_content_raw(ciphertext, nonce, mac, encryption_key)
+        try:
+            return plaintext_bytes.decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise DecryptionFailed("Decryption failed - invalid encryption") from e
 
-            # Decrypt
-            chacha = ChaCha20Poly1305(encryption_key)
-            plaintext_bytes = chacha.decrypt(nonce, authenticated_ciphertext, None)
+    @staticmethod
+    def cipher_for(encryption_key: bytes) -> ChaCha20Poly1305:
+        """
+        Build the AEAD cipher for a derived key.
 
-            return plaintext_bytes.decode('utf-8')
+        Pass the result as `cipher=` to the encrypt/decrypt methods to run the
+        key schedule once per request instead of once per operation.
+        """
+        return ChaCha20Poly1305(encryption_key)
+
+    def decrypt_content_raw(
+        self,
+        ciphertext: bytes,
+        nonce: bytes,
+        mac: bytes,
+        encryption_key: bytes,
+        cipher: Optional[ChaCha20Poly1305] = None
+    ) -> bytes:
+        """
+        Decrypt raw ChaCha20-Poly1305 ciphertext.
+
+        Args:
+            ciphertext: Ciphertext without tag
+            nonce: 12-byte nonce
+            mac: 16-byte MAC tag
+            encryption_key: 32-byte encryption key
+            cipher: Prebuilt cipher for encryption_key (see cipher_for)
+
+        Returns:
+            Decrypted plaintext bytes
+        """
+        try:
+            # ChaCha20-Poly1305 expects ciphertext + tag
+            chacha = cipher or ChaCha20Poly1305(encryption_key)
+            return chacha.decrypt(nonce, ciphertext + mac, None)
 
         except Exception as e:
             logger.error(
                 "decryption_failed",
                 error=str(e),
-                ciphertext_b64_len=len(ciphertext_b64 or ""),
-                nonce_b64_len=len(nonce_b64 or ""),
-                mac_b64_len=len(mac_b64 or ""),
+                ciphertext_len=len(ciphertext or b""),
+                nonce_len=len(nonce or b""),
+                mac_len=len(mac or b""),
             )
-            raise ValueError("Decryption failed - invalid encryption") from e
+            raise DecryptionFailed("Decryption failed - invalid encryption") from e
+
+    @staticmethod
+    def counter_nonces() -> Iterator[bytes]:
+        """
+        Nonces for a sequence of messages under one key (e.g. stream frames).
 
-    def encrypt_response(self, plaintext: str, encryption_key: bytes) -> Tuple[str, str, str]:
+        A random 4-byte prefix followed by an 8-byte big-endian counter; the
+        prefix keeps the sequence clear of the client's random request nonce.
+        """
+        prefix = secrets.token_bytes(4)
+        for counter in itertools.count():
+            yield prefix + counter.to_bytes(8, "big")
+
+    def encrypt_response(
+        self,
+        plaintext: Union[str, bytes],
+        encryption_key: bytes,
+        nonce: Optional[bytes] = None,
+        cipher: Optional[ChaCha20Poly1305] = None
+    ) -> Tuple[str, str, str]:
         """
         Encrypt response using ChaCha20-Poly1305.
 
         Args:
-            plaintext: Plaintext string to encrypt
+            plaintext: Plaintext string (or already-encoded UTF-8 bytes) to encrypt
             encryption_key: 32-byte encryption key
+            nonce: 12-byte nonce; next counter nonce if omitted. Never reuse under one key.
+            cipher: Prebuilt cipher for encryption_key (see cipher_for)
 
         Returns:
             Tuple of (ciphertext_b64, nonce_b64, mac_b64)
         """
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode('utf-8')
+        ciphertext, nonce, mac = self.encrypt_response_raw(
+            plaintext, encryption_key, nonce, cipher
+        )
+        return (
+            base64.b64encode(ciphertext).decode('ascii'),
+            base64.b64encode(nonce).decode('ascii'),
+            base64.b64encode(mac).decode('ascii')
+        )
+
+    def encrypt_response_raw(
+        self,
+        plaintext: bytes,
+        encryption_key: bytes,
+        nonce: Optional[bytes] = None,
+        cipher: Optional[ChaCha20Poly1305] = None
+    ) -> Tuple[bytes, bytes, bytes]:
+        """
+        Encrypt raw bytes using ChaCha20-Poly1305.
+
+        Args:
+            plaintext: Plaintext bytes to encrypt
+            encryption_key: 32-byte encryption key
+            nonce: 12-byte nonce; next counter nonce if omitted. Never reuse under one key.
+            cipher: Prebuilt cipher for encryption_key (see cipher_for)
+
+        Returns:
+            Tuple of (ciphertext, nonce, mac)
+        """
         try:
-            # Generate random nonce (12 bytes for ChaCha20-Poly1305)
-            nonce = secrets.token_bytes(12)
+            if nonce is None:
+                # 12-byte counter nonce, no RNG call per response
+                nonce = self._nonce_prefix + next(self._nonce_counter).to_bytes(8, "big")
 
             # Encrypt
-            chacha = ChaCha20Poly1305(encryption_key)
-            authenticated_ciphertext = chacha.encrypt(nonce, plaintext.encode('utf-8'), None)
+            chacha = cipher or ChaCha20Poly1305(encryption_key)
+            authenticated_ciphertext = chacha.encrypt(nonce, plaintext, None)
 
             # Split ciphertext and tag (tag is last 16 bytes)
-            ciphertext = authenticated_ciphertext[:-16]
-            mac = authenticated_ciphertext[-16:]
-
-            # Base64 encode
-            return (
-                base64.b64encode(ciphertext).decode('utf-8'),
-                base64.b64encode(nonce).decode('utf-8'),
-                base64.b64encode(mac).decode('utf-8')
-            )
+            return authenticated_ciphertext[:-16], nonce, authenticated_ciphertext[-16:]
 
         except Exception as e:
             logger.error("encryption_failed", error=str(e))
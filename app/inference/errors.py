@@ -0,0 +1,24 @@
+"""
+Inference error types.
+
+Each failure the API maps to a distinct status code has its own class so
+routes dispatch on the type instead of matching message text. They subclass
+ValueError so existing `except ValueError` handlers keep working.
+"""
+from app.inference.models import UsageInfo
+
+
+class QuotaExceeded(ValueError):
+    """The user's daily inference quota is used up."""
+
+    def __init__(self, usage: UsageInfo):
+        super().__init__("Rate limit exceeded")
+        self.usage = usage
+
+
+class DecryptionFailed(ValueError):
+    """Key derivation or decryption of the client payload failed."""
+
+
+class ProviderUnavailable(ValueError):
+    """No LLM provider is configured."""
@@ -0,0 +1,33 @@
+"""
+Output fingerprints for log correlation.
+"""
+import hashlib
+import logging
+from typing import Optional, Union
+
+from app.config import settings
+
+
+# structlog drops INFO events when the configured level is above it; skip the
+# hashing too in that case.
+_FINGERPRINT_ENABLED = (
+    settings.log_response_fingerprint
+    and settings.log_level_value <= logging.INFO
+)
+
+
+def log_fingerprint(data: Union[str, bytes]) -> Optional[str]:
+    """
+    Short fingerprint of LLM output for INFO logs.
+
+    BLAKE2b with a 16-byte digest: only used to correlate identical outputs
+    across log lines, not for security.
+
+    Returns:
+        Hex digest, or None when fingerprints are disabled or data is empty
+    """
+    if not _FINGERPRINT_ENABLED or not data:
+        return None
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
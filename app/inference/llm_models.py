@@ -1,8 +1,9 @@
 """
 Lightweight LLM request/response models used by inference providers.
 """
+from dataclasses import dataclass
 from enum import Enum
-from typing import List, Optional
+from typing import List, Literal
 
 from pydantic import BaseModel, Field
 
@@ -23,10 +24,28 @@ class ModelType(str, Enum):
     GEMINI_PRO = "gemini-2.5-pro"
 
 
-class Message(BaseModel):
-    """Chat message to send to the provider."""
+# Request-side alias for ModelType; pydantic validates literals with a plain
+# set-membership check instead of enum coercion.
+ModelTypeLiteral = Literal[
+    "claude-3-haiku-20240307",
+    "claude-3-5-sonnet-20241022",
+    "gpt-4o-mini",
+    "gpt-4o",
+    "gemini-flash-latest",
+    "gemini-2.5-pro",
+]
 
-    role: str = Field(..., pattern="^(user|assistant|system)$")
+
+@dataclass(slots=True)
+class Message:
+    """
+    Chat message to send to the provider.
+
+    Only built by our own task code with literal roles, so it is a plain
+    dataclass rather than a validated pydantic model.
+    """
+
+    role: Literal["user", "assistant", "system"]
     content: str
 
 
@@ -34,18 +53,23 @@ class InferenceRequest(BaseModel):
     """LLM inference request."""
 
     messages: List[Message]
-    model: ModelType = ModelType.GEMINI_FLASH
-    max_tokens: Optional[int] = Field(default=1024, le=4096)
-    temperature: Optional[float] = Field(default=1.0, ge=0.0, le=2.0)
+    model: ModelTypeLiteral = ModelType.GEMINI_FLASH.value
+    # Defaults resolve here so providers pass these through unchanged
+    max_tokens: int = Field(default=1024, gt=0, le=4096)
+    temperature: float = Field(default=1.0, ge=0.0, le=2.0)
     stream: bool = False
+    json_mode: bool = False  # Ask the provider for a bare JSON object
 
 
+# Providers build UsageStats/InferenceResponse with model_construct: every
+# field comes straight from the provider SDK or API, so validation is skipped.
 class UsageStats(BaseModel):
     """Token usage statistics."""
 
     input_tokens: int
     output_tokens: int
     total_tokens: int
+    cached_input_tokens: int = 0  # Prompt tokens served from the provider's prompt cache
 
 
 class InferenceResponse(BaseModel):
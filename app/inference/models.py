@@ -1,8 +1,8 @@
 """
 E2EE inference models and schemas.
 """
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, StringConstraints, field_validator
+from typing import Annotated, List, Literal, Optional
 from enum import Enum
 from datetime import datetime
 
@@ -15,6 +15,15 @@ class InferenceTask(str, Enum):
     CAPTURE_METADATA = "capture_metadata"
 
 
+# Request-side alias for InferenceTask (validated as a literal, not an enum)
+InferenceTaskLiteral = Literal[
+    "memory_distillation",
+    "tagging",
+    "insight_extraction",
+    "capture_metadata",
+]
+
+
 class PublicKeyResponse(BaseModel):
     """Server's X25519 public key for E2EE."""
     public_key: str = Field(..., description="Base64-encoded X25519 public key")
@@ -30,14 +39,37 @@ class ProviderInfo(BaseModel):
 
 
 class E2EEInferenceRequest(BaseModel):
-    """Encrypted inference request from client."""
-    task: InferenceTask = Field(..., description="Inference task to execute")
-    encrypted_content: str = Field(..., description="Base64-encoded ChaCha20-Poly1305 ciphertext")
-    nonce: str = Field(..., description="Base64-encoded 12-byte nonce")
-    mac: str = Field(..., description="Base64-encoded 16-byte authentication tag")
-    ephemeral_public_key: str = Field(..., description="Base64-encoded client ephemeral X25519 public key")
+    """
+    Encrypted inference request from client.
+
+    Binary fields arrive base64-encoded and are decoded once during validation.
+    """
+    task: InferenceTaskLiteral = Field(..., description="Inference task to execute")
+    encrypted_content: bytes = Field(
+        ...,
+        description="Base64-encoded ChaCha20-Poly1305 ciphertext",
+        json_schema_extra={"format": "byte"},
+    )
+    nonce: bytes = Field(
+        ...,
+        description="Base64-encoded 12-byte nonce",
+        json_schema_extra={"format": "byte"},
+    )
+    mac: bytes = Field(
+        ...,
+        description="Base64-encoded 16-byte authentication tag",
+        json_schema_extra={"format": "byte"},
+    )
+    ephemeral_public_key: bytes = Field(
+        ...,
+        description="Base64-encoded client ephemeral X25519 public key",
+        json_schema_extra={"format": "byte"},
+    )
     client_version: str = Field(..., description="Client app version for compatibility")
 
+    class Config:
+        val_json_bytes = "base64"
+
 
 class UsageInfo(BaseModel):
     """User's usage quota information."""
@@ -54,6 +86,50 @@ class E2EEInferenceResponse(BaseModel):
     usage: UsageInfo
 
 
+# Upper bound on requests in one /inference/execute/batch call
+MAX_BATCH_REQUESTS = 50
+
+
+class E2EEInferenceBatchRequest(BaseModel):
+    """Several encrypted inference requests processed together."""
+    requests: List[E2EEInferenceRequest] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_REQUESTS
+    )
+
+
+class E2EEInferenceBatchItem(BaseModel):
+    """
+    Outcome of one request in a batch, in request order.
+
+    Either the encrypted fields are set, or error names why the item failed.
+    """
+    encrypted_result: Optional[str] = Field(None, description="Base64-encoded ChaCha20-Poly1305 ciphertext")
+    nonce: Optional[str] = Field(None, description="Base64-encoded 12-byte nonce")
+    mac: Optional[str] = Field(None, description="Base64-encoded 16-byte authentication tag")
+    error: Optional[Literal["quota_exceeded", "decryption_failed", "processing_failed"]] = None
+
+
+class E2EEInferenceBatchResponse(BaseModel):
+    """Encrypted results for a batch of inference requests."""
+    results: List[E2EEInferenceBatchItem]
+    usage: UsageInfo
+
+
+class E2EEStreamFrame(BaseModel):
+    """
+    One newline-delimited frame of a streamed inference response.
+
+    "delta" frames carry raw model output as it is generated; the final
+    "result" frame carries the same payload as E2EEInferenceResponse.
+    """
+    type: Literal["delta", "result", "error"]
+    encrypted_result: Optional[str] = Field(None, description="Base64-encoded ChaCha20-Poly1305 ciphertext")
+    nonce: Optional[str] = Field(None, description="Base64-encoded 12-byte nonce")
+    mac: Optional[str] = Field(None, description="Base64-encoded 16-byte authentication tag")
+    usage: Optional[UsageInfo] = None
+    error: Optional[str] = None
+
+
 class RateLimitErrorResponse(BaseModel):
     """Rate limit exceeded error response."""
     error: str
@@ -61,6 +137,8 @@ class RateLimitErrorResponse(BaseModel):
 
 
 # === Task Output Models ===
+# LLM answers are validated straight from JSON (model_validate_json); the
+# defaults below are what the prompts treat as optional.
 
 class CaptureIntent(str, Enum):
     """Intent detected from captured content."""
@@ -73,16 +151,25 @@ class CaptureIntent(str, Enum):
     IDEA = "idea"
 
 
+_CAPTURE_INTENT_MAP = {intent.value: intent for intent in CaptureIntent}
+
+
 class CaptureMetadataResult(BaseModel):
     """Result from capture metadata extraction task."""
-    intent: CaptureIntent
+    intent: CaptureIntent = CaptureIntent.NOTE
     extracted_question: Optional[str] = Field(None, alias="extractedQuestion")
     extracted_task: Optional[str] = Field(None, alias="extractedTask")
     inferred_reminder_time: Optional[str] = Field(None, alias="inferredReminderTime")
     extracted_entities: List[str] = Field(default_factory=list, alias="extractedEntities")
     suggested_tags: List[str] = Field(default_factory=list, alias="suggestedTags")
-    confidence: float = Field(..., ge=0.0, le=1.0)
-    requires_response: bool = Field(alias="requiresResponse")
+    confidence: float = Field(0.7, ge=0.0, le=1.0)
+    requires_response: bool = Field(False, alias="requiresResponse")
+
+    @field_validator("intent", mode="before")
+    @classmethod
+    def _known_intent(cls, value):
+        """Fall back to a note for intents outside the enum."""
+        return _CAPTURE_INTENT_MAP.get(value, CaptureIntent.NOTE)
 
     class Config:
         populate_by_name = True
@@ -97,6 +184,9 @@ class MemoryType(str, Enum):
     PREFERENCE = "preference"
 
 
+_MEMORY_TYPE_MAP = {memory_type.value: memory_type for memory_type in MemoryType}
+
+
 class Memory(BaseModel):
     """A single extracted memory."""
     type: MemoryType
@@ -106,23 +196,34 @@ class Memory(BaseModel):
 
 class MemoryDistillationResult(BaseModel):
     """Result from memory distillation task."""
-    memories: List[Memory]
-    confidence: float = Field(..., ge=0.0, le=1.0)
+    memories: List[Memory] = Field(default_factory=list)
+    confidence: float = Field(0.8, ge=0.0, le=1.0)
+
+    @field_validator("memories", mode="before")
+    @classmethod
+    def _drop_unknown_types(cls, value):
+        """Skip memories with a type outside the enum instead of failing the result."""
+        if not isinstance(value, list):
+            return value
+        return [
+            memory for memory in value
+            if not isinstance(memory, dict) or memory.get("type") in _MEMORY_TYPE_MAP
+        ]
 
 
 class Tag(BaseModel):
     """A single extracted tag."""
-    tag: str
+    tag: Annotated[str, StringConstraints(to_lower=True)]
     confidence: float = Field(..., ge=0.0, le=1.0)
 
 
 class TaggingResult(BaseModel):
     """Result from tagging task."""
-    tags: List[Tag]
-    confidence: float = Field(..., ge=0.0, le=1.0)
+    tags: List[Tag] = Field(default_factory=list)
+    confidence: float = Field(0.8, ge=0.0, le=1.0)
 
 
 class InsightExtractionResult(BaseModel):
     """Result from insight extraction task."""
-    insights: List[str]
-    confidence: float = Field(..., ge=0.0, le=1.0)
+    insights: List[str] = Field(default_factory=list)
+    confidence: float = Field(0.7, ge=0.0, le=1.0)
@@ -1,61 +1,124 @@
 """
 Anthropic Claude provider used by the E2EE inference pipeline.
 """
+import httpx
 import structlog
-from anthropic import AsyncAnthropic
+from typing import AsyncIterator, List, Optional, Tuple
+from anthropic import NOT_GIVEN, AsyncAnthropic
 
 from app.config import settings
+from app.http_client import get_http_client
 from app.inference.llm_models import InferenceRequest, InferenceResponse, UsageStats
 
 
 logger = structlog.get_logger()
 
 
+PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
+# Assistant prefill that makes Claude answer with a bare JSON object
+JSON_PREFILL = "{"
+
+
+def _cached_system(system: Optional[str]):
+    """
+    Wrap the system prompt as a cacheable block.
+
+    The task system prompts are static, so Anthropic can serve them from its
+    prompt cache instead of re-processing the prefix on every call.
+    """
+    if not system:
+        return NOT_GIVEN
+    return [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+
+
+def _cache_read_tokens(usage) -> int:
+    """
+    Prompt tokens read from the prompt cache.
+
+    Only sent with the prompt-caching beta; the SDK keeps it as an extra field.
+    """
+    return getattr(usage, "cache_read_input_tokens", None) or 0
+
+
+def _split_messages(request: InferenceRequest) -> Tuple[Optional[str], List[dict]]:
+    """
+    Convert messages to Anthropic format in one pass.
+
+    Returns:
+        (first system message or None, non-system messages)
+    """
+    if not request.messages:
+        raise ValueError("No messages to send")
+
+    system = None
+    messages = []
+    for msg in request.messages:
+        if msg.role == "system":
+            # System messages handled separately
+            if system is None:
+                system = msg.content
+        else:
+            messages.append({"role": msg.role, "content": msg.content})
+
+    return system, messages
+
+
 class AnthropicProvider:
     """Anthropic Claude API provider."""
 
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         if not settings.anthropic_api_key:
             raise ValueError("ANTHROPIC_API_KEY not configured")
 
-        self.client = AsyncAnthropic(api_key=settings.anthropic_api_key)
+        self._http_client = http_client or get_http_client()
+        self.client = AsyncAnthropic(
+            api_key=settings.anthropic_api_key,
+            http_client=self._http_client,
+            default_headers={"anthropic-beta": PROMPT_CACHING_BETA}
+        )
+
+    async def warm_up(self) -> None:
+        """
+        Open a pooled connection to the Anthropic API.
+
+        This SDK version has no models endpoint; any response to a HEAD on the
+        base URL leaves a kept-alive connection in the shared pool.
+        """
+        await self._http_client.head(str(self.client.base_url))
 
     async def generate(self, request: InferenceRequest) -> InferenceResponse:
         """Generate a response using Anthropic Claude."""
         try:
-            # Convert messages to Anthropic format
-            messages = [
-                {"role": msg.role, "content": msg.content}
-                for msg in request.messages
-                if msg.role != "system"  # System messages handled separately
-            ]
-
-            # Extract system message if present
-            system_messages = [
-                msg.content for msg in request.messages if msg.role == "system"
-            ]
-            system = system_messages[0] if system_messages else None
+            system, messages = _split_messages(request)
+
+            if request.json_mode:
+                messages.append({"role": "assistant", "content": JSON_PREFILL})
 
             # Call Anthropic API
             response = await self.client.messages.create(
                 model=request.model,
-                max_tokens=request.max_tokens or 1024,
-                temperature=request.temperature or 1.0,
-                system=system,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                system=_cached_system(system),
                 messages=messages,
             )
 
             # Extract response content
             content = response.content[0].text if response.content else ""
+            if request.json_mode:
+                # The prefill is not echoed back
+                content = JSON_PREFILL + content
 
-            return InferenceResponse(
+            return InferenceResponse.model_construct(
                 content=content,
                 model=response.model,
-                usage=UsageStats(
+                usage=UsageStats.model_construct(
                     input_tokens=response.usage.input_tokens,
                     output_tokens=response.usage.output_tokens,
                     total_tokens=response.usage.input_tokens
                     + response.usage.output_tokens,
+                    cached_input_tokens=_cache_read_tokens(response.usage),
                 ),
                 finish_reason=response.stop_reason or "end_turn",
             )
@@ -63,3 +126,51 @@ class AnthropicProvider:
         except Exception as e:
             logger.error("anthropic_generation_failed", error=str(e))
             raise ValueError(f"Anthropic API error: {str(e)}")
+
+    async def generate_stream(
+        self, request: InferenceRequest
+    ) -> AsyncIterator[Tuple[str, Optional[UsageStats]]]:
+        """
+        Stream a response using Anthropic Claude.
+
+        Yields:
+            (delta_text, None) for each text delta, then ("", usage) once
+        """
+        try:
+            system, messages = _split_messages(request)
+
+            if request.json_mode:
+                messages.append({"role": "assistant", "content": JSON_PREFILL})
+                yield JSON_PREFILL, None
+
+            stream = await self.client.messages.create(
+                model=request.model,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                system=_cached_system(system),
+                messages=messages,
+                stream=True,
+            )
+
+            input_tokens = 0
+            output_tokens = 0
+            cached_input_tokens = 0
+            async for event in stream:
+                if event.type == "message_start":
+                    input_tokens = event.message.usage.input_tokens
+                    cached_input_tokens = _cache_read_tokens(event.message.usage)
+                elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                    yield event.delta.text, None
+                elif event.type == "message_delta":
+                    output_tokens = event.usage.output_tokens
+
+            yield "", UsageStats.model_construct(
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                total_tokens=input_tokens + output_tokens,
+                cached_input_tokens=cached_input_tokens,
+            )
+
+        except Exception as e:
+            logger.error("anthropic_stream_failed", error=str(e))
+            raise ValueError(f"Anthropic API error: {str(e)}")
@@ -1,66 +1,132 @@
 """
 Google Gemini provider used by the E2EE inference pipeline.
+
+Calls the Gemini REST API directly through the shared pooled httpx client;
+the google-generativeai SDK opens a new connection per call.
 """
-import hashlib
+import json
+import httpx
 import structlog
-import google.generativeai as genai
+from typing import AsyncIterator, Dict, Optional, Tuple
 
 from app.config import settings
+from app.http_client import get_http_client
+from app.inference.fingerprint import log_fingerprint
 from app.inference.llm_models import InferenceRequest, InferenceResponse, UsageStats
 
 
 logger = structlog.get_logger()
 
 
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+# Gemini uses a simpler format with "user" and "model" roles
+_GEMINI_ROLE = {"assistant": "model", "system": "user", "user": "user"}
+
+
 class GoogleProvider:
     """Google Gemini API provider."""
 
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         if not settings.gemini_api_key:
             raise ValueError("GEMINI_API_KEY not configured")
 
-        genai.configure(api_key=settings.gemini_api_key)
+        self._http_client = http_client
+        self._headers = {"x-goog-api-key": settings.gemini_api_key}
+        # generateContent / streamGenerateContent URLs per model name
+        self._endpoints: Dict[str, str] = {}
+        self._stream_endpoints: Dict[str, str] = {}
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Injected client, or the application-wide shared one."""
+        return self._http_client or get_http_client()
+
+    def _endpoint(self, model: str) -> str:
+        """Get the generateContent URL for a model, building it once per name."""
+        url = self._endpoints.get(model)
+        if url is None:
+            url = self._endpoints.setdefault(
+                model, f"{GEMINI_API_BASE}/models/{model}:generateContent"
+            )
+        return url
+
+    def _stream_endpoint(self, model: str) -> str:
+        """Get the SSE streamGenerateContent URL for a model."""
+        url = self._stream_endpoints.get(model)
+        if url is None:
+            url = self._stream_endpoints.setdefault(
+                model, f"{GEMINI_API_BASE}/models/{model}:streamGenerateContent?alt=sse"
+            )
+        return url
+
+    @staticmethod
+    def _build_payload(request: InferenceRequest) -> dict:
+        """Build the Gemini request body."""
+        generation_config = {
+            "maxOutputTokens": request.max_tokens,
+            "temperature": request.temperature,
+        }
+        if request.json_mode:
+            generation_config["responseMimeType"] = "application/json"
+
+        return {
+            "contents": [
+                {
+                    "role": _GEMINI_ROLE.get(m.role, "user"),
+                    "parts": ({"text": m.content},),
+                }
+                for m in request.messages
+            ],
+            "generationConfig": generation_config,
+        }
+
+    async def warm_up(self) -> None:
+        """Open a pooled connection to the Gemini API with a cheap model listing."""
+        await self.http_client.get(
+            f"{GEMINI_API_BASE}/models", headers=self._headers, params={"pageSize": 1}
+        )
 
     async def generate(self, request: InferenceRequest) -> InferenceResponse:
         """Generate a response using Google Gemini."""
         try:
-            # Get model
-            model = genai.GenerativeModel(request.model)
-
-            # Convert messages to Gemini format
-            # Gemini uses a simpler format with "user" and "model" roles
-            contents = []
-            for msg in request.messages:
-                role = "model" if msg.role == "assistant" else "user"
-                contents.append({"role": role, "parts": [msg.content]})
-
             # Call Gemini API
-            response = await model.generate_content_async(
-                contents=contents,
-                generation_config=genai.GenerationConfig(
-                    max_output_tokens=request.max_tokens or 1024,
-                    temperature=request.temperature or 1.0,
-                ),
+            response = await self.http_client.post(
+                self._endpoint(request.model),
+                headers=self._headers,
+                json=self._build_payload(request),
             )
+            response.raise_for_status()
+            data = response.json()
+
+            candidates = data.get("candidates") or []
+            prompt_feedback = data.get("promptFeedback")
 
             # Extract response content
-            content = response.text if response.text else ""
+            content = ""
+            finish_reason = "STOP"
+            if candidates:
+                parts = (candidates[0].get("content") or {}).get("parts") or []
+                content = "".join(part.get("text", "") for part in parts)
+                finish_reason = candidates[0].get("finishReason", "STOP")
+            elif prompt_feedback and prompt_feedback.get("blockReason"):
+                finish_reason = prompt_feedback["blockReason"]
 
             # Gemini doesn't always provide token counts
-            input_tokens = getattr(response.usage_metadata, "prompt_token_count", 0)
-            output_tokens = getattr(response.usage_metadata, "candidates_token_count", 0)
+            usage_metadata = data.get("usageMetadata") or {}
+            input_tokens = usage_metadata.get("promptTokenCount", 0)
+            output_tokens = usage_metadata.get("candidatesTokenCount", 0)
 
-            inference_response = InferenceResponse(
+            inference_response = InferenceResponse.model_construct(
                 content=content,
                 model=request.model,
-                usage=UsageStats(
+                usage=UsageStats.model_construct(
                     input_tokens=input_tokens,
                     output_tokens=output_tokens,
                     total_tokens=input_tokens + output_tokens,
+                    cached_input_tokens=usage_metadata.get("cachedContentTokenCount", 0),
                 ),
-                finish_reason=response.candidates[0].finish_reason.name
-                if response.candidates
-                else "STOP",
+                finish_reason=finish_reason,
             )
 
             logger.info(
@@ -69,22 +135,18 @@ class GoogleProvider:
                 finish_reason=inference_response.finish_reason,
                 input_tokens=input_tokens,
                 output_tokens=output_tokens,
-                candidate_count=len(getattr(response, "candidates", []) or []),
+                candidate_count=len(candidates),
                 response_length=len(content),
-                response_sha256=hashlib.sha256(content.encode("utf-8")).hexdigest()
-                if content
-                else None,
+                response_fingerprint=log_fingerprint(content),
                 is_empty=not bool(content),
                 safety_ratings=[
                     {
-                        "category": rating.category,
-                        "probability": rating.probability,
+                        "category": rating.get("category"),
+                        "probability": rating.get("probability"),
                     }
-                    for rating in getattr(response, "prompt_feedback", {}).get(
-                        "safety_ratings", []
-                    )
+                    for rating in prompt_feedback.get("safetyRatings", [])
                 ]
-                if getattr(response, "prompt_feedback", None)
+                if prompt_feedback
                 else None,
             )
 
@@ -93,3 +155,45 @@ class GoogleProvider:
         except Exception as e:
             logger.error("google_generation_failed", error=str(e))
             raise ValueError(f"Google Gemini API error: {str(e)}")
+
+    async def generate_stream(
+        self, request: InferenceRequest
+    ) -> AsyncIterator[Tuple[str, Optional[UsageStats]]]:
+        """
+        Stream a response using Google Gemini (server-sent events).
+
+        Yields:
+            (delta_text, None) for each text chunk, then ("", usage) once
+        """
+        try:
+            usage_metadata = {}
+            async with self.http_client.stream(
+                "POST",
+                self._stream_endpoint(request.model),
+                headers=self._headers,
+                json=self._build_payload(request),
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+
+                    data = json.loads(line[5:])
+                    usage_metadata = data.get("usageMetadata") or usage_metadata
+                    for candidate in data.get("candidates") or []:
+                        for part in (candidate.get("content") or {}).get("parts") or []:
+                            if part.get("text"):
+                                yield part["text"], None
+
+            input_tokens = usage_metadata.get("promptTokenCount", 0)
+            output_tokens = usage_metadata.get("candidatesTokenCount", 0)
+            yield "", UsageStats.model_construct(
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                total_tokens=input_tokens + output_tokens,
+                cached_input_tokens=usage_metadata.get("cachedContentTokenCount", 0),
+            )
+
+        except Exception as e:
+            logger.error("google_stream_failed", error=str(e))
+            raise ValueError(f"Google Gemini API error: {str(e)}")
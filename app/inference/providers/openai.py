@@ -1,51 +1,85 @@
 """
 OpenAI GPT provider used by the E2EE inference pipeline.
 """
+import httpx
 import structlog
-from openai import AsyncOpenAI
+from typing import AsyncIterator, Dict, Optional, Tuple
+from openai import NOT_GIVEN, AsyncOpenAI
 
 from app.config import settings
+from app.http_client import get_http_client
 from app.inference.llm_models import InferenceRequest, InferenceResponse, UsageStats
 
 
 logger = structlog.get_logger()
 
 
+# One client per API key, shared by every provider instance
+_ASYNC_CLIENTS: Dict[str, AsyncOpenAI] = {}
+
+
+def _get_async_client(api_key: str, http_client: httpx.AsyncClient) -> AsyncOpenAI:
+    """Get or create the shared AsyncOpenAI client for an API key."""
+    client = _ASYNC_CLIENTS.get(api_key)
+    if client is None:
+        client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+        _ASYNC_CLIENTS[api_key] = client
+    return client
+
+
+def _cached_tokens(usage) -> int:
+    """Prompt tokens OpenAI served from its automatic prefix cache."""
+    details = usage.prompt_tokens_details
+    return (details.cached_tokens or 0) if details else 0
+
+
+async def close_async_clients() -> None:
+    """
+    Drop the shared OpenAI clients (called on application shutdown).
+
+    The underlying httpx client is owned by app.http_client and closed there.
+    """
+    _ASYNC_CLIENTS.clear()
+
+
 class OpenAIProvider:
     """OpenAI GPT API provider."""
 
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         if not settings.openai_api_key:
             raise ValueError("OPENAI_API_KEY not configured")
 
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        self.client = _get_async_client(
+            settings.openai_api_key, http_client or get_http_client()
+        )
+
+    async def warm_up(self) -> None:
+        """Open a pooled connection to the OpenAI API with a cheap model listing."""
+        await self.client.models.list()
 
     async def generate(self, request: InferenceRequest) -> InferenceResponse:
         """Generate a response using OpenAI GPT."""
         try:
-            # Convert messages to OpenAI format
-            messages = [
-                {"role": msg.role, "content": msg.content} for msg in request.messages
-            ]
-
-            # Call OpenAI API
+            # Call OpenAI API; the SDK walks the messages iterable once
             response = await self.client.chat.completions.create(
                 model=request.model,
-                messages=messages,
-                max_tokens=request.max_tokens or 1024,
-                temperature=request.temperature or 1.0,
+                messages=({"role": m.role, "content": m.content} for m in request.messages),
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                response_format={"type": "json_object"} if request.json_mode else NOT_GIVEN,
             )
 
             # Extract response content
             content = response.choices[0].message.content or ""
 
-            return InferenceResponse(
+            return InferenceResponse.model_construct(
                 content=content,
                 model=response.model,
-                usage=UsageStats(
+                usage=UsageStats.model_construct(
                     input_tokens=response.usage.prompt_tokens,
                     output_tokens=response.usage.completion_tokens,
                     total_tokens=response.usage.total_tokens,
+                    cached_input_tokens=_cached_tokens(response.usage),
                 ),
                 finish_reason=response.choices[0].finish_reason or "stop",
             )
@@ -53,3 +87,38 @@ class OpenAIProvider:
         except Exception as e:
             logger.error("openai_generation_failed", error=str(e))
             raise ValueError(f"OpenAI API error: {str(e)}")
+
+    async def generate_stream(
+        self, request: InferenceRequest
+    ) -> AsyncIterator[Tuple[str, Optional[UsageStats]]]:
+        """
+        Stream a response using OpenAI GPT.
+
+        Yields:
+            (delta_text, None) for each content delta, then ("", usage) once
+        """
+        try:
+            stream = await self.client.chat.completions.create(
+                model=request.model,
+                messages=({"role": m.role, "content": m.content} for m in request.messages),
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                response_format={"type": "json_object"} if request.json_mode else NOT_GIVEN,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content, None
+                if chunk.usage:
+                    yield "", UsageStats.model_construct(
+                        input_tokens=chunk.usage.prompt_tokens,
+                        output_tokens=chunk.usage.completion_tokens,
+                        total_tokens=chunk.usage.total_tokens,
+                        cached_input_tokens=_cached_tokens(chunk.usage),
+                    )
+
+        except Exception as e:
+            logger.error("openai_stream_failed", error=str(e))
+            raise ValueError(f"OpenAI API error: {str(e)}")
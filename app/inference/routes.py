@@ -2,16 +2,20 @@
 E2EE inference API routes.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Tuple
+from fastapi.responses import StreamingResponse
+from typing import NoReturn, Tuple
 import structlog
 
 from app.inference.models import (
     PublicKeyResponse,
+    E2EEInferenceBatchRequest,
+    E2EEInferenceBatchResponse,
     E2EEInferenceRequest,
     E2EEInferenceResponse,
     ProviderInfo
 )
-from app.inference.service import get_inference_service
+from app.inference.errors import DecryptionFailed, ProviderUnavailable, QuotaExceeded
+from app.inference.service import E2EEInferenceService, get_inference_service
 from app.auth.dependencies import get_current_user
 
 
@@ -21,7 +25,9 @@ router = APIRouter(prefix="/inference", tags=["inference"])
 
 
 @router.get("/public-key", response_model=PublicKeyResponse)
-async def get_public_key():
+async def get_public_key(
+    service: E2EEInferenceService = Depends(get_inference_service)
+):
     """
     Get server's X25519 public key for E2EE.
 
@@ -29,7 +35,6 @@ async def get_public_key():
     a shared secret for encrypting inference requests.
     """
     try:
-        service = get_inference_service()
         return service.get_public_key()
 
     except Exception as e:
@@ -41,12 +46,13 @@ async def get_public_key():
 
 
 @router.get("/provider", response_model=ProviderInfo)
-async def get_provider_info():
+async def get_provider_info(
+    service: E2EEInferenceService = Depends(get_inference_service)
+):
     """
     Get the currently configured inference provider and model.
     """
     try:
-        service = get_inference_service()
         return service.get_provider_info()
 
     except Exception as e:
@@ -60,7 +66,8 @@ async def get_provider_info():
 @router.post("/execute", response_model=E2EEInferenceResponse)
 async def execute_inference(
     request: E2EEInferenceRequest,
-    current_user: Tuple[str, str] = Depends(get_current_user)
+    current_user: Tuple[str, str] = Depends(get_current_user),
+    service: E2EEInferenceService = Depends(get_inference_service)
 ):
     """
     Execute an AI inference task with E2EE.
@@ -89,87 +96,157 @@ async def execute_inference(
         client_version=request.client_version
     )
 
-    service = get_inference_service()
-
     try:
         response = await service.execute_inference(user_id, request)
         return response
 
-    except ValueError as e:
-        error_message = str(e)
+    except Exception as e:
+        _raise_inference_http_error(user_id, device_id, request, e)
+
+
+@router.post("/execute/batch", response_model=E2EEInferenceBatchResponse)
+async def execute_inference_batch(
+    batch: E2EEInferenceBatchRequest,
+    current_user: Tuple[str, str] = Depends(get_current_user),
+    service: E2EEInferenceService = Depends(get_inference_service)
+):
+    """
+    Execute up to 50 E2EE inference tasks in one request.
+
+    Each request is encrypted with its own ephemeral key and counts against
+    the daily quota like a single /inference/execute call. Provider calls
+    run concurrently. Results come back in request order; an item that
+    could not be processed carries an error instead of an encrypted result.
+    """
+    user_id, device_id = current_user
+
+    logger.info(
+        "e2ee_inference_batch_request",
+        user_id=user_id,
+        device_id=device_id,
+        size=len(batch.requests)
+    )
+
+    try:
+        return await service.execute_inference_batch(user_id, batch)
+
+    except Exception as e:
+        # Batch-level failures (quota, provider) are the same for every item
+        _raise_inference_http_error(user_id, device_id, batch.requests[0], e)
+
+
+@router.post("/execute/stream")
+async def execute_inference_stream(
+    request: E2EEInferenceRequest,
+    current_user: Tuple[str, str] = Depends(get_current_user),
+    service: E2EEInferenceService = Depends(get_inference_service)
+):
+    """
+    Execute an AI inference task with E2EE, streaming the result.
+
+    Returns newline-delimited JSON frames (application/x-ndjson). Each
+    "delta" frame encrypts a chunk of raw model output as it is generated;
+    the final "result" frame carries the same encrypted payload and usage as
+    /inference/execute. Every frame uses its own nonce under the request's
+    shared secret.
+    """
+    user_id, device_id = current_user
+
+    logger.info(
+        "e2ee_inference_stream_request",
+        user_id=user_id,
+        device_id=device_id,
+        task=request.task,
+        client_version=request.client_version
+    )
+
+    try:
+        frames = await service.start_inference_stream(user_id, request)
+
+    except Exception as e:
+        _raise_inference_http_error(user_id, device_id, request, e)
+
+    return StreamingResponse(frames, media_type="application/x-ndjson")
+
+
+def _raise_inference_http_error(
+    user_id: str,
+    device_id: str,
+    request: E2EEInferenceRequest,
+    error: Exception
+) -> NoReturn:
+    """Translate an inference failure into the matching HTTPException."""
+    if isinstance(error, QuotaExceeded):
+        # Return rate limit error with usage info
+        usage = error.usage
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "error": "Daily request limit reached",
+                "usage": {
+                    "requests_remaining": usage.requests_remaining,
+                    "reset_at": usage.reset_at,
+                    "tier": usage.tier
+                }
+            }
+        )
+
+    if isinstance(error, DecryptionFailed):
         logger.warning(
-            "e2ee_inference_value_error_response",
+            "e2ee_inference_decryption_failed_response",
             user_id=user_id,
             device_id=device_id,
             task=request.task,
-            error=error_message,
+            encrypted_len=len(request.encrypted_content),
+            nonce_len=len(request.nonce),
+            mac_len=len(request.mac),
+            client_pub_len=len(request.ephemeral_public_key),
+            detail=str(error),
+            status_code=422,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Decryption failed - invalid encryption"
         )
 
-        if "Rate limit exceeded" in error_message:
-            # Return rate limit error with usage info
-            usage = service.get_usage_info(user_id)
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail={
-                    "error": "Daily request limit reached",
-                    "usage": {
-                        "requests_remaining": usage.requests_remaining,
-                        "reset_at": usage.reset_at,
-                        "tier": usage.tier
-                    }
-                }
-            )
-
-        elif "Decryption failed" in error_message or "Failed to derive" in error_message:
-            # Encryption/decryption error
-            logger.warning(
-                "e2ee_inference_decryption_failed_response",
-                user_id=user_id,
-                device_id=device_id,
-                task=request.task,
-                encrypted_len=len(request.encrypted_content or ""),
-                nonce_len=len(request.nonce or ""),
-                mac_len=len(request.mac or ""),
-                client_pub_len=len(request.ephemeral_public_key or ""),
-                detail=error_message,
-                status_code=422,
-            )
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="Decryption failed - invalid encryption"
-            )
-
-        else:
-            # Other ValueError
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=error_message
-            )
+    if isinstance(error, ProviderUnavailable):
+        logger.error("e2ee_inference_provider_unavailable", user_id=user_id, task=request.task)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="LLM backend unavailable"
+        )
 
-    except Exception as e:
-        logger.error(
-            "e2ee_inference_error",
+    if isinstance(error, ValueError):
+        # Other ValueError
+        logger.warning(
+            "e2ee_inference_value_error_response",
             user_id=user_id,
+            device_id=device_id,
             task=request.task,
-            error=str(e)
+            error=str(error),
         )
-
-        # Check for LLM service availability
-        if "No LLM provider" in str(e):
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="LLM backend unavailable"
-            )
-
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Internal processing error"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error)
         )
 
+    logger.error(
+        "e2ee_inference_error",
+        user_id=user_id,
+        task=request.task,
+        error=str(error)
+    )
+
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail="Internal processing error"
+    )
+
 
 @router.get("/usage")
 async def get_usage(
-    current_user: Tuple[str, str] = Depends(get_current_user)
+    current_user: Tuple[str, str] = Depends(get_current_user),
+    service: E2EEInferenceService = Depends(get_inference_service)
 ):
     """
     Get current user's inference usage quota.
@@ -179,8 +256,7 @@ async def get_usage(
     user_id, device_id = current_user
 
     try:
-        service = get_inference_service()
-        usage = service.get_usage_info(user_id)
+        usage = await service.get_usage_info(user_id)
 
         return {
             "requests_remaining": usage.requests_remaining,
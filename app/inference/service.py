@@ -1,18 +1,28 @@
 """
 E2EE inference service with privacy-first processing.
 """
+import asyncio
 import time
 import structlog
-from datetime import datetime, timedelta
+from fastapi import Request
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from functools import lru_cache
+from collections import defaultdict
+from typing import AsyncIterator, DefaultDict, Dict, Optional, Tuple
 
 from app.inference.models import (
+    E2EEInferenceBatchItem,
+    E2EEInferenceBatchRequest,
+    E2EEInferenceBatchResponse,
     E2EEInferenceRequest,
     E2EEInferenceResponse,
+    E2EEStreamFrame,
     UsageInfo,
     PublicKeyResponse,
     ProviderInfo
 )
 from app.inference.crypto import e2ee_crypto
+from app.inference.errors import DecryptionFailed, QuotaExceeded, ProviderUnavailable
 from app.inference.tasks import task_processor
 from app.master_db import MasterDatabaseManager
 from app.config import settings
@@ -21,6 +31,27 @@ from app.config import settings
 logger = structlog.get_logger()
 
 
+SECONDS_PER_DAY = 86400
+TIER_CACHE_MAX_SIZE = 100_000
+
+
+def _current_day() -> int:
+    """Days since the Unix epoch (UTC)."""
+    return int(time.time()) // SECONDS_PER_DAY
+
+
+@lru_cache(maxsize=2)
+def _day_str(day: int) -> str:
+    """YYYY-MM-DD for an epoch day, as stored in ai_usage_quota.date."""
+    return time.strftime("%Y-%m-%d", time.gmtime(day * SECONDS_PER_DAY))
+
+
+@lru_cache(maxsize=2)
+def _reset_at(day: int) -> str:
+    """ISO 8601 timestamp of the quota reset after an epoch day (next midnight UTC)."""
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime((day + 1) * SECONDS_PER_DAY))
+
+
 class E2EEInferenceService:
     """
     E2EE inference service with:
@@ -34,6 +65,18 @@ class E2EEInferenceService:
         self.free_tier_limit = settings.inference_free_tier_daily_limit
         self.paid_tier_limit = settings.inference_paid_tier_daily_limit
 
+        # In-memory request counters for the current UTC day (user_id -> count).
+        # The ai_usage_quota row is the durable copy, written behind the counter
+        # by a periodic flush of the pending increments.
+        self._quota_day: Optional[str] = None
+        self._quota_counts: Dict[str, int] = {}
+        self._pending_counts: DefaultDict[Tuple[str, str], int] = defaultdict(int)
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # user_id -> (tier, monotonic expiry); invalidated on AI add-on activation
+        self._tier_cache: Dict[str, Tuple[str, float]] = {}
+        self._tier_cache_ttl = settings.inference_tier_cache_ttl_seconds
+
     def get_public_key(self) -> PublicKeyResponse:
         """
         Get server's X25519 public key for client encryption.
@@ -54,16 +97,152 @@ class E2EEInferenceService:
         """
         Determine user's tier based on add-ons.
 
+        Results are cached for a short TTL; a user's tier changes rarely and
+        activation invalidates the entry explicitly.
+
         Args:
             user_id: User UUID
 
         Returns:
             'free' or 'paid'
         """
+        tier = self._cached_tier(user_id)
+        if tier is not None:
+            return tier
+
         has_ai_addon = self.master_db.is_add_on_active(user_id, "ai")
-        return "paid" if has_ai_addon else "free"
+        tier = "paid" if has_ai_addon else "free"
+
+        if len(self._tier_cache) >= TIER_CACHE_MAX_SIZE:
+            self._tier_cache.clear()
+        self._tier_cache[user_id] = (tier, time.monotonic() + self._tier_cache_ttl)
+        return tier
+
+    def _cached_tier(self, user_id: str) -> Optional[str]:
+        """Cached tier for a user, or None if missing or expired."""
+        cached = self._tier_cache.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        return None
+
+    def invalidate_user_tier(self, user_id: str) -> None:
+        """Forget a user's cached tier (call after their add-ons change)."""
+        self._tier_cache.pop(user_id, None)
+
+    async def _resolve_tier(self, user_id: str) -> str:
+        """Get a user's tier, only leaving the event loop on a cache miss."""
+        tier = self._cached_tier(user_id)
+        if tier is None:
+            tier = await asyncio.to_thread(self.get_user_tier, user_id)
+        return tier
+
+    def _daily_limit(self, tier: str) -> int:
+        """Daily request limit for a tier."""
+        return self.paid_tier_limit if tier == "paid" else self.free_tier_limit
+
+    def _roll_quota_day(self, today: str) -> None:
+        """Drop yesterday's counters once the UTC day changes."""
+        if today != self._quota_day:
+            self._quota_day = today
+            self._quota_counts.clear()
+
+    def _read_request_count(self, user_id: str, day: str) -> int:
+        """Read the stored request count for a day (blocking)."""
+        with self.master_db.connection() as conn:
+            result = conn.execute(
+                "SELECT request_count FROM ai_usage_quota WHERE user_id = ? AND date = ?",
+                [user_id, day]
+            )
+            rows = result.fetchall()
+        return rows[0][0] if rows else 0
+
+    def _increment_stored_counts(self, increments: Dict[Tuple[str, str], int]) -> list:
+        """
+        Add pending increments to the stored counts in one statement (blocking).
 
-    def get_usage_info(self, user_id: str) -> UsageInfo:
+        Returns:
+            Rows of (user_id, date, request_count) with the new totals
+        """
+        current_time = int(time.time())
+        params = []
+        for (user_id, day), amount in increments.items():
+            params.extend((user_id, day, amount, current_time))
+
+        placeholders = ", ".join(["(?, ?, ?, ?)"] * len(increments))
+        with self.master_db.connection() as conn:
+            result = conn.execute(
+                f"""
+                INSERT INTO ai_usage_quota (user_id, date, request_count, last_reset_at)
+                VALUES {placeholders}
+                ON CONFLICT(user_id, date) DO UPDATE SET
+                    request_count = ai_usage_quota.request_count + excluded.request_count,
+                    last_reset_at = excluded.last_reset_at
+                RETURNING user_id, date, request_count
+                """,
+                params
+            )
+            rows = result.fetchall()
+            conn.commit()
+        return rows
+
+    async def _load_request_count(self, user_id: str, today: str) -> int:
+        """Get today's count from memory, seeding it from the database on first use."""
+        count = self._quota_counts.get(user_id)
+        if count is None:
+            stored = await asyncio.to_thread(self._read_request_count, user_id, today)
+            # A concurrent request may have seeded the counter while we waited
+            count = self._quota_counts.setdefault(user_id, stored)
+        return count
+
+    async def flush_quota_writes(self) -> None:
+        """Write all pending quota increments to the database."""
+        if not self._pending_counts:
+            return
+
+        pending = self._pending_counts
+        self._pending_counts = defaultdict(int)
+
+        try:
+            rows = await asyncio.to_thread(self._increment_stored_counts, pending)
+        except Exception as e:
+            # Keep the increments for the next flush
+            for key, amount in pending.items():
+                self._pending_counts[key] += amount
+            logger.error("e2ee_inference_quota_flush_failed", users=len(pending), error=str(e))
+            return
+
+        # Other workers share the rows; never let the local view lag behind them
+        for user_id, day, total in rows:
+            if day == self._quota_day and total > self._quota_counts.get(user_id, 0):
+                self._quota_counts[user_id] = total
+
+        logger.debug("e2ee_inference_quota_flushed", users=len(pending))
+
+    async def _flush_loop(self) -> None:
+        """Periodically flush quota increments."""
+        interval = settings.inference_quota_flush_interval_ms / 1000
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush_quota_writes()
+
+    def start_quota_flusher(self) -> None:
+        """Start the background quota flusher (called from the app lifespan)."""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop_quota_flusher(self) -> None:
+        """Stop the background flusher and write out what is still pending."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+        await self.flush_quota_writes()
+
+    async def get_usage_info(self, user_id: str) -> UsageInfo:
         """
         Get user's current usage quota information.
 
@@ -73,86 +252,77 @@ class E2EEInferenceService:
         Returns:
             UsageInfo with remaining requests and reset time
         """
-        tier = self.get_user_tier(user_id)
-        today = datetime.utcnow().strftime("%Y-%m-%d")
-
-        # Get today's usage from master database
-        conn = self.master_db.get_connection()
-        result = conn.execute(
-            "SELECT request_count FROM ai_usage_quota WHERE user_id = ? AND date = ?",
-            [user_id, today]
-        )
-
-        requests_today = 0
-        rows = result.fetchall()
-        if rows:
-            requests_today = rows[0][0]
-
-        # Calculate limits based on tier
-        if tier == "paid":
-            daily_limit = self.paid_tier_limit
-        else:
-            daily_limit = self.free_tier_limit
+        tier = await self._resolve_tier(user_id)
+        day = _current_day()
+        today = _day_str(day)
+        self._roll_quota_day(today)
 
-        requests_remaining = max(0, daily_limit - requests_today)
-
-        # Calculate reset time (next midnight UTC)
-        tomorrow = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-        reset_at = tomorrow.isoformat() + "Z"
+        requests_today = await self._load_request_count(user_id, today)
+        requests_remaining = max(0, self._daily_limit(tier) - requests_today)
 
         return UsageInfo(
             requests_remaining=requests_remaining,
-            reset_at=reset_at,
+            reset_at=_reset_at(day),
             tier=tier
         )
 
-    def check_and_update_quota(self, user_id: str) -> bool:
+    async def check_and_update_quota(self, user_id: str) -> UsageInfo:
         """
-        Check if user can make a request and update quota.
+        Consume one request from the user's daily quota.
+
+        The check runs against an in-memory counter (a daily window that
+        refills at UTC midnight), so requests under the limit do not wait on a
+        database write; increments are batched by the background flusher.
 
         Args:
             user_id: User UUID
 
         Returns:
-            True if user can make request, False if quota exceeded
+            UsageInfo after the increment
+
+        Raises:
+            QuotaExceeded: If the daily limit is already reached
         """
-        usage = self.get_usage_info(user_id)
+        tier = await self._resolve_tier(user_id)
+        daily_limit = self._daily_limit(tier)
+        day = _current_day()
+        today = _day_str(day)
+        self._roll_quota_day(today)
+
+        # No await between the check and the increment below
+        count = await self._load_request_count(user_id, today)
 
-        if usage.requests_remaining <= 0:
+        if count >= daily_limit:
             logger.warning(
                 "e2ee_inference_quota_exceeded",
                 user_id=user_id,
-                tier=usage.tier
+                tier=tier
             )
-            return False
+            raise QuotaExceeded(UsageInfo(
+                requests_remaining=0,
+                reset_at=_reset_at(day),
+                tier=tier
+            ))
 
-        # Update quota in database
-        today = datetime.utcnow().strftime("%Y-%m-%d")
-        current_time = int(time.time())
+        count += 1
+        self._quota_counts[user_id] = count
 
-        conn = self.master_db.get_connection()
-
-        # Upsert request count
-        conn.execute(
-            """
-            INSERT INTO ai_usage_quota (user_id, date, request_count, last_reset_at)
-            VALUES (?, ?, 1, ?)
-            ON CONFLICT(user_id, date) DO UPDATE SET
-                request_count = request_count + 1,
-                last_reset_at = excluded.last_reset_at
-            """,
-            [user_id, today, current_time]
-        )
-        conn.commit()
+        self._pending_counts[(user_id, today)] += 1
+
+        requests_remaining = daily_limit - count
 
         logger.info(
             "e2ee_inference_quota_updated",
             user_id=user_id,
-            tier=usage.tier,
-            remaining=usage.requests_remaining - 1
+            tier=tier,
+            remaining=requests_remaining
         )
 
-        return True
+        return UsageInfo(
+            requests_remaining=requests_remaining,
+            reset_at=_reset_at(day),
+            tier=tier
+        )
 
     async def execute_inference(
         self,
@@ -178,15 +348,16 @@ class E2EEInferenceService:
             E2EEInferenceResponse with encrypted result
 
         Raises:
-            ValueError: If quota exceeded or decryption fails
+            QuotaExceeded: If the daily quota is used up
+            DecryptionFailed: If key derivation or decryption fails
         """
         # 1. Check rate limits (before any processing)
-        if not self.check_and_update_quota(user_id):
-            raise ValueError("Rate limit exceeded")
+        usage = await self.check_and_update_quota(user_id)
 
         plaintext_content = None
         result_json = None
         encryption_key = None
+        cipher = None
         had_decryption_error = False
 
         try:
@@ -195,38 +366,41 @@ class E2EEInferenceService:
                 user_id=user_id,
                 task=request.task,
                 client_version=request.client_version,
-                encrypted_len=len(request.encrypted_content or ""),
-                nonce_len=len(request.nonce or ""),
-                mac_len=len(request.mac or ""),
-                client_pub_len=len(request.ephemeral_public_key or ""),
+                encrypted_len=len(request.encrypted_content),
+                nonce_len=len(request.nonce),
+                mac_len=len(request.mac),
+                client_pub_len=len(request.ephemeral_public_key),
             )
 
             # 2. Derive shared secret using X25519
-            encryption_key = e2ee_crypto.derive_shared_secret(request.ephemeral_public_key)
+            encryption_key = e2ee_crypto.derive_shared_secret_raw(request.ephemeral_public_key)
+            # One cipher (key schedule) serves both decrypt and encrypt
+            cipher = e2ee_crypto.cipher_for(encryption_key)
 
-            # 3. Decrypt content
-            plaintext_content = e2ee_crypto.decrypt_content(
+            # 3. Decrypt content (fields were base64-decoded during validation)
+            plaintext_content = e2ee_crypto.decrypt_content_raw(
                 request.encrypted_content,
                 request.nonce,
                 request.mac,
-                encryption_key
-            )
+                encryption_key,
+                cipher=cipher
+            ).decode('utf-8')
 
             # CRITICAL: Do NOT log plaintext_content
             # logger.debug("Content length", length=len(plaintext_content))
 
             # 4. Execute task (in ephemeral memory)
-            result_json = await task_processor.process_task(request.task, plaintext_content)
+            result_json = await task_processor.process_task(
+                request.task, plaintext_content, user_id=user_id
+            )
 
             # 5. Encrypt response with SAME shared secret
             encrypted_result, response_nonce, response_mac = e2ee_crypto.encrypt_response(
                 result_json,
-                encryption_key
+                encryption_key,
+                cipher=cipher
             )
 
-            # 6. Get updated usage info
-            usage = self.get_usage_info(user_id)
-
             logger.info(
                 "e2ee_inference_complete",
                 user_id=user_id,
@@ -242,7 +416,7 @@ class E2EEInferenceService:
             )
 
         except ValueError as e:
-            had_decryption_error = True
+            had_decryption_error = isinstance(e, DecryptionFailed)
             logger.warning(
                 "e2ee_inference_value_error",
                 user_id=user_id,
@@ -269,6 +443,7 @@ class E2EEInferenceService:
                 result_json = None
             if encryption_key is not None:
                 encryption_key = None
+            cipher = None
             logger.info(
                 "e2ee_inference_finalized",
                 user_id=user_id,
@@ -276,17 +451,226 @@ class E2EEInferenceService:
                 decryption_failed=had_decryption_error,
             )
 
+    async def execute_inference_batch(
+        self,
+        user_id: str,
+        batch: E2EEInferenceBatchRequest
+    ) -> E2EEInferenceBatchResponse:
+        """
+        Execute several E2EE inference tasks concurrently.
+
+        Each request takes one unit of quota and has its own key exchange.
+        Provider calls run through TaskProcessor.process_tasks_bulk, so they
+        overlap and entries asking for all three extraction tasks share one
+        combined call. Per-item failures are reported in the item rather than
+        failing the batch.
 
-# Global service instance (will be initialized with master_db)
-_inference_service = None
+        Args:
+            user_id: User UUID
+            batch: Encrypted inference requests
 
+        Returns:
+            E2EEInferenceBatchResponse with one item per request, in order
 
-def get_inference_service() -> E2EEInferenceService:
-    """Get or create the E2EE inference service instance."""
-    global _inference_service
+        Raises:
+            QuotaExceeded: If no quota is left for the first request
+        """
+        # Quota first; requests past the limit are reported per item
+        usage = await self.check_and_update_quota(user_id)
+        admitted = 1
+        for _ in batch.requests[1:]:
+            try:
+                usage = await self.check_and_update_quota(user_id)
+            except QuotaExceeded as e:
+                usage = e.usage
+                break
+            admitted += 1
 
-    if _inference_service is None:
-        from app.master_db import master_db_manager
-        _inference_service = E2EEInferenceService(master_db_manager)
+        logger.info(
+            "e2ee_inference_batch_start",
+            user_id=user_id,
+            size=len(batch.requests),
+            admitted=admitted,
+        )
 
+        items = [E2EEInferenceBatchItem(error="quota_exceeded") for _ in batch.requests]
+        ciphers: Dict[int, Tuple[bytes, ChaCha20Poly1305]] = {}
+        work = []
+
+        try:
+            for index, request in enumerate(batch.requests[:admitted]):
+                try:
+                    encryption_key = e2ee_crypto.derive_shared_secret_raw(request.ephemeral_public_key)
+                    cipher = e2ee_crypto.cipher_for(encryption_key)
+                    plaintext_content = e2ee_crypto.decrypt_content_raw(
+                        request.encrypted_content,
+                        request.nonce,
+                        request.mac,
+                        encryption_key,
+                        cipher=cipher
+                    ).decode('utf-8')
+                except ValueError:
+                    items[index] = E2EEInferenceBatchItem(error="decryption_failed")
+                    continue
+
+                ciphers[index] = (encryption_key, cipher)
+                work.append((index, request.task, plaintext_content))
+
+            results = await task_processor.process_tasks_bulk(
+                [(task, plaintext_content) for _, task, plaintext_content in work],
+                user_id=user_id
+            )
+
+            for (index, task, _), result_json in zip(work, results):
+                if isinstance(result_json, BaseException):
+                    logger.warning(
+                        "e2ee_inference_batch_item_failed",
+                        user_id=user_id,
+                        task=task,
+                        error=str(result_json),
+                    )
+                    items[index] = E2EEInferenceBatchItem(error="processing_failed")
+                    continue
+
+                encryption_key, cipher = ciphers[index]
+                encrypted_result, response_nonce, response_mac = e2ee_crypto.encrypt_response(
+                    result_json, encryption_key, cipher=cipher
+                )
+                items[index] = E2EEInferenceBatchItem(
+                    encrypted_result=encrypted_result,
+                    nonce=response_nonce,
+                    mac=response_mac
+                )
+
+        finally:
+            # Clear sensitive data from memory
+            work = None
+            ciphers = None
+
+        logger.info(
+            "e2ee_inference_batch_complete",
+            user_id=user_id,
+            size=len(items),
+            failed=sum(item.error is not None for item in items),
+        )
+
+        return E2EEInferenceBatchResponse(results=items, usage=usage)
+
+    async def start_inference_stream(
+        self,
+        user_id: str,
+        request: E2EEInferenceRequest
+    ) -> AsyncIterator[str]:
+        """
+        Start a streamed E2EE inference task.
+
+        Quota, key derivation and decryption run before this returns, so
+        those failures surface as errors before any response is sent. The
+        returned iterator yields newline-delimited E2EEStreamFrame JSON.
+
+        Args:
+            user_id: User UUID
+            request: E2EE inference request
+
+        Returns:
+            Async iterator of encoded frames
+
+        Raises:
+            QuotaExceeded: If the daily quota is used up
+            DecryptionFailed: If key derivation or decryption fails
+        """
+        usage = await self.check_and_update_quota(user_id)
+
+        logger.info(
+            "e2ee_inference_stream_start",
+            user_id=user_id,
+            task=request.task,
+            client_version=request.client_version,
+        )
+
+        encryption_key = e2ee_crypto.derive_shared_secret_raw(request.ephemeral_public_key)
+        cipher = e2ee_crypto.cipher_for(encryption_key)
+        plaintext_content = e2ee_crypto.decrypt_content_raw(
+            request.encrypted_content,
+            request.nonce,
+            request.mac,
+            encryption_key,
+            cipher=cipher
+        ).decode('utf-8')
+
+        return self._stream_frames(
+            user_id, request.task, plaintext_content, encryption_key, cipher, usage
+        )
+
+    async def _stream_frames(
+        self,
+        user_id: str,
+        task: str,
+        plaintext_content: str,
+        encryption_key: bytes,
+        cipher: ChaCha20Poly1305,
+        usage: UsageInfo
+    ) -> AsyncIterator[str]:
+        """Run the task and encrypt each streamed chunk under a counter nonce."""
+        nonces = e2ee_crypto.counter_nonces()
+        frame_count = 0
+
+        try:
+            async for kind, payload in task_processor.process_task_stream(
+                task, plaintext_content, user_id=user_id
+            ):
+                encrypted, nonce, mac = e2ee_crypto.encrypt_response(
+                    payload, encryption_key, next(nonces), cipher=cipher
+                )
+                frame = E2EEStreamFrame(
+                    type=kind,
+                    encrypted_result=encrypted,
+                    nonce=nonce,
+                    mac=mac,
+                    usage=usage if kind == "result" else None,
+                )
+                frame_count += 1
+                yield frame.model_dump_json(exclude_none=True) + "\n"
+
+            logger.info(
+                "e2ee_inference_stream_complete",
+                user_id=user_id,
+                task=task,
+                frames=frame_count,
+                remaining=usage.requests_remaining
+            )
+
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            logger.error("e2ee_inference_stream_failed", user_id=user_id, task=task, error=str(e))
+            error = "LLM backend unavailable" if isinstance(e, ProviderUnavailable) else "Internal processing error"
+            yield E2EEStreamFrame(type="error", error=error).model_dump_json(exclude_none=True) + "\n"
+
+        finally:
+            # Clear sensitive data from memory
+            plaintext_content = None
+            encryption_key = None
+            cipher = None
+
+
+# Application-wide instance, created once in the application lifespan
+_inference_service: Optional[E2EEInferenceService] = None
+
+
+def init_inference_service(master_db: MasterDatabaseManager) -> E2EEInferenceService:
+    """Create the E2EE inference service. Called once from the application lifespan."""
+    global _inference_service
+
+    _inference_service = E2EEInferenceService(master_db)
     return _inference_service
+
+
+def get_inference_service(request: Request) -> E2EEInferenceService:
+    """FastAPI dependency returning the service stored on app.state."""
+    return request.app.state.inference_service
+
+
+def invalidate_user_tier(user_id: str) -> None:
+    """Drop a user's cached tier on the running service, if one exists."""
+    if _inference_service is not None:
+        _inference_service.invalidate_user_tier(user_id)
@@ -1,10 +1,19 @@
 """
 E2EE inference task processors using LLM providers.
 """
+import asyncio
+import contextvars
 import json
+import orjson
 import hashlib
+import time
+from datetime import datetime, timezone
 import structlog
-from typing import Optional
+from collections import OrderedDict
+from typing import (
+    AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple, Type, TypeVar, Union
+)
+from pydantic import BaseModel, ValidationError
 
 from app.inference.models import (
     InferenceTask,
@@ -14,20 +23,222 @@ from app.inference.models import (
     CaptureMetadataResult,
     CaptureIntent,
     ProviderInfo,
-    Memory,
-    MemoryType,
-    Tag,
 )
+from app.inference.fingerprint import log_fingerprint
 from app.inference.llm_models import InferenceRequest, Message, ModelType
-from app.inference.providers.anthropic import AnthropicProvider
-from app.inference.providers.openai import OpenAIProvider
-from app.inference.providers.google import GoogleProvider
 from app.config import settings
+from app.inference.errors import ProviderUnavailable
 
 
 logger = structlog.get_logger()
 
 
+# Set while a task runs under process_task_stream; receives raw LLM deltas
+_delta_sink: contextvars.ContextVar[Optional[Callable[[str], None]]] = contextvars.ContextVar(
+    "inference_delta_sink", default=None
+)
+
+_STREAM_DONE = object()
+
+ResultT = TypeVar("ResultT", bound=BaseModel)
+
+# (user_id, task, model, sha256(content)) identifying one cached result
+ResultKey = Tuple[str, str, str, bytes]
+
+# Upper bound on concurrent provider calls from one bulk request
+BULK_CONCURRENCY = 16
+
+# Output token budget per task; answers are short JSON documents
+TASK_MAX_TOKENS = {
+    InferenceTask.TAGGING: 256,
+    InferenceTask.INSIGHT_EXTRACTION: 384,
+    InferenceTask.MEMORY_DISTILLATION: 512,
+    InferenceTask.CAPTURE_METADATA: 512,
+    "combined": 1280,
+}
+
+# Tasks answered together by one combined LLM call
+COMBINED_TASKS = (
+    InferenceTask.MEMORY_DISTILLATION,
+    InferenceTask.TAGGING,
+    InferenceTask.INSIGHT_EXTRACTION,
+)
+
+
+def _strip_code_fence(content: str) -> str:
+    """Remove a ```json ... ``` wrapper without copying unfenced answers."""
+    if not content.startswith("```"):
+        return content
+    return content.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+
+
+def _content_digest(plaintext_content: str) -> bytes:
+    """
+    Digest identifying a plaintext in the result cache (computed once per call).
+
+    Whitespace is normalized first, so re-saved entries that differ only in
+    spacing or line breaks share one cached result. Case is kept: results
+    quote the entry back (memories, tags), so it must not leak across edits.
+    """
+    normalized = " ".join(plaintext_content.split())
+    return hashlib.sha256(normalized.encode("utf-8")).digest()
+
+
+def _dump_json(result: BaseModel) -> bytes:
+    """Serialize a task result straight to UTF-8 JSON bytes (no str round-trip)."""
+    return result.__pydantic_serializer__.to_json(result, by_alias=True)
+
+
+def _dump_capture_metadata(metadata: CaptureMetadataResult) -> bytes:
+    """Serialize capture metadata wrapped to match the client-side InferenceResult schema."""
+    return orjson.dumps(
+        {
+            "capture_metadata": metadata.model_dump(by_alias=True),
+            "confidence": metadata.confidence,
+        }
+    )
+
+
+# Content shorter than this (after stripping) gets an empty result without an
+# LLM call; content longer than MAX_CONTENT_CHARS is rejected, which bounds the
+# input tokens of every provider call
+MIN_CONTENT_CHARS = 3
+MAX_CONTENT_CHARS = settings.inference_max_content_chars
+
+_EMPTY_RESULTS = {
+    InferenceTask.MEMORY_DISTILLATION: _dump_json(MemoryDistillationResult(confidence=0.0)),
+    InferenceTask.TAGGING: _dump_json(TaggingResult(confidence=0.0)),
+    InferenceTask.INSIGHT_EXTRACTION: _dump_json(InsightExtractionResult(confidence=0.0)),
+    InferenceTask.CAPTURE_METADATA: _dump_capture_metadata(CaptureMetadataResult(confidence=0.0)),
+}
+
+
+# ========== System Prompts ==========
+# Static per task, so providers can serve them from their prompt cache
+
+_SYSTEM_MEMORY_DISTILLATION = """You are a memory extraction assistant. Your task is to identify and extract important memories from journal entries. Focus on:
+
+1. Commitments - Future actions or promises ("I will...", "Need to...", "Should call...")
+2. Facts - Learned information ("Flutter uses Dart", "The meeting is at 3pm")
+3. Insights - Realizations or conclusions ("I realized that...", "Understood why...")
+4. Patterns - Recurring behaviors ("I always...", "Every time...")
+5. Preferences - Personal preferences ("I prefer...", "I like...")
+
+Return a JSON object with this exact structure:
+{
+  "memories": [
+    {"type": "commitment|fact|insight|pattern|preference", "content": "extracted memory", "confidence": 0.0-1.0}
+  ],
+  "confidence": 0.0-1.0
+}
+
+Only extract clear, meaningful memories. Assign confidence based on how explicit the memory is in the text."""
+
+_SYSTEM_TAGGING = """You are a tagging assistant. Your task is to extract relevant tags from journal entries.
+
+Common tag categories:
+- Topics: work, personal, family, health, finance, learning
+- Types: task, reminder, question, idea, reflection, gratitude
+- Entities: project, meeting, deadline, goal, event
+
+Return a JSON object with this exact structure:
+{
+  "tags": [
+    {"tag": "lowercase_tag", "confidence": 0.0-1.0}
+  ],
+  "confidence": 0.0-1.0
+}
+
+Extract 3-7 most relevant tags. Use lowercase, single words. Assign confidence based on relevance."""
+
+_SYSTEM_INSIGHT_EXTRACTION = """You are an insight extraction assistant. Your task is to identify deeper insights, patterns, and connections in journal entries.
+
+Focus on:
+- Recurring themes or patterns
+- Connections to broader goals or values
+- Emotional patterns or trends
+- Areas of growth or concern
+- Underlying motivations
+
+Return a JSON object with this exact structure:
+{
+  "insights": [
+    "First insight as a complete sentence",
+    "Second insight as a complete sentence"
+  ],
+  "confidence": 0.0-1.0
+}
+
+Provide 1-3 meaningful insights. Write them as helpful observations that could aid self-reflection."""
+
+_SYSTEM_COMBINED = """You are a journal analysis assistant. For one journal entry, perform three extractions at once.
+
+1. memory_distillation - Extract important memories:
+   - Commitments - Future actions or promises ("I will...", "Need to...", "Should call...")
+   - Facts - Learned information ("Flutter uses Dart", "The meeting is at 3pm")
+   - Insights - Realizations or conclusions ("I realized that...", "Understood why...")
+   - Patterns - Recurring behaviors ("I always...", "Every time...")
+   - Preferences - Personal preferences ("I prefer...", "I like...")
+   Only extract clear, meaningful memories. Assign confidence based on how explicit the memory is in the text.
+
+2. tagging - Extract 3-7 relevant tags. Use lowercase, single words.
+   Common tag categories:
+   - Topics: work, personal, family, health, finance, learning
+   - Types: task, reminder, question, idea, reflection, gratitude
+   - Entities: project, meeting, deadline, goal, event
+
+3. insight_extraction - Provide 1-3 deeper insights as complete sentences: recurring themes, connections to broader goals or values, emotional patterns, areas of growth or concern, underlying motivations.
+
+Return a JSON object with this exact structure:
+{
+  "memory_distillation": {
+    "memories": [
+      {"type": "commitment|fact|insight|pattern|preference", "content": "extracted memory", "confidence": 0.0-1.0}
+    ],
+    "confidence": 0.0-1.0
+  },
+  "tagging": {
+    "tags": [
+      {"tag": "lowercase_tag", "confidence": 0.0-1.0}
+    ],
+    "confidence": 0.0-1.0
+  },
+  "insight_extraction": {
+    "insights": ["First insight as a complete sentence"],
+    "confidence": 0.0-1.0
+  }
+}"""
+
+_SYSTEM_CAPTURE_METADATA = """You are a metadata extraction assistant. Analyze journal entries and extract structured metadata.
+
+Use the CURRENT TIME CONTEXT given with each entry for reminder time calculations.
+
+Return a JSON object with this exact structure:
+{
+  "intent": "question|reminder|task|note|reflection|quote|idea",
+  "extractedQuestion": "string or null",
+  "extractedTask": "string or null",
+  "inferredReminderTime": "ISO8601 string or null",
+  "extractedEntities": ["entity1", "entity2"],
+  "suggestedTags": ["tag1", "tag2"],
+  "confidence": 0.0-1.0,
+  "requiresResponse": true|false
+}
+
+Guidelines:
+- intent: Classify the primary intent
+- extractedQuestion: If question intent, extract the core question
+- extractedTask: If task intent, extract the action item
+- inferredReminderTime: If reminder intent, parse time expressions (e.g., "tomorrow at 2pm", "in 2 hours") into ISO8601 UTC timestamp
+- extractedEntities: Extract people, places, concepts mentioned (max 5)
+- suggestedTags: Extract 1-5 relevant tags (work, personal, health, urgent, family, etc.)
+- requiresResponse: true if the user expects an AI response (questions, complex requests)"""
+
+_SYSTEM_JSON_REPAIR = """The following text was meant to be a single JSON object but is not valid JSON.
+
+Return ONLY the corrected JSON object, keeping its structure and values. No explanation, no markdown."""
+
+
 class TaskProcessor:
     """
     Processes inference tasks by calling LLM providers.
@@ -40,25 +251,46 @@ class TaskProcessor:
         self._model = None
         self._provider_name = None
 
+        # (user_id, task, model, sha256(content)) -> (result_json, monotonic
+        # expiry). Scoped per user so response latency cannot reveal what
+        # another user submitted. Holds derived results only, never
+        # plaintext; LRU-bounded with a TTL.
+        self._result_cache: "OrderedDict[ResultKey, Tuple[bytes, float]]" = OrderedDict()
+        self._result_cache_size = settings.inference_result_cache_size
+        self._result_cache_ttl = settings.inference_result_cache_ttl_seconds
+        # Provider calls in progress, by the same key as the result cache
+        self._inflight: Dict[ResultKey, asyncio.Future] = {}
+
     def _ensure_provider(self):
-        """Lazily initialize the LLM provider."""
+        """
+        Lazily initialize the LLM provider.
+
+        Provider modules are imported here so only the selected vendor SDK is
+        loaded into the worker.
+        """
         if self._provider is not None:
             return
 
         if settings.gemini_api_key:
+            from app.inference.providers.google import GoogleProvider
+
             self._provider = GoogleProvider()
-            self._model = ModelType.GEMINI_FLASH  # Fast and cheap for simple tasks
+            self._model = ModelType.GEMINI_FLASH.value  # Fast and cheap for simple tasks
             self._provider_name = "google"
         elif settings.openai_api_key:
+            from app.inference.providers.openai import OpenAIProvider
+
             self._provider = OpenAIProvider()
-            self._model = ModelType.GPT_4O_MINI
+            self._model = ModelType.GPT_4O_MINI.value
             self._provider_name = "openai"
         elif settings.anthropic_api_key:
+            from app.inference.providers.anthropic import AnthropicProvider
+
             self._provider = AnthropicProvider()
-            self._model = ModelType.CLAUDE_HAIKU
+            self._model = ModelType.CLAUDE_HAIKU.value
             self._provider_name = "anthropic"
         else:
-            raise ValueError("No LLM provider API key configured")
+            raise ProviderUnavailable("No LLM provider API key configured")
 
     def _get_model_for_provider(self):
         """Get the appropriate model for the current provider."""
@@ -71,7 +303,7 @@ class TaskProcessor:
         """
         try:
             self._ensure_provider()
-        except ValueError:
+        except ProviderUnavailable:
             return ProviderInfo(provider=None, model=None)
 
         model = self._get_model_for_provider()
@@ -79,40 +311,111 @@ class TaskProcessor:
 
         return ProviderInfo(provider=self._provider_name, model=model_name)
 
-    async def process_task(self, task: InferenceTask, plaintext_content: str) -> str:
+    async def warm_up(self) -> None:
+        """
+        Prime the configured provider's connection pool.
+
+        Called at startup so the first user request does not pay the TCP/TLS
+        handshake. Does nothing when no provider is configured.
+        """
+        try:
+            self._ensure_provider()
+        except ProviderUnavailable:
+            return
+
+        await self._provider.warm_up()
+        logger.info("llm_provider_warmed_up", provider=self._provider_name)
+
+    def _result_key(
+        self, user_id: str, task: InferenceTask, content_digest: bytes
+    ) -> ResultKey:
+        """Cache key for one user's task result on the current model."""
+        return (user_id, task, self._get_model_for_provider(), content_digest)
+
+    def _cached_result(self, key: ResultKey) -> Optional[bytes]:
+        """Get a cached result if present and not expired."""
+        entry = self._result_cache.get(key)
+        if entry is None:
+            return None
+
+        result_json, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._result_cache[key]
+            return None
+
+        self._result_cache.move_to_end(key)
+        return result_json
+
+    def _store_result(self, key: ResultKey, result_json: bytes) -> None:
+        """Cache a result, evicting the least recently used entries."""
+        if self._result_cache_size <= 0:
+            return
+
+        self._result_cache[key] = (result_json, time.monotonic() + self._result_cache_ttl)
+        self._result_cache.move_to_end(key)
+        while len(self._result_cache) > self._result_cache_size:
+            self._result_cache.popitem(last=False)
+
+    async def process_task(
+        self, task: InferenceTask, plaintext_content: str, *, user_id: str
+    ) -> bytes:
         """
         Process an inference task on plaintext content.
 
         Args:
             task: The inference task to execute
             plaintext_content: Decrypted user content
+            user_id: Authenticated user; cached and in-flight results are
+                only shared between that user's own requests
 
         Returns:
-            JSON string of task result
+            UTF-8 JSON of the task result, ready to encrypt
 
         Note: plaintext_content should be cleared from memory after this call
         """
         try:
-            if task == InferenceTask.MEMORY_DISTILLATION:
-                result = await self._memory_distillation(plaintext_content)
-                result_json = result.model_dump_json(by_alias=True)
-            elif task == InferenceTask.TAGGING:
-                result = await self._tagging(plaintext_content)
-                result_json = result.model_dump_json(by_alias=True)
-            elif task == InferenceTask.INSIGHT_EXTRACTION:
-                result = await self._insight_extraction(plaintext_content)
-                result_json = result.model_dump_json(by_alias=True)
-            elif task == InferenceTask.CAPTURE_METADATA:
-                metadata = await self._capture_metadata(plaintext_content)
-                # Wrap to match client-side InferenceResult schema
-                result_json = json.dumps(
-                    {
-                        "capture_metadata": metadata.model_dump(by_alias=True),
-                        "confidence": metadata.confidence,
-                    }
-                )
+            if len(plaintext_content) > MAX_CONTENT_CHARS:
+                raise ValueError(f"Content too long (max {MAX_CONTENT_CHARS} characters)")
+
+            if len(plaintext_content.strip()) < MIN_CONTENT_CHARS and task in _EMPTY_RESULTS:
+                # Nothing for the model to extract; skip the provider round-trip
+                logger.info("task_result_summary", task=task, trivial_content=True)
+                return _EMPTY_RESULTS[task]
+
+            # Capture metadata resolves times against "now"; never reuse it
+            cache_key = None
+            if self._result_cache_size > 0 and task != InferenceTask.CAPTURE_METADATA:
+                cache_key = self._result_key(user_id, task, _content_digest(plaintext_content))
+                result_json = self._cached_result(cache_key)
+                if result_json is not None:
+                    logger.info(
+                        "task_result_summary",
+                        task=task,
+                        provider=self._provider_name,
+                        model=cache_key[2],
+                        result_length=len(result_json),
+                        cached=True,
+                    )
+                    return result_json
+
+            coalesced = False
+            if cache_key is None:
+                result_json = await self._run_task(task, plaintext_content)
             else:
-                raise ValueError(f"Unknown task: {task}")
+                # Identical concurrent requests share one provider call. The
+                # shared task is shielded so one caller disconnecting does not
+                # cancel it for the others.
+                shared = self._inflight.get(cache_key)
+                coalesced = shared is not None
+                if shared is None:
+                    shared = asyncio.ensure_future(
+                        self._run_task(task, plaintext_content, cache_key)
+                    )
+                    self._inflight[cache_key] = shared
+                    shared.add_done_callback(
+                        lambda done: self._forget_inflight(cache_key, done)
+                    )
+                result_json = await asyncio.shield(shared)
 
             logger.info(
                 "task_result_summary",
@@ -120,7 +423,8 @@ class TaskProcessor:
                 provider=self._provider_name,
                 model=str(self._get_model_for_provider()),
                 result_length=len(result_json),
-                result_sha256=hashlib.sha256(result_json.encode("utf-8")).hexdigest(),
+                result_fingerprint=log_fingerprint(result_json),
+                coalesced=coalesced,
             )
 
             return result_json
@@ -129,50 +433,179 @@ class TaskProcessor:
             logger.error("task_processing_failed", task=task, error=str(e))
             raise
 
-    async def _memory_distillation(self, content: str) -> MemoryDistillationResult:
+    async def _run_task(
+        self,
+        task: InferenceTask,
+        plaintext_content: str,
+        cache_key: Optional[ResultKey] = None
+    ) -> bytes:
+        """Call the provider for one task and cache the result under cache_key."""
+        if task == InferenceTask.MEMORY_DISTILLATION:
+            result = await self._memory_distillation(plaintext_content)
+            result_json = _dump_json(result)
+        elif task == InferenceTask.TAGGING:
+            result = await self._tagging(plaintext_content)
+            result_json = _dump_json(result)
+        elif task == InferenceTask.INSIGHT_EXTRACTION:
+            result = await self._insight_extraction(plaintext_content)
+            result_json = _dump_json(result)
+        elif task == InferenceTask.CAPTURE_METADATA:
+            metadata = await self._capture_metadata(plaintext_content)
+            result_json = _dump_capture_metadata(metadata)
+        else:
+            raise ValueError(f"Unknown task: {task}")
+
+        if cache_key is not None:
+            self._store_result(cache_key, result_json)
+
+        return result_json
+
+    def _forget_inflight(self, cache_key: ResultKey, done: asyncio.Future) -> None:
+        """Drop a finished shared call; every caller has already been woken."""
+        self._inflight.pop(cache_key, None)
+        if not done.cancelled():
+            # Mark the exception retrieved when every caller had gone away
+            done.exception()
+
+    async def process_combined(self, plaintext_content: str, *, user_id: str) -> Dict[str, bytes]:
         """
-        Extract memories (commitments, facts, insights, patterns, preferences) from text.
+        Run memory distillation, tagging and insight extraction in one LLM call.
+
+        Each result is cached under its own task key, so single-task calls for
+        the same content are then served without another provider call.
+
+        Args:
+            plaintext_content: Decrypted user content
+            user_id: Authenticated user the results are cached for
+
+        Returns:
+            Result JSON per task name
         """
-        system_prompt = """You are a memory extraction assistant. Your task is to identify and extract important memories from journal entries. Focus on:
+        if len(plaintext_content) > MAX_CONTENT_CHARS:
+            raise ValueError(f"Content too long (max {MAX_CONTENT_CHARS} characters)")
 
-1. Commitments - Future actions or promises ("I will...", "Need to...", "Should call...")
-2. Facts - Learned information ("Flutter uses Dart", "The meeting is at 3pm")
-3. Insights - Realizations or conclusions ("I realized that...", "Understood why...")
-4. Patterns - Recurring behaviors ("I always...", "Every time...")
-5. Preferences - Personal preferences ("I prefer...", "I like...")
+        if len(plaintext_content.strip()) < MIN_CONTENT_CHARS:
+            return {task.value: _EMPTY_RESULTS[task] for task in COMBINED_TASKS}
 
-Return a JSON object with this exact structure:
-{
-  "memories": [
-    {"type": "commitment|fact|insight|pattern|preference", "content": "extracted memory", "confidence": 0.0-1.0}
-  ],
-  "confidence": 0.0-1.0
-}
+        content_digest = _content_digest(plaintext_content)
+        keys = {task: self._result_key(user_id, task, content_digest) for task in COMBINED_TASKS}
+        cached = {task: self._cached_result(key) for task, key in keys.items()}
+        if all(result_json is not None for result_json in cached.values()):
+            return {task.value: result_json for task, result_json in cached.items()}
 
-Only extract clear, meaningful memories. Assign confidence based on how explicit the memory is in the text."""
+        results = await self._combined_extract(plaintext_content)
+
+        output = {}
+        for task, result in zip(COMBINED_TASKS, results):
+            result_json = _dump_json(result)
+            self._store_result(keys[task], result_json)
+            output[task.value] = result_json
+
+        logger.info(
+            "combined_task_result_summary",
+            provider=self._provider_name,
+            model=str(self._get_model_for_provider()),
+            result_length=sum(len(result_json) for result_json in output.values()),
+        )
+
+        return output
+
+    async def process_tasks_bulk(
+        self, items: Sequence[Tuple[InferenceTask, str]], *, user_id: str
+    ) -> List[Union[bytes, BaseException]]:
+        """
+        Process several tasks concurrently.
+
+        Provider calls overlap, so wall-clock time tracks the slowest call
+        rather than the sum. At most BULK_CONCURRENCY run at once.
+
+        Args:
+            items: (task, plaintext_content) pairs
+            user_id: Authenticated user the items belong to
+
+        Returns:
+            Result JSON or the raised exception for each item, in input order
+        """
+        self._ensure_provider()
+        semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+        # Content that asks for all combined tasks gets one fused call
+        tasks_by_content: Dict[str, set] = {}
+        for task, content in items:
+            tasks_by_content.setdefault(content, set()).add(task)
+
+        async def run_combined(content: str) -> Dict[str, bytes]:
+            async with semaphore:
+                return await self.process_combined(content, user_id=user_id)
+
+        combined = {
+            content: asyncio.ensure_future(run_combined(content))
+            for content, tasks in tasks_by_content.items()
+            if tasks.issuperset(COMBINED_TASKS)
+        }
+
+        async def run(task: InferenceTask, content: str) -> bytes:
+            pending = combined.get(content) if task in COMBINED_TASKS else None
+            if pending is not None:
+                try:
+                    return (await pending)[task]
+                except Exception:
+                    pass  # Fall back to a single-task call
+            async with semaphore:
+                return await self.process_task(task, content, user_id=user_id)
+
+        return await asyncio.gather(
+            *(run(task, content) for task, content in items),
+            return_exceptions=True
+        )
+
+    async def process_task_stream(
+        self, task: InferenceTask, plaintext_content: str, *, user_id: str
+    ) -> AsyncIterator[Tuple[str, Union[str, bytes]]]:
+        """
+        Process an inference task while streaming the raw LLM output.
+
+        Yields:
+            ("delta", text) for each chunk the provider streams, then
+            ("result", result_json) with the same bytes process_task returns
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        # The worker task copies the current context, sink included
+        token = _delta_sink.set(queue.put_nowait)
+        try:
+            worker = asyncio.create_task(
+                self.process_task(task, plaintext_content, user_id=user_id)
+            )
+        finally:
+            _delta_sink.reset(token)
+        worker.add_done_callback(lambda _: queue.put_nowait(_STREAM_DONE))
 
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_DONE:
+                    break
+                yield "delta", item
+
+            yield "result", worker.result()
+        finally:
+            if not worker.done():
+                worker.cancel()
+
+    async def _memory_distillation(self, content: str) -> MemoryDistillationResult:
+        """
+        Extract memories (commitments, facts, insights, patterns, preferences) from text.
+        """
         user_prompt = f"Extract memories from this journal entry:\n\n{content}"
 
         response = await self._call_llm(
-            system_prompt, user_prompt, task=InferenceTask.MEMORY_DISTILLATION
+            _SYSTEM_MEMORY_DISTILLATION, user_prompt, task=InferenceTask.MEMORY_DISTILLATION
         )
 
         try:
-            result_dict = json.loads(response)
-            # Validate and convert to Pydantic model
-            memories = []
-            for mem in result_dict.get("memories", []):
-                memories.append(Memory(
-                    type=MemoryType(mem["type"]),
-                    content=mem["content"],
-                    confidence=float(mem["confidence"])
-                ))
-
-            return MemoryDistillationResult(
-                memories=memories,
-                confidence=float(result_dict.get("confidence", 0.8))
-            )
-        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            return await self._validate_result(MemoryDistillationResult, response, InferenceTask.MEMORY_DISTILLATION)
+        except ValidationError as e:
             logger.warning("memory_distillation_parse_error", error=str(e))
             # Return empty result on parse error
             return MemoryDistillationResult(memories=[], confidence=0.0)
@@ -181,41 +614,13 @@ Only extract clear, meaningful memories. Assign confidence based on how explicit
         """
         Extract relevant tags from text.
         """
-        system_prompt = """You are a tagging assistant. Your task is to extract relevant tags from journal entries.
-
-Common tag categories:
-- Topics: work, personal, family, health, finance, learning
-- Types: task, reminder, question, idea, reflection, gratitude
-- Entities: project, meeting, deadline, goal, event
-
-Return a JSON object with this exact structure:
-{
-  "tags": [
-    {"tag": "lowercase_tag", "confidence": 0.0-1.0}
-  ],
-  "confidence": 0.0-1.0
-}
-
-Extract 3-7 most relevant tags. Use lowercase, single words. Assign confidence based on relevance."""
-
         user_prompt = f"Extract tags from this journal entry:\n\n{content}"
 
-        response = await self._call_llm(system_prompt, user_prompt, task=InferenceTask.TAGGING)
+        response = await self._call_llm(_SYSTEM_TAGGING, user_prompt, task=InferenceTask.TAGGING)
 
         try:
-            result_dict = json.loads(response)
-            tags = []
-            for tag_data in result_dict.get("tags", []):
-                tags.append(Tag(
-                    tag=tag_data["tag"].lower(),
-                    confidence=float(tag_data["confidence"])
-                ))
-
-            return TaggingResult(
-                tags=tags,
-                confidence=float(result_dict.get("confidence", 0.8))
-            )
-        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            return await self._validate_result(TaggingResult, response, InferenceTask.TAGGING)
+        except ValidationError as e:
             logger.warning("tagging_parse_error", error=str(e))
             return TaggingResult(tags=[], confidence=0.0)
 
@@ -223,47 +628,98 @@ Extract 3-7 most relevant tags. Use lowercase, single words. Assign confidence b
         """
         Extract insights and patterns from text.
         """
-        system_prompt = """You are an insight extraction assistant. Your task is to identify deeper insights, patterns, and connections in journal entries.
+        user_prompt = f"Extract insights from this journal entry:\n\n{content}"
 
-Focus on:
-- Recurring themes or patterns
-- Connections to broader goals or values
-- Emotional patterns or trends
-- Areas of growth or concern
-- Underlying motivations
+        response = await self._call_llm(
+            _SYSTEM_INSIGHT_EXTRACTION, user_prompt, task=InferenceTask.INSIGHT_EXTRACTION
+        )
 
-Return a JSON object with this exact structure:
-{
-  "insights": [
-    "First insight as a complete sentence",
-    "Second insight as a complete sentence"
-  ],
-  "confidence": 0.0-1.0
-}
+        try:
+            return await self._validate_result(InsightExtractionResult, response, InferenceTask.INSIGHT_EXTRACTION)
+        except ValidationError as e:
+            logger.warning("insight_extraction_parse_error", error=str(e))
+            return InsightExtractionResult(insights=[], confidence=0.0)
 
-Provide 1-3 meaningful insights. Write them as helpful observations that could aid self-reflection."""
+    async def _combined_extract(
+        self, content: str
+    ) -> Tuple[MemoryDistillationResult, TaggingResult, InsightExtractionResult]:
+        """
+        Extract memories, tags and insights from text in one LLM call.
 
-        user_prompt = f"Extract insights from this journal entry:\n\n{content}"
+        Sends the entry once instead of three times; each section of the
+        answer uses the same schema as the single-task prompt.
+        """
+        user_prompt = f"Analyze this journal entry:\n\n{content}"
 
         response = await self._call_llm(
-            system_prompt, user_prompt, task=InferenceTask.INSIGHT_EXTRACTION
+            _SYSTEM_COMBINED, user_prompt, task="combined"
         )
 
         try:
             result_dict = json.loads(response)
-            return InsightExtractionResult(
-                insights=result_dict.get("insights", []),
-                confidence=float(result_dict.get("confidence", 0.7))
+        except json.JSONDecodeError:
+            try:
+                result_dict = json.loads(await self._repair_json(response, "combined"))
+            except json.JSONDecodeError as e:
+                logger.warning("combined_extract_parse_error", error=str(e))
+                result_dict = {}
+
+        sections = []
+        for task, model in (
+            (InferenceTask.MEMORY_DISTILLATION, MemoryDistillationResult),
+            (InferenceTask.TAGGING, TaggingResult),
+            (InferenceTask.INSIGHT_EXTRACTION, InsightExtractionResult),
+        ):
+            try:
+                sections.append(model.model_validate(result_dict.get(task.value) or {}))
+            except (AttributeError, ValidationError) as e:
+                logger.warning("combined_extract_parse_error", task=task, error=str(e))
+                sections.append(model(confidence=0.0))
+
+        return tuple(sections)
+
+    async def _repair_json(self, response: str, task) -> str:
+        """
+        Ask the model once to turn a malformed answer into valid JSON.
+
+        The repair output is not streamed: clients already received the
+        original deltas.
+        """
+        logger.warning("llm_json_repair", task=task, response_length=len(response))
+
+        token = _delta_sink.set(None)
+        try:
+            return await self._call_llm(
+                _SYSTEM_JSON_REPAIR, response, task=task, temperature=0.0
             )
-        except (json.JSONDecodeError, KeyError, ValueError) as e:
-            logger.warning("insight_extraction_parse_error", error=str(e))
-            return InsightExtractionResult(insights=[], confidence=0.0)
+        finally:
+            _delta_sink.reset(token)
+
+    async def _validate_result(self, model: Type[ResultT], response: str, task) -> ResultT:
+        """
+        Validate an LLM answer against a result model.
+
+        Malformed JSON gets one repair attempt; answers that parse but do not
+        match the schema are not retried.
+
+        Raises:
+            ValidationError: If the answer (after any repair) does not validate
+        """
+        try:
+            return model.model_validate_json(response)
+        except ValidationError as e:
+            if not response or e.errors()[0]["type"] != "json_invalid":
+                raise
+
+        return model.model_validate_json(await self._repair_json(response, task))
 
     async def _call_llm(
         self,
         system_prompt: str,
         user_prompt: str,
         task: Optional[InferenceTask] = None,
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.3,
     ) -> str:
         """
         Call the LLM provider with the given prompts.
@@ -271,34 +727,46 @@ Provide 1-3 meaningful insights. Write them as helpful observations that could a
         Args:
             system_prompt: System instructions
             user_prompt: User message with content
+            task: Task name, for logging
+            max_tokens: Output token budget (defaults to the task's TASK_MAX_TOKENS)
+            temperature: Sampling temperature (low for consistent JSON output)
 
         Returns:
             LLM response content string
         """
         self._ensure_provider()
 
-        request = InferenceRequest(
+        # Every field is set here from trusted values; skip validation
+        request = InferenceRequest.model_construct(
             messages=[
                 Message(role="system", content=system_prompt),
                 Message(role="user", content=user_prompt)
             ],
             model=self._get_model_for_provider(),
-            max_tokens=1024,
-            temperature=0.3  # Lower temperature for more consistent JSON output
+            max_tokens=max_tokens or TASK_MAX_TOKENS.get(task, 1024),
+            temperature=temperature,
+            stream=False,
+            json_mode=True
         )
 
-        response = await self._provider.generate(request)
-
-        # Extract JSON from response (handle markdown code blocks)
-        content = response.content.strip()
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-
-        content = content.strip()
+        sink = _delta_sink.get()
+        if sink is None:
+            response = await self._provider.generate(request)
+            content = response.content
+            usage = response.usage
+        else:
+            chunks = []
+            usage = None
+            async for delta, delta_usage in self._provider.generate_stream(request):
+                if delta:
+                    chunks.append(delta)
+                    sink(delta)
+                if delta_usage is not None:
+                    usage = delta_usage
+            content = "".join(chunks)
+
+        # Providers run in JSON mode; strip a markdown fence only if one slipped through
+        content = _strip_code_fence(content.strip())
 
         logger.info(
             "llm_response_summary",
@@ -306,10 +774,10 @@ Provide 1-3 meaningful insights. Write them as helpful observations that could a
             model=str(request.model),
             task=task,
             response_length=len(content),
-            response_sha256=hashlib.sha256(content.encode("utf-8")).hexdigest()
-            if content
-            else None,
+            response_fingerprint=log_fingerprint(content),
             is_empty=not bool(content),
+            input_tokens=usage.input_tokens if usage else None,
+            cached_input_tokens=usage.cached_input_tokens if usage else None,
         )
 
         return content
@@ -318,62 +786,20 @@ Provide 1-3 meaningful insights. Write them as helpful observations that could a
         """
         Extract capture metadata: intent, entities, time, tags.
         """
-        from datetime import datetime
-
-        now = datetime.utcnow()
-        day_of_week = now.strftime("%A")
-        date_str = now.strftime("%Y-%m-%d")
-        time_str = now.strftime("%H:%M")
-
-        system_prompt = f"""You are a metadata extraction assistant. Analyze journal entries and extract structured metadata.
-
-CURRENT TIME CONTEXT (use for reminder time calculations):
-- UTC time: {now.isoformat()}Z
-- Day: {day_of_week}
-- Date: {date_str}
-- Time: {time_str}
-
-Return a JSON object with this exact structure:
-{{
-  "intent": "question|reminder|task|note|reflection|quote|idea",
-  "extractedQuestion": "string or null",
-  "extractedTask": "string or null",
-  "inferredReminderTime": "ISO8601 string or null",
-  "extractedEntities": ["entity1", "entity2"],
-  "suggestedTags": ["tag1", "tag2"],
-  "confidence": 0.0-1.0,
-  "requiresResponse": true|false
-}}
-
-Guidelines:
-- intent: Classify the primary intent
-- extractedQuestion: If question intent, extract the core question
-- extractedTask: If task intent, extract the action item
-- inferredReminderTime: If reminder intent, parse time expressions (e.g., "tomorrow at 2pm", "in 2 hours") into ISO8601 UTC timestamp
-- extractedEntities: Extract people, places, concepts mentioned (max 5)
-- suggestedTags: Extract 1-5 relevant tags (work, personal, health, urgent, family, etc.)
-- requiresResponse: true if the user expects an AI response (questions, complex requests)"""
-
-        user_prompt = f"Extract metadata from this entry:\n\n{content}"
+        # The time context goes in the user message so the system prompt stays cacheable
+        now = datetime.now(timezone.utc)
+        user_prompt = (
+            f"CURRENT TIME CONTEXT: {now:%A %Y-%m-%dT%H:%M:%SZ} (UTC)\n\n"
+            f"Extract metadata from this entry:\n\n{content}"
+        )
 
         response = await self._call_llm(
-            system_prompt, user_prompt, task=InferenceTask.CAPTURE_METADATA
+            _SYSTEM_CAPTURE_METADATA, user_prompt, task=InferenceTask.CAPTURE_METADATA
         )
 
         try:
-            result_dict = json.loads(response)
-
-            return CaptureMetadataResult(
-                intent=CaptureIntent(result_dict.get("intent", "note")),
-                extracted_question=result_dict.get("extractedQuestion"),
-                extracted_task=result_dict.get("extractedTask"),
-                inferred_reminder_time=result_dict.get("inferredReminderTime"),
-                extracted_entities=result_dict.get("extractedEntities", []),
-                suggested_tags=result_dict.get("suggestedTags", []),
-                confidence=float(result_dict.get("confidence", 0.7)),
-                requires_response=bool(result_dict.get("requiresResponse", False))
-            )
-        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            return await self._validate_result(CaptureMetadataResult, response, InferenceTask.CAPTURE_METADATA)
+        except ValidationError as e:
             logger.warning(
                 "capture_metadata_parse_error",
                 error=str(e),
@@ -3,45 +3,138 @@ Echolia Backend - FastAPI Application
 
 Privacy-first sync and LLM inference service for Echolia apps.
 """
-from fastapi import FastAPI
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+import orjson
 import structlog
-import logging
 
 from app.config import settings
+from app.http_client import open_http_client, close_http_client
 from app.auth.routes import router as auth_router
 from app.inference.routes import router as inference_router
 from app.add_ons.routes import router as add_ons_router
 from app.payments.routes import router as payments_router
 
 
-# Configure structured logging
+# Configure structured logging. Events below the configured level are dropped
+# by the filtering wrapper before any processor runs.
 structlog.configure(
     processors=[
+        structlog.contextvars.merge_contextvars,
         structlog.processors.TimeStamper(fmt="iso"),
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
-        structlog.processors.JSONRenderer()
+        structlog.processors.JSONRenderer(serializer=orjson.dumps)
     ],
-    wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
+    wrapper_class=structlog.make_filtering_bound_logger(settings.log_level_value),
     context_class=dict,
-    logger_factory=structlog.PrintLoggerFactory(),
+    # orjson renders bytes, which the bytes logger writes without re-encoding
+    logger_factory=structlog.BytesLoggerFactory(),
     cache_logger_on_first_use=True,
 )
 
 logger = structlog.get_logger()
 
 
+class RequestContextMiddleware:
+    """
+    Bind a request id and path to every log event of a request.
+
+    Plain ASGI middleware: each request runs in its own task, so the bound
+    context never leaks between requests.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            structlog.contextvars.clear_contextvars()
+            structlog.contextvars.bind_contextvars(
+                request_id=uuid.uuid4().hex, path=scope["path"]
+            )
+        await self.app(scope, receive, send)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown."""
+    logger.info(
+        "application_starting",
+        environment=settings.environment,
+        debug=settings.debug
+    )
+
+    # Shared outbound HTTP client (LLM providers, Turso API)
+    app.state.http_client = open_http_client()
+
+    # Initialize master database
+    from app.master_db import master_db_manager
+    try:
+        # Create master database if it doesn't exist
+        await master_db_manager.create_master_database()
+        master_db_manager._ensure_schema
+        logger.info("master_database_initialized")
+    except Exception as e:
+        logger.error("master_database_initialization_failed", error=str(e))
+        # Don't crash the app, but log the error
+
+    # Inference service shared by every request; batches quota counter
+    # writes in the background
+    from app.inference.service import init_inference_service
+    inference_service = init_inference_service(master_db_manager)
+    app.state.inference_service = inference_service
+    inference_service.start_quota_flusher()
+
+    # Prime the LLM provider connection off the request path
+    if settings.inference_warm_up_timeout_seconds > 0:
+        from app.inference.tasks import task_processor
+        try:
+            await asyncio.wait_for(
+                task_processor.warm_up(),
+                timeout=settings.inference_warm_up_timeout_seconds
+            )
+        except Exception as e:
+            logger.warning("llm_provider_warm_up_failed", error=str(e))
+
+    yield
+
+    logger.info("application_shutting_down")
+
+    # Persist pending quota counters before the master DB goes away
+    await inference_service.stop_quota_flusher()
+
+    # Clean up database connections
+    from app.database import db_manager
+
+    db_manager.close_all_connections()
+    master_db_manager.close_connection()
+
+    # Release pooled LLM provider connections
+    from app.inference.providers.openai import close_async_clients
+    await close_async_clients()
+    await close_http_client()
+
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.app_name,
     description="Privacy-first sync and LLM inference service",
     version="0.1.0",
     docs_url="/docs" if settings.debug else None,
-    redoc_url="/redoc" if settings.debug else None
+    redoc_url="/redoc" if settings.debug else None,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
+app.add_middleware(RequestContextMiddleware)
+
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -75,7 +168,7 @@ async def root():
 
 
 @app.get("/health")
-async def health_check():
+async def health_check(request: Request):
     """Health check endpoint."""
     inference_provider = None
     inference_model = None
@@ -83,7 +176,7 @@ async def health_check():
     try:
         from app.inference.service import get_inference_service
 
-        provider_info = get_inference_service().get_provider_info()
+        provider_info = get_inference_service(request).get_provider_info()
         inference_provider = provider_info.provider
         inference_model = provider_info.model
     except Exception as e:
@@ -97,40 +190,6 @@ async def health_check():
     }
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Run on application startup."""
-    logger.info(
-        "application_starting",
-        environment=settings.environment,
-        debug=settings.debug
-    )
-
-    # Initialize master database
-    from app.master_db import master_db_manager
-    try:
-        # Create master database if it doesn't exist
-        await master_db_manager.create_master_database()
-        master_db_manager._ensure_schema
-        logger.info("master_database_initialized")
-    except Exception as e:
-        logger.error("master_database_initialization_failed", error=str(e))
-        # Don't crash the app, but log the error
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Run on application shutdown."""
-    logger.info("application_shutting_down")
-
-    # Clean up database connections
-    from app.database import db_manager
-    from app.master_db import master_db_manager
-
-    db_manager.close_all_connections()
-    master_db_manager.close_connection()
-
-
 if __name__ == "__main__":
     import uvicorn
 
@@ -139,5 +198,5 @@ if __name__ == "__main__":
         host=settings.host,
         port=settings.port,
         reload=settings.debug,
-        log_level=settings.log_level
+        log_level=settings.log_level_value
     )
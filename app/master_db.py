@@ -5,19 +5,220 @@ Unlike per-user databases, this is a single centralized database
 that stores user identities, OAuth info, devices, and add-on subscriptions.
 """
 import asyncio
+import base64
+import json
 import httpx
+import queue
 import structlog
+import threading
 import time
-from typing import Optional, Dict, List, Any
+from contextlib import contextmanager
+from typing import Optional, Dict, Iterator, List, Any, Tuple
 
 import libsql
 
 from app.config import settings
+from app.http_client import get_http_client
+from app.database import apply_pragmas, connection_pragmas, split_sql_script
 
 
 logger = structlog.get_logger()
 
 
+# Lifetime requested for minted master DB tokens, and how long before expiry
+# a cached token is replaced
+TOKEN_EXPIRATION = "1d"
+TOKEN_REFRESH_MARGIN_SECONDS = 600
+
+# URL prefixes of a hosted database; anything else is a local SQLite file
+REMOTE_URL_SCHEMES = ("libsql:", "http:", "https:", "ws:", "wss:")
+
+# Bound on cached is_add_on_active results; the cache is cleared when full
+ADD_ON_CACHE_MAX_SIZE = 10_000
+
+# Blocking client for minting tokens from worker threads (_sync_token),
+# reused so each refresh skips a new TCP/TLS handshake
+_TOKEN_HTTP_CLIENT = httpx.Client(timeout=10.0)
+
+
+def _jwt_expiry(token: str) -> float:
+    """
+    Expiry (Unix seconds) from a JWT's exp claim.
+
+    The token comes straight from the Turso API, so the claim is only read,
+    not verified.
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        # Unreadable claims: assume the lifetime we asked for
+        return time.time() + 86400
+
+
+# Row dict keys, in the column order of the matching SELECTs below
+_USER_COLUMNS = ("user_id", "provider", "provider_user_id", "email", "name", "created_at")
+_DEVICE_COLUMNS = (
+    "device_id", "user_id", "device_name", "platform", "app_version",
+    "last_seen_at", "created_at",
+)
+_ADD_ON_COLUMNS = (
+    "add_on_type", "status", "platform", "product_id", "transaction_id",
+    "purchase_date", "expires_at", "auto_renew", "cancelled_at",
+)
+# add_on_type -> flag set in get_user_add_ons when that add-on is active
+_ADD_ON_FLAGS = {"sync": "sync_enabled", "ai": "ai_enabled", "supporter": "supporter"}
+
+# Add-on activation UPSERT; {rows} holds one _ADD_ON_ROW per activation
+_ACTIVATE_ADD_ONS_SQL = """
+INSERT INTO user_add_ons (
+    user_id, add_on_type, status, platform, product_id, transaction_id,
+    original_transaction_id, purchase_date, expires_at, auto_renew,
+    created_at, updated_at
+)
+VALUES {rows}
+ON CONFLICT(user_id, add_on_type) DO UPDATE SET
+    status = 'active',
+    platform = excluded.platform,
+    product_id = excluded.product_id,
+    transaction_id = excluded.transaction_id,
+    original_transaction_id = excluded.original_transaction_id,
+    purchase_date = excluded.purchase_date,
+    expires_at = excluded.expires_at,
+    auto_renew = excluded.auto_renew,
+    cancelled_at = NULL,
+    updated_at = excluded.updated_at
+"""
+_ADD_ON_ROW = "(?, ?, 'active', ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_ACTIVATE_ADD_ON_SQL = _ACTIVATE_ADD_ONS_SQL.format(rows=_ADD_ON_ROW)
+
+# Rows per bulk UPSERT: 11 parameters each, so 440 per statement, well under
+# SQLite's historical 999 host-parameter limit
+BULK_ADD_ON_ROWS = 40
+
+# Active add-on flags computed in one row; parameters are the current time
+# (once per flag) and the user ID
+_ADD_ON_FLAGS_SQL = """
+SELECT
+    MAX(CASE WHEN add_on_type = 'sync' AND status = 'active'
+             AND (expires_at IS NULL OR expires_at > ?) THEN 1 ELSE 0 END),
+    MAX(CASE WHEN add_on_type = 'ai' AND status = 'active'
+             AND (expires_at IS NULL OR expires_at > ?) THEN 1 ELSE 0 END),
+    MAX(CASE WHEN add_on_type = 'supporter' AND status = 'active'
+             AND (expires_at IS NULL OR expires_at > ?) THEN 1 ELSE 0 END)
+FROM user_add_ons
+WHERE user_id = ?
+"""
+
+
+_MIGRATION_V001_SQL = """
+-- Schema version tracking
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    applied_at INTEGER NOT NULL
+);
+
+-- Users (OAuth identities)
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    provider_user_id TEXT NOT NULL,
+    email TEXT,
+    name TEXT,
+    created_at INTEGER NOT NULL,
+    UNIQUE(provider, provider_user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_users_provider ON users(provider, provider_user_id);
+
+-- User devices
+CREATE TABLE IF NOT EXISTS user_devices (
+    device_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    device_name TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    app_version TEXT,
+    last_seen_at INTEGER NOT NULL,
+    created_at INTEGER NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_devices_user ON user_devices(user_id);
+CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON user_devices(last_seen_at);
+
+-- User add-ons (subscriptions)
+CREATE TABLE IF NOT EXISTS user_add_ons (
+    user_id TEXT NOT NULL,
+    add_on_type TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'active',
+    platform TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    transaction_id TEXT NOT NULL,
+    original_transaction_id TEXT,
+    purchase_date INTEGER NOT NULL,
+    expires_at INTEGER,
+    auto_renew INTEGER DEFAULT 0,
+    cancelled_at INTEGER,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (user_id, add_on_type),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_add_ons_expires ON user_add_ons(expires_at);
+CREATE INDEX IF NOT EXISTS idx_add_ons_status ON user_add_ons(status);
+
+-- Purchase receipts
+CREATE TABLE IF NOT EXISTS receipts (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    receipt_data TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    transaction_id TEXT NOT NULL,
+    verified_at INTEGER NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_receipts_user ON receipts(user_id);
+CREATE INDEX IF NOT EXISTS idx_receipts_transaction ON receipts(transaction_id);
+
+-- AI usage quota (anti-abuse rate limiting)
+CREATE TABLE IF NOT EXISTS ai_usage_quota (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    request_count INTEGER DEFAULT 0,
+    last_reset_at INTEGER NOT NULL,
+    PRIMARY KEY (user_id, date),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_quota_date ON ai_usage_quota(date);
+
+-- Record migration
+INSERT INTO schema_version (version, applied_at)
+VALUES (1, strftime('%s', 'now'));
+"""
+
+_MIGRATION_V002_SQL = """
+-- Deprecated: sync_enabled column is no longer used.
+-- We rely on user_add_ons table.
+
+-- Update schema version
+INSERT INTO schema_version (version, applied_at)
+VALUES (2, strftime('%s', 'now'));
+"""
+
+# Split once at import
+_MIGRATION_V001_STATEMENTS = split_sql_script(_MIGRATION_V001_SQL)
+_MIGRATION_V002_STATEMENTS = split_sql_script(_MIGRATION_V002_SQL)
+
+
+def _on_event_loop() -> bool:
+    """True if called from a thread that is running an asyncio event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
 class MasterDatabaseManager:
     """
     Manages the master database for Echolia.
@@ -35,6 +236,26 @@ class MasterDatabaseManager:
         self.auth_token = settings.turso_auth_token
         self.db_name = "echolia-master"
         self._connection: Optional[any] = None
+        # Minted platform token the connection was opened with, if any
+        self._token: Optional[str] = None
+        self._token_expires_at: float = 0.0
+        # Serialize minting: threads in _sync_token, coroutines in
+        # _generate_db_token (one mint in flight, the rest reuse it)
+        self._token_lock = threading.Lock()
+        self._token_async_lock = asyncio.Lock()
+        # Bumped whenever a new token is minted; pooled connections opened
+        # with an older token are closed instead of being reused
+        self._token_generation = 0
+        # Idle (generation, connection) pairs; at most pool_size checked out
+        self._idle: "queue.LifoQueue[Tuple[int, Any]]" = queue.LifoQueue()
+        self._pool_slots = threading.BoundedSemaphore(settings.master_db_pool_size)
+        # (user_id, add_on_type) -> (is_active, monotonic expiry). Read and
+        # written from worker threads, so every access holds the lock.
+        self._add_on_cache: Dict[Tuple[str, str], Tuple[bool, float]] = {}
+        self._add_on_cache_lock = threading.Lock()
+        self._add_on_cache_ttl = settings.add_on_cache_ttl_seconds
+        is_remote = self._get_db_url().startswith(REMOTE_URL_SCHEMES)
+        self._local_pragmas = () if is_remote else connection_pragmas()
 
         logger.info("master_db_manager_initialized", db_name=self.db_name)
 
@@ -44,80 +265,211 @@ class MasterDatabaseManager:
             return settings.master_db_url
         return f"libsql://{self.db_name}-{self.turso_org_url}"
 
+    def _connect(self, token: str):
+        """
+        Open a connection to the master database.
+
+        Local SQLite files (a MASTER_DB_URL path, as in development) get the
+        same PRAGMA tuning as per-user replicas; remote Turso URLs do not.
+        """
+        conn = libsql.connect(self._get_db_url(), auth_token=token)
+        if self._local_pragmas:
+            apply_pragmas(conn, self._local_pragmas)
+        return conn
+
+    def _token_url(self) -> str:
+        """Turso platform API URL that mints master DB tokens."""
+        org = self.turso_org_url.split('.')[0]
+        return (
+            f"https://api.turso.tech/v1/organizations/{org}/databases/"
+            f"{self.db_name}/auth/tokens?expiration={TOKEN_EXPIRATION}"
+        )
+
+    def _cached_token(self) -> Optional[str]:
+        """The minted token, unless it is missing or close to expiry."""
+        if self._token and self._token_expires_at - time.time() > TOKEN_REFRESH_MARGIN_SECONDS:
+            return self._token
+        return None
+
+    def _remember_token(self, token: str) -> str:
+        """Cache a freshly minted token with its expiry."""
+        self._token = token
+        self._token_expires_at = _jwt_expiry(token)
+        self._token_generation += 1
+        logger.info("master_token_minted", expires_at=int(self._token_expires_at))
+        return token
+
+    def _token_expiring(self) -> bool:
+        """True if the open connection uses a minted token that is about to expire."""
+        return self._token is not None and self._cached_token() is None
+
     async def _generate_db_token(self) -> str:
-        """Generate a short-lived token for master DB access."""
+        """Get a short-lived token for master DB access, minting one only when needed."""
+        token = self._cached_token()
+        if token is not None:
+            return token
+
+        async with self._token_async_lock:
+            # Another request may have minted while we waited for the lock
+            token = self._cached_token()
+            if token is not None:
+                return token
+            return await self._mint_token_async()
+
+    async def _mint_token_async(self) -> str:
+        """Mint a master DB token through the shared async HTTP client."""
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"https://api.turso.tech/v1/organizations/{self.turso_org_url.split('.')[0]}/databases/{self.db_name}/auth/tokens?expiration=1d"
-                response = await client.post(
-                    url,
-                    headers={"Authorization": f"Bearer {self.auth_token}"},
-                    timeout=10.0
-                )
-                if response.status_code == 200:
-                    return response.json().get("jwt")
-                else:
-                    raise Exception(f"Failed to generate token: {response.text}")
+            client = get_http_client()
+            response = await client.post(
+                self._token_url(),
+                headers={"Authorization": f"Bearer {self.auth_token}"},
+                timeout=10.0
+            )
+            if response.status_code == 200:
+                return self._remember_token(response.json().get("jwt"))
+            else:
+                raise Exception(f"Failed to generate token: {response.text}")
         except Exception as e:
             logger.error("master_token_generation_failed", error=str(e))
             raise
 
     async def get_connection_async(self):
         """Async version of get_connection to support token generation."""
-        if self._connection is not None:
+        if self._connection is not None and not self._token_expiring():
             return self._connection
 
-        db_url = self._get_db_url()
         token = await self._generate_db_token()
 
-        self._connection = libsql.connect(db_url, auth_token=token)
+        previous, self._connection = self._connection, self._connect(token)
+        if previous is not None:
+            self._close_quietly(previous)
         logger.info("master_database_connected", db_name=self.db_name)
         # Note: _ensure_schema needs to be called carefully as it is sync
         # For now, we assume schema is checked at startup manually or we refactor _ensure_schema
         return self._connection
 
+    def _sync_token(self) -> str:
+        """
+        Auth token for opening a connection (blocking).
+
+        Uses the configured DB token if set, otherwise the cached minted
+        token, minting a new one when it is missing or about to expire.
+        """
+        if settings.master_db_auth_token:
+            return settings.master_db_auth_token
+
+        token = self._cached_token()
+        if token is not None:
+            return token
+
+        # Minting is a blocking HTTP call; on the event loop it would stall
+        # every other request
+        if _on_event_loop():
+            raise RuntimeError(
+                "Master DB token needs minting; call get_connection_async() "
+                "or run this from a worker thread"
+            )
+
+        with self._token_lock:
+            # Another thread may have minted while we waited for the lock
+            token = self._cached_token()
+            if token is not None:
+                return token
+
+            try:
+                resp = _TOKEN_HTTP_CLIENT.post(
+                    self._token_url(),
+                    headers={"Authorization": f"Bearer {self.auth_token}"}
+                )
+                if resp.status_code == 200:
+                    return self._remember_token(resp.json().get("jwt"))
+                else:
+                    raise Exception(f"Token gen failed: {resp.text}")
+            except Exception as e:
+                logger.error("sync_token_gen_failed", error=str(e))
+                raise
+
     def get_connection(self):
         """
-        Get or create database connection to master database.
+        Get or create the primary connection to the master database.
+
+        Used only for schema migrations; request handlers and services
+        borrow pooled connections through connection() instead.
+
+        A connection opened with a minted token is replaced shortly before
+        the token expires, and the old one is closed.
         """
-        if self._connection is not None:
+        if self._connection is not None and not self._token_expiring():
             return self._connection
 
-        if settings.master_db_auth_token:
-             # Use configured DB token
-             token = settings.master_db_auth_token
-             db_url = self._get_db_url()
-             self._connection = libsql.connect(db_url, auth_token=token)
-             self._ensure_schema()
-             return self._connection
-
-        # Automatic token generation from platform token
-        # Block to get token
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-             # We are likely inside a FastAPI request handling loop
-             pass
-             
-        # Fallback to sync version using requests
-        import requests
-        try:
-             org = self.turso_org_url.split('.')[0]
-             url = f"https://api.turso.tech/v1/organizations/{org}/databases/{self.db_name}/auth/tokens?expiration=1d"
-             resp = requests.post(url, headers={"Authorization": f"Bearer {self.auth_token}"}, timeout=10)
-             if resp.status_code == 200:
-                 token = resp.json().get("jwt")
-             else:
-                 raise Exception(f"Token gen failed: {resp.text}")
-        except Exception as e:
-             logger.error("sync_token_gen_failed", error=str(e))
-             raise
-             
-        db_url = self._get_db_url()
-        self._connection = libsql.connect(db_url, auth_token=token)
+        token = self._sync_token()
+        previous, self._connection = self._connection, self._connect(token)
+        if previous is not None:
+            self._close_quietly(previous)
         self._ensure_schema()
         return self._connection
 
+    # ========== Connection Pool ==========
 
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Borrow a pooled master DB connection for the duration of a block.
+
+        The CRUD methods below run in worker threads (via asyncio.to_thread)
+        and libsql connections must not be shared between threads, so each
+        call checks out its own connection. At most master_db_pool_size are
+        out at once; further callers wait for one to be returned.
+        """
+        self._pool_slots.acquire()
+        try:
+            generation, conn = self._checkout()
+            try:
+                yield conn
+            finally:
+                self._checkin(generation, conn)
+        finally:
+            self._pool_slots.release()
+
+    def _checkout(self) -> Tuple[int, Any]:
+        """Take an idle connection opened with the current token, or open one."""
+        token = self._sync_token()
+        generation = self._token_generation
+        while True:
+            try:
+                idle_generation, conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if idle_generation == generation:
+                return generation, conn
+            self._close_quietly(conn)
+
+        conn = self._connect(token)
+        logger.debug("master_pool_connection_opened", generation=generation)
+        return generation, conn
+
+    def _checkin(self, generation: int, conn) -> None:
+        """Return a connection to the pool, dropping it if its token is stale."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception as e:
+            logger.warning("master_pool_rollback_failed", error=str(e))
+            self._close_quietly(conn)
+            return
+
+        if generation == self._token_generation:
+            self._idle.put((generation, conn))
+        else:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        """Close a connection, logging instead of raising on failure."""
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning("master_pool_close_failed", error=str(e))
 
     async def create_master_database(self) -> bool:
         """
@@ -127,40 +479,41 @@ class MasterDatabaseManager:
             True if created successfully
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"https://api.turso.tech/v1/organizations/{self.turso_org_url.split('.')[0]}/databases",
-                    headers={
-                        "Authorization": f"Bearer {self.auth_token}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "name": self.db_name,
-                        "group": "default"
-                    },
-                    timeout=30.0
-                )
+            client = get_http_client()
+            response = await client.post(
+                f"https://api.turso.tech/v1/organizations/{self.turso_org_url.split('.')[0]}/databases",
+                headers={
+                    "Authorization": f"Bearer {self.auth_token}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "name": self.db_name,
+                    "group": "default"
+                },
+                timeout=30.0
+            )
 
-                if response.status_code in (200, 201):
-                    logger.info("master_database_created", db_name=self.db_name)
+            if response.status_code in (200, 201):
+                logger.info("master_database_created", db_name=self.db_name)
 
-                    # Initialize schema
-                    self._ensure_schema()
-                    return True
+                # Initialize schema; a worker thread may mint the DB token,
+                # which only works once the database exists
+                await asyncio.to_thread(self._ensure_schema)
+                return True
 
-                elif response.status_code == 409:
-                    # Database already exists
-                    logger.info("master_database_already_exists", db_name=self.db_name)
-                    self._ensure_schema()
-                    return True
+            elif response.status_code == 409:
+                # Database already exists
+                logger.info("master_database_already_exists", db_name=self.db_name)
+                await asyncio.to_thread(self._ensure_schema)
+                return True
 
-                else:
-                    logger.error(
-                        "master_database_creation_failed",
-                        status=response.status_code,
-                        response=response.text
-                    )
-                    return False
+            else:
+                logger.error(
+                    "master_database_creation_failed",
+                    status=response.status_code,
+                    response=response.text
+                )
+                return False
 
         except Exception as e:
             logger.error("master_database_creation_error", error=str(e))
@@ -192,7 +545,7 @@ class MasterDatabaseManager:
                 version_rows = result.fetchall()
 
                 current_version = version_rows[0][0] if version_rows else 0
-                logger.info("master_schema_version_check", version=current_version)
+                logger.debug("master_schema_version_check", version=current_version)
 
                 # Run any pending migrations
                 if current_version < 1:
@@ -206,122 +559,32 @@ class MasterDatabaseManager:
 
     def _run_migration_v001(self) -> None:
         """Run initial master database schema migration."""
-        conn = self.get_connection()
-
-        migration_sql = """
-        -- Schema version tracking
-        CREATE TABLE IF NOT EXISTS schema_version (
-            version INTEGER PRIMARY KEY,
-            applied_at INTEGER NOT NULL
-        );
-
-        -- Users (OAuth identities)
-        CREATE TABLE IF NOT EXISTS users (
-            user_id TEXT PRIMARY KEY,
-            provider TEXT NOT NULL,
-            provider_user_id TEXT NOT NULL,
-            email TEXT,
-            name TEXT,
-            created_at INTEGER NOT NULL,
-            UNIQUE(provider, provider_user_id)
-        );
-        CREATE INDEX IF NOT EXISTS idx_users_provider ON users(provider, provider_user_id);
-
-        -- User devices
-        CREATE TABLE IF NOT EXISTS user_devices (
-            device_id TEXT PRIMARY KEY,
-            user_id TEXT NOT NULL,
-            device_name TEXT NOT NULL,
-            platform TEXT NOT NULL,
-            app_version TEXT,
-            last_seen_at INTEGER NOT NULL,
-            created_at INTEGER NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-        );
-        CREATE INDEX IF NOT EXISTS idx_devices_user ON user_devices(user_id);
-        CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON user_devices(last_seen_at);
-
-        -- User add-ons (subscriptions)
-        CREATE TABLE IF NOT EXISTS user_add_ons (
-            user_id TEXT NOT NULL,
-            add_on_type TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'active',
-            platform TEXT NOT NULL,
-            product_id TEXT NOT NULL,
-            transaction_id TEXT NOT NULL,
-            original_transaction_id TEXT,
-            purchase_date INTEGER NOT NULL,
-            expires_at INTEGER,
-            auto_renew INTEGER DEFAULT 0,
-            cancelled_at INTEGER,
-            created_at INTEGER NOT NULL,
-            updated_at INTEGER NOT NULL,
-            PRIMARY KEY (user_id, add_on_type),
-            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-        );
-        CREATE INDEX IF NOT EXISTS idx_add_ons_expires ON user_add_ons(expires_at);
-        CREATE INDEX IF NOT EXISTS idx_add_ons_status ON user_add_ons(status);
-
-        -- Purchase receipts
-        CREATE TABLE IF NOT EXISTS receipts (
-            id TEXT PRIMARY KEY,
-            user_id TEXT NOT NULL,
-            platform TEXT NOT NULL,
-            receipt_data TEXT NOT NULL,
-            product_id TEXT NOT NULL,
-            transaction_id TEXT NOT NULL,
-            verified_at INTEGER NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-        );
-        CREATE INDEX IF NOT EXISTS idx_receipts_user ON receipts(user_id);
-        CREATE INDEX IF NOT EXISTS idx_receipts_transaction ON receipts(transaction_id);
-
-        -- AI usage quota (anti-abuse rate limiting)
-        CREATE TABLE IF NOT EXISTS ai_usage_quota (
-            user_id TEXT NOT NULL,
-            date TEXT NOT NULL,
-            request_count INTEGER DEFAULT 0,
-            last_reset_at INTEGER NOT NULL,
-            PRIMARY KEY (user_id, date),
-            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-        );
-        CREATE INDEX IF NOT EXISTS idx_quota_date ON ai_usage_quota(date);
-
-        -- Record migration
-        INSERT INTO schema_version (version, applied_at)
-        VALUES (1, strftime('%s', 'now'));
-        """
-
-        self._execute_sql_script(conn, migration_sql)
+        self._execute_statements(self.get_connection(), _MIGRATION_V001_STATEMENTS)
         logger.info("master_migration_v001_completed")
 
     def _run_migration_v002(self) -> None:
         """Add sync_enabled column to users table."""
-        conn = self.get_connection()
-
-        migration_sql = """
-        -- Deprecated: sync_enabled column is no longer used.
-        -- We rely on user_add_ons table.
-        
-        -- Update schema version
-        INSERT INTO schema_version (version, applied_at)
-        VALUES (2, strftime('%s', 'now'));
-        """
-
-        self._execute_sql_script(conn, migration_sql)
+        self._execute_statements(self.get_connection(), _MIGRATION_V002_STATEMENTS)
         logger.info("master_migration_v002_skipped")
 
     @staticmethod
-    def _execute_sql_script(conn, sql: str) -> None:
+    def _execute_statements(conn, statements) -> None:
         """
-        Execute a SQL script containing multiple statements.
+        Execute pre-split SQL statements in a single transaction.
 
-        libsql/Hrana requires one statement per execute call.
+        libsql/Hrana requires one statement per execute call. Running them in
+        one transaction applies a migration all-or-nothing and commits once.
+        (executescript is not used: it silently stops at the first failing
+        statement instead of raising.)
         """
-        statements = [s.strip() for s in sql.strip().split(";") if s.strip()]
-        for statement in statements:
-            conn.execute(statement)
-        conn.commit()
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
     # ========== User Management ==========
 
@@ -346,26 +609,25 @@ class MasterDatabaseManager:
         Returns:
             True if created successfully
         """
-        conn = self.get_connection()
-
-        try:
-            current_time = int(time.time())
-
-            conn.execute(
-                """
-                INSERT INTO users (user_id, provider, provider_user_id, email, name, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                [user_id, provider, provider_user_id, email, name, current_time]
-            )
-            conn.commit()
+        with self.connection() as conn:
+            try:
+                current_time = int(time.time())
+
+                conn.execute(
+                    """
+                    INSERT INTO users (user_id, provider, provider_user_id, email, name, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    [user_id, provider, provider_user_id, email, name, current_time]
+                )
+                conn.commit()
 
-            logger.info("user_created", user_id=user_id, provider=provider)
-            return True
+                logger.info("user_created", user_id=user_id, provider=provider)
+                return True
 
-        except Exception as e:
-            logger.error("user_creation_failed", user_id=user_id, error=str(e))
-            raise
+            except Exception as e:
+                logger.error("user_creation_failed", user_id=user_id, error=str(e))
+                raise
 
     def get_user_by_provider(self, provider: str, provider_user_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -378,32 +640,19 @@ class MasterDatabaseManager:
         Returns:
             User dict or None
         """
-        conn = self.get_connection()
-
-        try:
-            result = conn.execute(
-                "SELECT user_id, provider, provider_user_id, email, name, created_at FROM users WHERE provider = ? AND provider_user_id = ?",
-                [provider, provider_user_id]
-            )
-
-            rows = result.fetchall()
-
-            if rows:
-                row = rows[0]
-                return {
-                    "user_id": row[0],
-                    "provider": row[1],
-                    "provider_user_id": row[2],
-                    "email": row[3],
-                    "name": row[4],
-                    "created_at": row[5]
-                }
+        with self.connection() as conn:
+            try:
+                result = conn.execute(
+                    "SELECT user_id, provider, provider_user_id, email, name, created_at FROM users WHERE provider = ? AND provider_user_id = ? LIMIT 1",
+                    [provider, provider_user_id]
+                )
 
-            return None
+                row = result.fetchone()
+                return None if row is None else dict(zip(_USER_COLUMNS, row))
 
-        except Exception as e:
-            logger.error("get_user_by_provider_failed", provider=provider, error=str(e))
-            raise
+            except Exception as e:
+                logger.error("get_user_by_provider_failed", provider=provider, error=str(e))
+                raise
 
     def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -415,32 +664,19 @@ class MasterDatabaseManager:
         Returns:
             User dict or None
         """
-        conn = self.get_connection()
-
-        try:
-            result = conn.execute(
-                "SELECT user_id, provider, provider_user_id, email, name, created_at FROM users WHERE user_id = ?",
-                [user_id]
-            )
-
-            rows = result.fetchall()
-
-            if rows:
-                row = rows[0]
-                return {
-                    "user_id": row[0],
-                    "provider": row[1],
-                    "provider_user_id": row[2],
-                    "email": row[3],
-                    "name": row[4],
-                    "created_at": row[5]
-                }
+        with self.connection() as conn:
+            try:
+                result = conn.execute(
+                    "SELECT user_id, provider, provider_user_id, email, name, created_at FROM users WHERE user_id = ? LIMIT 1",
+                    [user_id]
+                )
 
-            return None
+                row = result.fetchone()
+                return None if row is None else dict(zip(_USER_COLUMNS, row))
 
-        except Exception as e:
-            logger.error("get_user_failed", user_id=user_id, error=str(e))
-            raise
+            except Exception as e:
+                logger.error("get_user_failed", user_id=user_id, error=str(e))
+                raise
 
     # ========== Device Management ==========
 
@@ -465,32 +701,31 @@ class MasterDatabaseManager:
         Returns:
             True if registered successfully
         """
-        conn = self.get_connection()
-
-        try:
-            current_time = int(time.time())
-
-            # Upsert device (update if exists, insert if not)
-            conn.execute(
-                """
-                INSERT INTO user_devices (device_id, user_id, device_name, platform, app_version, last_seen_at, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(device_id) DO UPDATE SET
-                    device_name = excluded.device_name,
-                    platform = excluded.platform,
-                    app_version = excluded.app_version,
-                    last_seen_at = excluded.last_seen_at
-                """,
-                [device_id, user_id, device_name, platform, app_version, current_time, current_time]
-            )
-            conn.commit()
+        with self.connection() as conn:
+            try:
+                current_time = int(time.time())
+
+                # Upsert device (update if exists, insert if not)
+                conn.execute(
+                    """
+                    INSERT INTO user_devices (device_id, user_id, device_name, platform, app_version, last_seen_at, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(device_id) DO UPDATE SET
+                        device_name = excluded.device_name,
+                        platform = excluded.platform,
+                        app_version = excluded.app_version,
+                        last_seen_at = excluded.last_seen_at
+                    """,
+                    [device_id, user_id, device_name, platform, app_version, current_time, current_time]
+                )
+                conn.commit()
 
-            logger.info("device_registered", device_id=device_id, user_id=user_id, platform=platform)
-            return True
+                logger.info("device_registered", device_id=device_id, user_id=user_id, platform=platform)
+                return True
 
-        except Exception as e:
-            logger.error("device_registration_failed", device_id=device_id, error=str(e))
-            raise
+            except Exception as e:
+                logger.error("device_registration_failed", device_id=device_id, error=str(e))
+                raise
 
     def get_user_devices(self, user_id: str) -> List[Dict[str, Any]]:
         """
@@ -502,37 +737,23 @@ class MasterDatabaseManager:
         Returns:
             List of device dicts
         """
-        conn = self.get_connection()
-
-        try:
-            result = conn.execute(
-                """
-                SELECT device_id, user_id, device_name, platform, app_version, last_seen_at, created_at
-                FROM user_devices
-                WHERE user_id = ?
-                ORDER BY last_seen_at DESC
-                """,
-                [user_id]
-            )
+        with self.connection() as conn:
+            try:
+                result = conn.execute(
+                    """
+                    SELECT device_id, user_id, device_name, platform, app_version, last_seen_at, created_at
+                    FROM user_devices
+                    WHERE user_id = ?
+                    ORDER BY last_seen_at DESC
+                    """,
+                    [user_id]
+                )
 
-            rows = result.fetchall()
-            devices = []
-            for row in rows:
-                devices.append({
-                    "device_id": row[0],
-                    "user_id": row[1],
-                    "device_name": row[2],
-                    "platform": row[3],
-                    "app_version": row[4],
-                    "last_seen_at": row[5],
-                    "created_at": row[6]
-                })
-
-            return devices
+                return [dict(zip(_DEVICE_COLUMNS, row)) for row in result.fetchall()]
 
-        except Exception as e:
-            logger.error("get_user_devices_failed", user_id=user_id, error=str(e))
-            raise
+            except Exception as e:
+                logger.error("get_user_devices_failed", user_id=user_id, error=str(e))
+                raise
 
     def delete_device(self, device_id: str, user_id: str) -> bool:
         """
@@ -545,94 +766,93 @@ class MasterDatabaseManager:
         Returns:
             True if deleted
         """
-        conn = self.get_connection()
-
-        try:
-            conn.execute(
-                "DELETE FROM user_devices WHERE device_id = ? AND user_id = ?",
-                [device_id, user_id]
-            )
-            conn.commit()
+        with self.connection() as conn:
+            try:
+                conn.execute(
+                    "DELETE FROM user_devices WHERE device_id = ? AND user_id = ?",
+                    [device_id, user_id]
+                )
+                conn.commit()
 
-            logger.info("device_deleted", device_id=device_id, user_id=user_id)
-            return True
+                logger.info("device_deleted", device_id=device_id, user_id=user_id)
+                return True
 
-        except Exception as e:
-            logger.error("device_deletion_failed", device_id=device_id, error=str(e))
-            raise
+            except Exception as e:
+                logger.error("device_deletion_failed", device_id=device_id, error=str(e))
+                raise
 
     # ========== Add-Ons Management ==========
 
-    def get_user_add_ons(self, user_id: str) -> Dict[str, Any]:
+    def get_user_add_ons(self, user_id: str, include_details: bool = True) -> Dict[str, Any]:
         """
         Get all add-ons for a user.
 
         Args:
             user_id: User UUID
+            include_details: Also return the per-add-on rows. When False the
+                three flags are computed by one aggregate query and
+                "details" is empty.
 
         Returns:
             Dict with add-on status
         """
-        conn = self.get_connection()
+        with self.connection() as conn:
+            try:
+                current_time = int(time.time())
+
+                if not include_details:
+                    row = conn.execute(
+                        _ADD_ON_FLAGS_SQL,
+                        [current_time, current_time, current_time, user_id]
+                    ).fetchone()
+                    return {
+                        "sync_enabled": bool(row[0]),
+                        "ai_enabled": bool(row[1]),
+                        "supporter": bool(row[2]),
+                        "details": []
+                    }
 
-        try:
-            current_time = int(time.time())
+                result = conn.execute(
+                    """
+                    SELECT add_on_type, status, platform, product_id, transaction_id,
+                           purchase_date, expires_at, auto_renew, cancelled_at
+                    FROM user_add_ons
+                    WHERE user_id = ?
+                    """,
+                    [user_id]
+                )
 
-            result = conn.execute(
-                """
-                SELECT add_on_type, status, platform, product_id, transaction_id,
-                       purchase_date, expires_at, auto_renew, cancelled_at
-                FROM user_add_ons
-                WHERE user_id = ?
-                """,
-                [user_id]
-            )
+                rows = result.fetchall()
+                add_ons = {
+                    "sync_enabled": False,
+                    "ai_enabled": False,
+                    "supporter": False,
+                    "details": []
+                }
 
-            rows = result.fetchall()
-            add_ons = {
-                "sync_enabled": False,
-                "ai_enabled": False,
-                "supporter": False,
-                "details": []
-            }
-
-            for row in rows:
-                add_on_type = row[0]
-                status = row[1]
-                expires_at = row[6]
-
-                # Check if active and not expired
-                is_active = (
-                    status == "active" and
-                    (expires_at is None or expires_at > current_time)
-                )
+                for row in rows:
+                    detail = dict(zip(_ADD_ON_COLUMNS, row))
+                    expires_at = detail["expires_at"]
 
-                if is_active:
-                    if add_on_type == "sync":
-                        add_ons["sync_enabled"] = True
-                    elif add_on_type == "ai":
-                        add_ons["ai_enabled"] = True
-                    elif add_on_type == "supporter":
-                        add_ons["supporter"] = True
-
-                add_ons["details"].append({
-                    "add_on_type": add_on_type,
-                    "status": status,
-                    "platform": row[2],
-                    "product_id": row[3],
-                    "transaction_id": row[4],
-                    "purchase_date": row[5],
-                    "expires_at": expires_at,
-                    "auto_renew": bool(row[7]),
-                    "cancelled_at": row[8],
-                    "is_active": is_active
-                })
-
-            return add_ons
+                    # Check if active and not expired
+                    is_active = (
+                        detail["status"] == "active" and
+                        (expires_at is None or expires_at > current_time)
+                    )
 
-        except Exception as e:
-            logger.error("get_user_add_ons_failed", user_id=user_id, error=str(e))
-            raise
+                    flag = _ADD_ON_FLAGS.get(detail["add_on_type"])
+                    if is_active and flag:
+                        add_ons[flag] = True
+
+                    detail["auto_renew"] = bool(detail["auto_renew"])
+                    detail["is_active"] = is_active
+                    add_ons["details"].append(detail)
+
+                return add_ons
+
+            except Exception as e:
+                logger.error("get_user_add_ons_failed", user_id=user_id, error=str(e))
+                raise
 
     def activate_add_on(
         self,
@@ -663,58 +883,104 @@ class MasterDatabaseManager:
         Returns:
             True if activated
         """
-        conn = self.get_connection()
+        with self.connection() as conn:
+            try:
+                current_time = int(time.time())
+
+                conn.execute(
+                    _ACTIVATE_ADD_ON_SQL,
+                    [
+                        user_id, add_on_type, platform, product_id, transaction_id,
+                        original_transaction_id, purchase_date, expires_at,
+                        1 if auto_renew else 0, current_time, current_time
+                    ]
+                )
 
-        try:
-            current_time = int(time.time())
-
-            conn.execute(
-                """
-                INSERT INTO user_add_ons (
-                    user_id, add_on_type, status, platform, product_id, transaction_id,
-                    original_transaction_id, purchase_date, expires_at, auto_renew,
-                    created_at, updated_at
+
+
+                conn.commit()
+                self.invalidate_add_ons(user_id)
+
+                logger.info(
+                    "add_on_activated",
+                    user_id=user_id,
+                    add_on_type=add_on_type,
+                    expires_at=expires_at
                 )
-                VALUES (?, ?, 'active', ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(user_id, add_on_type) DO UPDATE SET
-                    status = 'active',
-                    platform = excluded.platform,
-                    product_id = excluded.product_id,
-                    transaction_id = excluded.transaction_id,
-                    original_transaction_id = excluded.original_transaction_id,
-                    purchase_date = excluded.purchase_date,
-                    expires_at = excluded.expires_at,
-                    auto_renew = excluded.auto_renew,
-                    cancelled_at = NULL,
-                    updated_at = excluded.updated_at
-                """,
-                [
-                    user_id, add_on_type, platform, product_id, transaction_id,
-                    original_transaction_id, purchase_date, expires_at,
-                    1 if auto_renew else 0, current_time, current_time
-                ]
-            )
+                return True
 
+            except Exception as e:
+                logger.error("add_on_activation_failed", user_id=user_id, error=str(e))
+                raise
 
+    def activate_add_ons_bulk(self, activations: List[Dict[str, Any]]) -> int:
+        """
+        Activate many add-ons at once (e.g. a batch of store webhook events).
 
-            conn.commit()
+        Writes multi-row UPSERTs of up to BULK_ADD_ON_ROWS activations each,
+        all in one transaction, instead of one statement and commit per row.
+        After the commit the cached add-on status and inference tier of every
+        affected user are dropped.
 
-            logger.info(
-                "add_on_activated",
-                user_id=user_id,
-                add_on_type=add_on_type,
-                expires_at=expires_at
-            )
-            return True
+        Args:
+            activations: Dicts with the keyword arguments of activate_add_on
 
-        except Exception as e:
-            logger.error("add_on_activation_failed", user_id=user_id, error=str(e))
-            raise
+        Returns:
+            Number of activations written
+        """
+        if not activations:
+            return 0
+
+        with self.connection() as conn:
+            try:
+                current_time = int(time.time())
+
+                conn.execute("BEGIN")
+                for start in range(0, len(activations), BULK_ADD_ON_ROWS):
+                    chunk = activations[start:start + BULK_ADD_ON_ROWS]
+                    params = []
+                    for activation in chunk:
+                        params.extend((
+                            activation["user_id"],
+                            activation["add_on_type"],
+                            activation["platform"],
+                            activation["product_id"],
+                            activation["transaction_id"],
+                            activation.get("original_transaction_id"),
+                            activation["purchase_date"],
+                            activation.get("expires_at"),
+                            1 if activation.get("auto_renew") else 0,
+                            current_time,
+                            current_time
+                        ))
+                    conn.execute(
+                        _ACTIVATE_ADD_ONS_SQL.format(rows=", ".join([_ADD_ON_ROW] * len(chunk))),
+                        params
+                    )
+                conn.commit()
+
+            except Exception as e:
+                conn.rollback()
+                logger.error("add_on_bulk_activation_failed", count=len(activations), error=str(e))
+                raise
+
+        # Same invalidation as a single activation, for every affected user;
+        # the inference quota caches the tier derived from the AI add-on
+        from app.inference.service import invalidate_user_tier
+        for user_id in {activation["user_id"] for activation in activations}:
+            self.invalidate_add_ons(user_id)
+            invalidate_user_tier(user_id)
+
+        logger.info("add_ons_activated_bulk", count=len(activations))
+        return len(activations)
 
     def is_add_on_active(self, user_id: str, add_on_type: str) -> bool:
         """
         Check if a specific add-on is active for a user.
 
+        Results are cached for add_on_cache_ttl_seconds; activate_add_on
+        drops the user's entries.
+
         Args:
             user_id: User UUID
             add_on_type: 'sync', 'ai', or 'supporter'
@@ -722,38 +988,62 @@ class MasterDatabaseManager:
         Returns:
             True if active
         """
-        conn = self.get_connection()
+        key = (user_id, add_on_type)
+        with self._add_on_cache_lock:
+            cached = self._add_on_cache.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
 
-        try:
-            current_time = int(time.time())
+        with self.connection() as conn:
+            try:
+                current_time = int(time.time())
 
-            result = conn.execute(
-                """
-                SELECT status, expires_at
-                FROM user_add_ons
-                WHERE user_id = ? AND add_on_type = ?
-                """,
-                [user_id, add_on_type]
-            )
+                result = conn.execute(
+                    """
+                    SELECT status, expires_at
+                    FROM user_add_ons
+                    WHERE user_id = ? AND add_on_type = ?
+                    """,
+                    [user_id, add_on_type]
+                )
 
-            rows = result.fetchall()
+                row = result.fetchone()
 
-            if not rows:
-                return False
+                if row is None:
+                    is_active = False
+                else:
+                    status = row[0]
+                    expires_at = row[1]
 
-            row = rows[0]
-            status = row[0]
-            expires_at = row[1]
+                    # Active if status is 'active' and not expired
+                    is_active = status == "active" and (expires_at is None or expires_at > current_time)
 
-            # Active if status is 'active' and not expired
-            return status == "active" and (expires_at is None or expires_at > current_time)
+            except Exception as e:
+                logger.error("is_add_on_active_failed", user_id=user_id, error=str(e))
+                return False
 
-        except Exception as e:
-            logger.error("is_add_on_active_failed", user_id=user_id, error=str(e))
-            return False
+        if self._add_on_cache_ttl > 0:
+            with self._add_on_cache_lock:
+                if len(self._add_on_cache) >= ADD_ON_CACHE_MAX_SIZE:
+                    self._add_on_cache.clear()
+                self._add_on_cache[key] = (is_active, time.monotonic() + self._add_on_cache_ttl)
+        return is_active
+
+    def invalidate_add_ons(self, user_id: str) -> None:
+        """Forget cached add-on status for a user (call after their add-ons change)."""
+        with self._add_on_cache_lock:
+            for key in [k for k in self._add_on_cache if k[0] == user_id]:
+                del self._add_on_cache[key]
 
     def close_connection(self) -> None:
-        """Close database connection."""
+        """Close the primary connection and every idle pooled connection."""
+        while True:
+            try:
+                _, conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_quietly(conn)
+
         if self._connection:
             try:
                 self._connection.close()
@@ -3,6 +3,7 @@ Payment verification service.
 
 Handles receipt verification and add-on activation.
 """
+import asyncio
 import structlog
 import uuid
 import time
@@ -100,7 +101,7 @@ class PaymentService:
                 )
 
             # Check if receipt was already verified (prevent replay attacks)
-            if self._is_receipt_already_verified(verified.transaction_id):
+            if await asyncio.to_thread(self._is_receipt_already_verified, verified.transaction_id):
                 logger.warning(
                     "receipt_already_verified",
                     transaction_id=verified.transaction_id
@@ -112,12 +113,13 @@ class PaymentService:
                 )
 
             # Store receipt in database
-            self._store_receipt(user_id, verified)
+            await asyncio.to_thread(self._store_receipt, user_id, verified)
 
             # Activate add-on
             platform = Platform.IOS if verified.platform == ReceiptPlatform.IOS else Platform.ANDROID
 
-            success = self.add_ons_service.activate_add_on(
+            success = await asyncio.to_thread(
+                self.add_ons_service.activate_add_on,
                 user_id=user_id,
                 add_on_type=add_on_type,
                 platform=platform,
@@ -232,14 +234,12 @@ class PaymentService:
             True if already verified
         """
         try:
-            conn = self.master_db.get_connection()
-
-            result = conn.execute(
-                "SELECT id FROM receipts WHERE transaction_id = ? LIMIT 1",
-                [transaction_id]
-            )
-
-            rows = result.fetchall()
+            with self.master_db.connection() as conn:
+                result = conn.execute(
+                    "SELECT id FROM receipts WHERE transaction_id = ? LIMIT 1",
+                    [transaction_id]
+                )
+                rows = result.fetchall()
             return len(rows) > 0
 
         except Exception as e:
@@ -258,27 +258,26 @@ class PaymentService:
             True if stored successfully
         """
         try:
-            conn = self.master_db.get_connection()
-
             receipt_id = str(uuid.uuid4())
             current_time = int(time.time())
 
-            conn.execute(
-                """
-                INSERT INTO receipts (id, user_id, platform, receipt_data, product_id, transaction_id, verified_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                [
-                    receipt_id,
-                    user_id,
-                    verified.platform.value,
-                    verified.transaction_id,  # Store transaction ID as receipt data
-                    verified.product_id,
-                    verified.transaction_id,
-                    current_time
-                ]
-            )
-            conn.commit()
+            with self.master_db.connection() as conn:
+                conn.execute(
+                    """
+                    INSERT INTO receipts (id, user_id, platform, receipt_data, product_id, transaction_id, verified_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    [
+                        receipt_id,
+                        user_id,
+                        verified.platform.value,
+                        verified.transaction_id,  # Store transaction ID as receipt data
+                        verified.product_id,
+                        verified.transaction_id,
+                        current_time
+                    ]
+                )
+                conn.commit()
 
             logger.info("receipt_stored", receipt_id=receipt_id, user_id=user_id)
             return True
@@ -0,0 +1,110 @@
+"""
+Tests for the per-user database helpers.
+
+Tests PRAGMA tuning of local replica files, commit syncing and migration
+SQL splitting.
+"""
+import pytest
+import os
+from unittest.mock import Mock, patch
+
+import libsql
+
+# Set required environment variables for tests
+os.environ.setdefault("TURSO_ORG_URL", "test.turso.io")
+os.environ.setdefault("TURSO_AUTH_TOKEN", "test_token")
+os.environ.setdefault("JWT_SECRET", "test_jwt_secret_for_testing_only")
+
+from app.config import settings
+from app.database import (
+    _MIGRATION_V001_SQL,
+    _MIGRATION_V001_STATEMENTS,
+    apply_pragmas,
+    connection_pragmas,
+    db_manager,
+    split_sql_script,
+)
+
+
+# ========== PRAGMA Tests ==========
+
+def test_connection_pragmas_follow_settings(monkeypatch):
+    """Test the tunable pragmas are read from settings."""
+    monkeypatch.setattr(settings, "sqlite_journal_mode", "DELETE")
+    monkeypatch.setattr(settings, "sqlite_busy_timeout_ms", 2500)
+
+    pragmas = connection_pragmas()
+
+    assert "PRAGMA journal_mode=DELETE" in pragmas
+    assert "PRAGMA busy_timeout=2500" in pragmas
+    assert "PRAGMA foreign_keys=ON" in pragmas
+
+
+def test_apply_pragmas_skips_failures(tmp_path):
+    """Test a failing pragma is skipped and the rest are still applied."""
+    conn = libsql.connect(str(tmp_path / "user.db"))
+    try:
+        apply_pragmas(conn, (
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA this is not valid",
+            "PRAGMA busy_timeout=1234",
+        ))
+
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        assert conn.execute("PRAGMA busy_timeout").fetchone() == (1234,)
+    finally:
+        conn.close()
+
+
+# ========== Commit Tests ==========
+
+def test_commit_and_sync_pulls_only_for_replicas():
+    """Test a commit syncs an embedded replica and leaves remote connections alone."""
+    conn = Mock()
+    with patch.object(db_manager, "embedded_replica", True):
+        db_manager.commit_and_sync(conn, "user_1")
+    conn.commit.assert_called_once()
+    conn.sync.assert_called_once()
+
+    conn = Mock()
+    with patch.object(db_manager, "embedded_replica", False):
+        db_manager.commit_and_sync(conn)
+    conn.commit.assert_called_once()
+    conn.sync.assert_not_called()
+
+
+# ========== Migration SQL Tests ==========
+
+def test_split_sql_script_keeps_quoted_semicolons():
+    """Test ';' inside literals and comments does not end a statement."""
+    statements = split_sql_script("""
+        -- Header comment; not a statement
+        CREATE TABLE notes (body TEXT DEFAULT 'a;b');
+        INSERT INTO notes VALUES ('x;y'); -- trailing; comment
+    """)
+
+    assert len(statements) == 2
+    assert statements[0].endswith("CREATE TABLE notes (body TEXT DEFAULT 'a;b')")
+    assert statements[1] == "INSERT INTO notes VALUES ('x;y')"
+
+
+def test_user_migration_split_at_import():
+    """Test the user DB migration is pre-split into executable statements."""
+    assert len(_MIGRATION_V001_STATEMENTS) == _MIGRATION_V001_SQL.count(";")
+
+    conn = libsql.connect(":memory:")
+    try:
+        for statement in _MIGRATION_V001_STATEMENTS:
+            conn.execute(statement)
+    finally:
+        conn.close()
+
+
+def test_split_sql_script_rejects_unterminated_statement():
+    """Test an open string literal fails the split instead of being dropped."""
+    with pytest.raises(ValueError, match="Incomplete SQL statement"):
+        split_sql_script("CREATE TABLE a (x TEXT);\nINSERT INTO a VALUES ('oops);")
+
+    # A missing final ';' or a trailing comment is not an error
+    assert split_sql_script("CREATE TABLE a (x TEXT)") == ("CREATE TABLE a (x TEXT)",)
+    assert split_sql_script("CREATE TABLE a (x TEXT);\n-- done\n") == ("CREATE TABLE a (x TEXT)",)
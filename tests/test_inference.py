@@ -0,0 +1,639 @@
+"""
+Tests for E2EE inference module.
+
+Tests crypto round-trips, request model validation, provider adapters
+and quota accounting.
+"""
+import asyncio
+import pytest
+import os
+import base64
+import json
+import httpx
+import libsql
+from contextlib import nullcontext
+from unittest.mock import Mock, patch
+
+# Set required environment variables for tests
+os.environ.setdefault("TURSO_ORG_URL", "test.turso.io")
+os.environ.setdefault("TURSO_AUTH_TOKEN", "test_token")
+os.environ.setdefault("JWT_SECRET", "test_jwt_secret_for_testing_only")
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import x25519
+
+from app.inference.crypto import e2ee_crypto
+from app.inference.fingerprint import log_fingerprint
+from app.inference.errors import DecryptionFailed, QuotaExceeded
+from app.inference.models import (
+    CaptureIntent,
+    CaptureMetadataResult,
+    E2EEInferenceBatchRequest,
+    E2EEInferenceRequest,
+    MemoryDistillationResult,
+    TaggingResult,
+)
+from app.inference.llm_models import InferenceRequest, Message
+from app.inference.providers.anthropic import AnthropicProvider
+from app.inference.providers.google import GoogleProvider
+from app.inference.service import E2EEInferenceService
+from app.inference.tasks import _strip_code_fence, task_processor
+
+
+# ========== Fixtures ==========
+
+@pytest.fixture
+def client_public_bytes():
+    """Raw public key of a fresh client ephemeral keypair."""
+    private_key = x25519.X25519PrivateKey.generate()
+    return private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+
+
+@pytest.fixture
+def encryption_key(client_public_bytes):
+    """Shared key derived for the client keypair."""
+    return e2ee_crypto.derive_shared_secret_raw(client_public_bytes)
+
+
+@pytest.fixture(autouse=True)
+def clear_result_cache():
+    """Keep cached task results from leaking between tests."""
+    task_processor._result_cache.clear()
+    yield
+    task_processor._result_cache.clear()
+
+
+# ========== Crypto Tests ==========
+
+def test_derive_shared_secret_matches_raw(client_public_bytes, encryption_key):
+    """Test base64 and raw key derivation agree."""
+    key_b64 = base64.b64encode(client_public_bytes).decode()
+
+    assert e2ee_crypto.derive_shared_secret(key_b64) == encryption_key
+
+
+def test_encrypt_decrypt_roundtrip(encryption_key):
+    """Test base64 wrappers round-trip through the raw methods."""
+    ciphertext, nonce, mac = e2ee_crypto.encrypt_response("héllo wörld", encryption_key)
+
+    assert e2ee_crypto.decrypt_content(ciphertext, nonce, mac, encryption_key) == "héllo wörld"
+
+
+def test_decrypt_tampered_mac_fails(encryption_key):
+    """Test decryption rejects a modified tag."""
+    ciphertext, nonce, mac = e2ee_crypto.encrypt_response_raw(b"secret", encryption_key)
+    bad_mac = bytes([mac[0] ^ 0xFF]) + mac[1:]
+
+    with pytest.raises(DecryptionFailed):
+        e2ee_crypto.decrypt_content_raw(ciphertext, nonce, bad_mac, encryption_key)
+
+
+def test_response_nonces_are_unique(encryption_key):
+    """Test default response nonces never repeat under the same key."""
+    nonces = {e2ee_crypto.encrypt_response_raw(b"x", encryption_key)[1] for _ in range(100)}
+
+    assert len(nonces) == 100
+    assert all(len(nonce) == 12 for nonce in nonces)
+
+
+def test_public_key_info_is_cached():
+    """Test public key info is reused between calls."""
+    assert e2ee_crypto.get_public_key_info() is e2ee_crypto.get_public_key_info()
+
+
+# ========== Model Tests ==========
+
+def test_request_decodes_base64_fields(client_public_bytes, encryption_key):
+    """Test request binary fields are base64-decoded during validation."""
+    ciphertext, nonce, mac = e2ee_crypto.encrypt_response("payload", encryption_key)
+    body = json.dumps({
+        "task": "tagging",
+        "encrypted_content": ciphertext,
+        "nonce": nonce,
+        "mac": mac,
+        "ephemeral_public_key": base64.b64encode(client_public_bytes).decode(),
+        "client_version": "1.0.0",
+    })
+
+    request = E2EEInferenceRequest.model_validate_json(body)
+
+    assert len(request.nonce) == 12
+    assert len(request.mac) == 16
+    plaintext = e2ee_crypto.decrypt_content_raw(
+        request.encrypted_content, request.nonce, request.mac, encryption_key
+    )
+    assert plaintext == b"payload"
+
+
+def test_request_rejects_unknown_task():
+    """Test unknown task names fail validation."""
+    with pytest.raises(ValueError):
+        E2EEInferenceRequest(
+            task="summarize",
+            encrypted_content="AA==",
+            nonce="AA==",
+            mac="AA==",
+            ephemeral_public_key="AA==",
+            client_version="1.0.0",
+        )
+
+
+def test_task_results_validate_from_llm_json():
+    """Test LLM answers validate directly, applying defaults and lowercasing tags."""
+    tagging = TaggingResult.model_validate_json('{"tags": [{"tag": "Work", "confidence": 0.9}]}')
+    metadata = CaptureMetadataResult.model_validate_json(
+        '{"intent": "reminder", "inferredReminderTime": "2026-01-01T14:00:00Z"}'
+    )
+
+    assert tagging.tags[0].tag == "work"
+    assert tagging.confidence == 0.8
+    assert metadata.inferred_reminder_time == "2026-01-01T14:00:00Z"
+    assert metadata.requires_response is False
+    assert metadata.suggested_tags == []
+
+
+def test_task_results_tolerate_unknown_enum_values():
+    """Test unknown memory types are dropped and unknown intents become notes."""
+    memories = MemoryDistillationResult.model_validate_json(
+        '{"memories": [{"type": "fact", "content": "a", "confidence": 0.9},'
+        ' {"type": "goal", "content": "b", "confidence": 0.5}]}'
+    )
+    metadata = CaptureMetadataResult.model_validate_json('{"intent": "rant"}')
+
+    assert [memory.content for memory in memories.memories] == ["a"]
+    assert metadata.intent == CaptureIntent.NOTE
+
+
+# ========== Provider Tests ==========
+
+@pytest.mark.asyncio
+async def test_google_provider_parses_rest_response():
+    """Test Gemini REST response is mapped to InferenceResponse."""
+    captured = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        captured["url"] = str(request.url)
+        captured["body"] = json.loads(request.content)
+        return httpx.Response(200, json={
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": "{\"ok\":"}, {"text": " true}"}]},
+                "finishReason": "STOP",
+            }],
+            "usageMetadata": {"promptTokenCount": 7, "candidatesTokenCount": 3},
+        })
+
+    with patch("app.inference.providers.google.settings") as mock_settings:
+        mock_settings.gemini_api_key = "test_key"
+        provider = GoogleProvider(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    response = await provider.generate(InferenceRequest(
+        messages=[Message(role="user", content="hi")],
+        model="gemini-flash-latest",
+        max_tokens=64,
+        json_mode=True,
+    ))
+
+    assert captured["url"].endswith("/models/gemini-flash-latest:generateContent")
+    assert captured["body"]["generationConfig"]["maxOutputTokens"] == 64
+    assert captured["body"]["generationConfig"]["responseMimeType"] == "application/json"
+    assert response.content == "{\"ok\": true}"
+    assert response.usage.total_tokens == 10
+    assert response.finish_reason == "STOP"
+
+
+@pytest.mark.asyncio
+async def test_anthropic_provider_marks_system_prompt_cacheable():
+    """Test the system prompt is sent as an ephemeral cache block and cache reads are reported."""
+    captured = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        captured["beta"] = request.headers.get("anthropic-beta")
+        captured["body"] = json.loads(request.content)
+        return httpx.Response(200, json={
+            "id": "msg_1",
+            "type": "message",
+            "role": "assistant",
+            "model": "claude-3-haiku-20240307",
+            "content": [{"type": "text", "text": "{}"}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 5, "output_tokens": 1, "cache_read_input_tokens": 1200},
+        })
+
+    with patch("app.inference.providers.anthropic.settings") as mock_settings:
+        mock_settings.anthropic_api_key = "test_key"
+        provider = AnthropicProvider(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    response = await provider.generate(InferenceRequest(
+        messages=[Message(role="system", content="static"), Message(role="user", content="hi")],
+        model="claude-3-haiku-20240307",
+    ))
+
+    assert captured["beta"] == "prompt-caching-2024-07-31"
+    assert captured["body"]["system"] == [
+        {"type": "text", "text": "static", "cache_control": {"type": "ephemeral"}}
+    ]
+    assert captured["body"]["messages"] == [{"role": "user", "content": "hi"}]
+    assert response.usage.cached_input_tokens == 1200
+
+
+# ========== Quota Tests ==========
+
+@pytest.fixture
+def quota_conn():
+    """In-memory database with the ai_usage_quota table."""
+    conn = libsql.connect(":memory:")
+    conn.execute(
+        """
+        CREATE TABLE ai_usage_quota (
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            request_count INTEGER DEFAULT 0,
+            last_reset_at INTEGER NOT NULL,
+            PRIMARY KEY (user_id, date)
+        )
+        """
+    )
+    return conn
+
+
+@pytest.fixture
+def inference_service(quota_conn):
+    """Inference service on a free-tier user with a limit of 2."""
+    mock_master_db = Mock()
+    mock_master_db.connection.return_value = nullcontext(quota_conn)
+    mock_master_db.is_add_on_active.return_value = False
+
+    service = E2EEInferenceService(mock_master_db)
+    service.free_tier_limit = 2
+    return service
+
+
+@pytest.mark.asyncio
+async def test_check_and_update_quota_returns_usage(inference_service):
+    """Test quota increments return the remaining count."""
+    first = await inference_service.check_and_update_quota("user_123")
+    second = await inference_service.check_and_update_quota("user_123")
+
+    assert first.requests_remaining == 1
+    assert second.requests_remaining == 0
+    assert second.tier == "free"
+
+
+@pytest.mark.asyncio
+async def test_check_and_update_quota_exhausted(inference_service):
+    """Test quota stops incrementing at the daily limit."""
+    await inference_service.check_and_update_quota("user_123")
+    await inference_service.check_and_update_quota("user_123")
+
+    with pytest.raises(QuotaExceeded) as exc_info:
+        await inference_service.check_and_update_quota("user_123")
+    assert exc_info.value.usage.requests_remaining == 0
+    usage = await inference_service.get_usage_info("user_123")
+    assert usage.requests_remaining == 0
+
+
+@pytest.mark.asyncio
+async def test_quota_increments_are_persisted(inference_service, quota_conn):
+    """Test in-memory quota increments are written through to the database."""
+    await inference_service.check_and_update_quota("user_123")
+    await inference_service.check_and_update_quota("user_123")
+    await inference_service.flush_quota_writes()
+
+    rows = quota_conn.execute(
+        "SELECT request_count FROM ai_usage_quota WHERE user_id = ?", ["user_123"]
+    ).fetchall()
+    assert rows[0][0] == 2
+
+
+@pytest.mark.asyncio
+async def test_quota_flush_resyncs_from_database(inference_service, quota_conn):
+    """Test a flush adopts a higher stored total written by another worker."""
+    await inference_service.check_and_update_quota("user_123")
+
+    # Another worker already recorded one request today
+    quota_conn.execute(
+        "INSERT INTO ai_usage_quota VALUES (?, ?, 1, 0)",
+        ["user_123", inference_service._quota_day]
+    )
+    quota_conn.commit()
+
+    await inference_service.flush_quota_writes()
+
+    with pytest.raises(QuotaExceeded):
+        await inference_service.check_and_update_quota("user_123")
+
+
+def test_user_tier_is_cached(inference_service):
+    """Test tier lookups hit the database once within the TTL."""
+    inference_service.get_user_tier("user_123")
+    inference_service.get_user_tier("user_123")
+
+    assert inference_service.master_db.is_add_on_active.call_count == 1
+
+
+def test_invalidate_user_tier(inference_service):
+    """Test invalidation picks up a new AI add-on immediately."""
+    assert inference_service.get_user_tier("user_123") == "free"
+
+    inference_service.master_db.is_add_on_active.return_value = True
+    inference_service.invalidate_user_tier("user_123")
+
+    assert inference_service.get_user_tier("user_123") == "paid"
+
+
+# ========== Execution Tests ==========
+
+class FakeProvider:
+    """Provider that returns a fixed tagging answer."""
+
+    async def generate(self, request):
+        return Mock(content='{"tags": [{"tag": "work", "confidence": 0.9}], "confidence": 0.9}')
+
+
+@pytest.mark.asyncio
+async def test_execute_inference_reuses_quota_usage(inference_service, client_public_bytes, encryption_key):
+    """Test the response carries the quota-check usage without re-reading it."""
+    ciphertext, nonce, mac = e2ee_crypto.encrypt_response_raw(b"I had a meeting", encryption_key)
+    request = E2EEInferenceRequest(
+        task="tagging",
+        encrypted_content=base64.b64encode(ciphertext).decode(),
+        nonce=base64.b64encode(nonce).decode(),
+        mac=base64.b64encode(mac).decode(),
+        ephemeral_public_key=base64.b64encode(client_public_bytes).decode(),
+        client_version="1.0.0",
+    )
+
+    with patch.object(task_processor, "_provider", FakeProvider()), \
+            patch.object(task_processor, "_model", "gemini-flash-latest"), \
+            patch.object(inference_service, "get_usage_info") as mock_get_usage:
+        response = await inference_service.execute_inference("user_123", request)
+
+    mock_get_usage.assert_not_called()
+    assert response.usage.requests_remaining == 1
+    plaintext = e2ee_crypto.decrypt_content(
+        response.encrypted_result, response.nonce, response.mac, encryption_key
+    )
+    assert json.loads(plaintext)["tags"][0]["tag"] == "work"
+
+
+@pytest.mark.asyncio
+async def test_execute_inference_batch_reports_items(inference_service, client_public_bytes, encryption_key):
+    """Test batch items succeed, fail decryption, or run past the quota independently."""
+    ciphertext, nonce, mac = e2ee_crypto.encrypt_response_raw(b"I had a meeting", encryption_key)
+
+    def make_request(mac_bytes: bytes) -> E2EEInferenceRequest:
+        return E2EEInferenceRequest(
+            task="tagging",
+            encrypted_content=base64.b64encode(ciphertext).decode(),
+            nonce=base64.b64encode(nonce).decode(),
+            mac=base64.b64encode(mac_bytes).decode(),
+            ephemeral_public_key=base64.b64encode(client_public_bytes).decode(),
+            client_version="1.0.0",
+        )
+
+    batch = E2EEInferenceBatchRequest(
+        requests=[make_request(mac), make_request(bytes(16)), make_request(mac)]
+    )
+
+    with patch.object(task_processor, "_provider", FakeProvider()), \
+            patch.object(task_processor, "_model", "gemini-flash-latest"):
+        response = await inference_service.execute_inference_batch("user_123", batch)
+
+    ok, bad_mac, over_quota = response.results
+    plaintext = e2ee_crypto.decrypt_content(ok.encrypted_result, ok.nonce, ok.mac, encryption_key)
+    assert json.loads(plaintext)["tags"][0]["tag"] == "work"
+    assert bad_mac.error == "decryption_failed"
+    assert over_quota.error == "quota_exceeded"
+    assert response.usage.requests_remaining == 0
+
+
+@pytest.mark.asyncio
+async def test_process_task_skips_trivial_content():
+    """Test whitespace-only content returns an empty result without a provider call."""
+    provider = FakeProvider()
+    with patch.object(task_processor, "_provider", provider), \
+            patch.object(task_processor, "_model", "gemini-flash-latest"), \
+            patch.object(provider, "generate", wraps=provider.generate) as mock_generate:
+        result = await task_processor.process_task("tagging", "  \n ", user_id="user_123")
+
+        with pytest.raises(ValueError, match="Content too long"):
+            await task_processor.process_task("tagging", "x" * 40_000, user_id="user_123")
+
+    mock_generate.assert_not_called()
+    assert json.loads(result) == {"tags": [], "confidence": 0.0}
+
+
+def test_strip_code_fence():
+    """Test fenced answers are unwrapped and bare JSON is returned as-is."""
+    assert _strip_code_fence('```json\n{"a": 1}\n```') == '{"a": 1}'
+    assert _strip_code_fence('```\n{"a": 1}```') == '{"a": 1}'
+    bare = '{"a": 1}'
+    assert _strip_code_fence(bare) is bare
+
+
+def test_log_fingerprint_gated():
+    """Test fingerprints are skipped unless enabled and match for str and bytes."""
+    with patch("app.inference.fingerprint._FINGERPRINT_ENABLED", False):
+        assert log_fingerprint("output") is None
+    with patch("app.inference.fingerprint._FINGERPRINT_ENABLED", True):
+        assert log_fingerprint("output") == log_fingerprint(b"output")
+        assert len(log_fingerprint("output")) == 32
+        assert log_fingerprint("") is None
+
+
+@pytest.mark.asyncio
+async def test_malformed_json_is_repaired_once():
+    """Test a malformed answer gets one zero-temperature repair call."""
+    answers = iter([
+        '{"tags": [{"tag": "work", "confidence": 0.9}]',
+        '{"tags": [{"tag": "work", "confidence": 0.9}]}',
+    ])
+    requests = []
+
+    class RepairProvider:
+        async def generate(self, request):
+            requests.append(request)
+            return Mock(content=next(answers))
+
+    with patch.object(task_processor, "_provider", RepairProvider()), \
+            patch.object(task_processor, "_model", "gemini-flash-latest"):
+        result = json.loads(
+            await task_processor.process_task("tagging", "I had a meeting", user_id="user_123")
+        )
+
+    assert result["tags"] == [{"tag": "work", "confidence": 0.9}]
+    assert len(requests) == 2
+    assert requests[1].temperature == 0.0
+
+
+@pytest.mark.asyncio
+async def test_process_task_caches_result():
+    """Test repeated task + content returns the cached result without a provider call."""
+    provider = FakeProvider()
+    with patch.object(task_processor, "_provider", provider), \
+            patch.object(task_processor, "_model", "gemini-flash-latest"), \
+            patch.object(provider, "generate", wraps=provider.generate) as mock_generate:
+        first = await task_processor.process_task("tagging", "same entry", user_id="user_123")
+        second = await task_processor.process_task("tagging", "same entry", user_id="user_123")
+        await task_processor.process_task("tagging", "other entry", user_id="user_123")
+        await task_processor.process_task("tagging", "same   entry\n", user_id="user_123")
+        await task_processor.process_task("tagging", "Same Entry", user_id="user_123")
+
+    assert first == second
+    assert mock_generate.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_cached_result_not_shared_between_users():
+    """Test identical content from two users costs two provider calls."""
+    provider = FakeProvider()
+    with patch.object(task_processor, "_provider", provider), \
+            patch.object(task_processor, "_model", "gemini-flash-latest"), \
+            patch.object(provider, "generate", wraps=provider.generate) as mock_generate:
+        await task_processor.process_task("tagging", "shared entry", user_id="user_a")
+        await task_processor.process_task("tagging", "shared entry", user_id="user_b")
+        await task_processor.process_task("tagging", "shared entry", user_id="user_a")
+
+    assert mock_generate.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_tasks_share_one_call():
+    """Test identical in-flight requests are coalesced into one provider call."""
+    release = asyncio.Event()
+    calls = []
+
+    class SlowProvider:
+        async def generate(self, request):
+            calls.append(request)
+            await release.wait()
+            return Mock(content='{"tags": [{"tag": "work", "confidence": 0.9}]}')
+
+    with patch.object(task_processor, "_provider", SlowProvider()), \
+            patch.object(task_processor, "_model", "gemini-flash-latest"):
+        pending = [
+            asyncio.ensure_future(
+                task_processor.process_task("tagging", "same entry", user_id="user_123")
+            )
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*pending)
+
+    assert len(calls) == 1
+    assert results[0] == results[1] == results[2]
+    assert not task_processor._inflight
+
+
+@pytest.mark.asyncio
+async def test_process_tasks_bulk_keeps_order_and_errors():
+    """Test bulk processing returns results in order with per-item errors."""
+    with patch.object(task_processor, "_provider", FakeProvider()), \
+            patch.object(task_processor, "_model", "gemini-flash-latest"):
+        results = await task_processor.process_tasks_bulk([
+            ("tagging", "first entry"),
+            ("summarize", "second entry"),
+            ("tagging", "third entry"),
+        ], user_id="user_123")
+
+    assert json.loads(results[0])["tags"][0]["tag"] == "work"
+    assert isinstance(results[1], ValueError)
+    assert results[2] == results[0]
+
+
+class FakeCombinedProvider:
+    """Provider that answers the combined extraction prompt."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, request):
+        self.calls += 1
+        return Mock(content=json.dumps({
+            "memory_distillation": {
+                "memories": [{"type": "commitment", "content": "call mom", "confidence": 0.9}],
+                "confidence": 0.9,
+            },
+            "tagging": {"tags": [{"tag": "Family", "confidence": 0.8}], "confidence": 0.8},
+            "insight_extraction": {"insights": ["Family matters to you."], "confidence": 0.7},
+        }))
+
+
+@pytest.mark.asyncio
+async def test_bulk_fuses_combined_tasks():
+    """Test all three extraction tasks on one entry cost a single provider call."""
+    provider = FakeCombinedProvider()
+    with patch.object(task_processor, "_provider", provider), \
+            patch.object(task_processor, "_model", "gemini-flash-latest"):
+        results = await task_processor.process_tasks_bulk([
+            ("memory_distillation", "I will call mom"),
+            ("tagging", "I will call mom"),
+            ("insight_extraction", "I will call mom"),
+        ], user_id="user_123")
+
+    assert provider.calls == 1
+    assert json.loads(results[0])["memories"][0]["type"] == "commitment"
+    assert json.loads(results[1])["tags"][0]["tag"] == "family"
+    assert json.loads(results[2])["insights"] == ["Family matters to you."]
+
+
+# ========== Route Tests ==========
+
+def test_quota_exceeded_maps_to_429():
+    """Test the 429 response reuses the usage carried by QuotaExceeded."""
+    from fastapi import HTTPException
+    from app.inference.models import UsageInfo
+    from app.inference.routes import _raise_inference_http_error
+
+    usage = UsageInfo(requests_remaining=0, reset_at="2026-01-02T00:00:00Z", tier="free")
+    request = Mock(task="tagging")
+
+    with pytest.raises(HTTPException) as exc_info:
+        _raise_inference_http_error("user_123", "device_1", request, QuotaExceeded(usage))
+
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.detail["usage"]["reset_at"] == "2026-01-02T00:00:00Z"
+
+
+# ========== Streaming Tests ==========
+
+class FakeStreamingProvider:
+    """Provider that streams a fixed JSON answer in two chunks."""
+
+    async def generate_stream(self, request):
+        yield '{"tags": [{"tag": "work", ', None
+        yield '"confidence": 0.9}], "confidence": 0.9}', None
+        yield "", None
+
+
+@pytest.mark.asyncio
+async def test_inference_stream_frames_decrypt(inference_service, client_public_bytes, encryption_key):
+    """Test streamed frames decrypt to the deltas followed by the final result."""
+    ciphertext, nonce, mac = e2ee_crypto.encrypt_response_raw(b"I had a meeting", encryption_key)
+    request = E2EEInferenceRequest(
+        task="tagging",
+        encrypted_content=base64.b64encode(ciphertext).decode(),
+        nonce=base64.b64encode(nonce).decode(),
+        mac=base64.b64encode(mac).decode(),
+        ephemeral_public_key=base64.b64encode(client_public_bytes).decode(),
+        client_version="1.0.0",
+    )
+
+    with patch.object(task_processor, "_provider", FakeStreamingProvider()), \
+            patch.object(task_processor, "_model", "gemini-flash-latest"):
+        frames = await inference_service.start_inference_stream("user_123", request)
+        lines = [json.loads(line) async for line in frames]
+
+    assert [frame["type"] for frame in lines] == ["delta", "delta", "result"]
+    assert len({frame["nonce"] for frame in lines}) == 3
+    plaintexts = [
+        e2ee_crypto.decrypt_content(f["encrypted_result"], f["nonce"], f["mac"], encryption_key)
+        for f in lines
+    ]
+    assert json.loads(plaintexts[-1])["tags"][0]["tag"] == "work"
+    assert lines[-1]["usage"]["requests_remaining"] == 1
@@ -0,0 +1,368 @@
+"""
+Tests for the master database manager.
+
+Tests token caching and the schema, queries and connection pool against a
+temporary local SQLite file (MASTER_DB_URL).
+"""
+import asyncio
+import base64
+import json
+import os
+import time
+from contextlib import nullcontext
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+# Set required environment variables for tests
+os.environ.setdefault("TURSO_ORG_URL", "test.turso.io")
+os.environ.setdefault("TURSO_AUTH_TOKEN", "test_token")
+os.environ.setdefault("JWT_SECRET", "test_jwt_secret_for_testing_only")
+
+from app.config import settings
+from app.master_db import (
+    BULK_ADD_ON_ROWS,
+    MasterDatabaseManager,
+    TOKEN_REFRESH_MARGIN_SECONDS,
+    _MIGRATION_V001_SQL,
+    _MIGRATION_V001_STATEMENTS,
+    _MIGRATION_V002_STATEMENTS,
+    _jwt_expiry,
+)
+
+
+def _make_jwt(exp: float) -> str:
+    """Unsigned JWT carrying only an exp claim."""
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).rstrip(b"=")
+    return f"header.{payload.decode()}.signature"
+
+
+# ========== Fixtures ==========
+
+@pytest.fixture
+def master_db(tmp_path, monkeypatch):
+    """Master database manager on a temporary local SQLite file."""
+    monkeypatch.setattr(settings, "master_db_url", str(tmp_path / "master.db"))
+    monkeypatch.setattr(settings, "master_db_auth_token", "local_token")
+    manager = MasterDatabaseManager()
+    yield manager
+    manager.close_connection()
+
+
+@pytest.fixture
+def migrated_master_db(master_db):
+    """Master database manager with the schema applied."""
+    master_db.get_connection()
+    return master_db
+
+
+@pytest.fixture
+def minting_master_db(monkeypatch):
+    """Master database manager without a configured DB token."""
+    monkeypatch.setattr(settings, "master_db_auth_token", None)
+    return MasterDatabaseManager()
+
+
+# ========== Token Tests ==========
+
+def test_jwt_expiry_reads_exp_claim():
+    """Test the exp claim is read and unreadable tokens assume one day."""
+    assert _jwt_expiry(_make_jwt(1_900_000_000)) == 1_900_000_000
+    assert _jwt_expiry("not-a-jwt") == pytest.approx(time.time() + 86400, abs=5)
+
+
+def test_cached_token_refreshes_near_expiry(minting_master_db):
+    """Test a minted token is reused until it is within the refresh margin."""
+    fresh = _make_jwt(time.time() + 3600)
+    minting_master_db._remember_token(fresh)
+    assert minting_master_db._cached_token() == fresh
+    assert not minting_master_db._token_expiring()
+
+    minting_master_db._remember_token(_make_jwt(time.time() + TOKEN_REFRESH_MARGIN_SECONDS - 1))
+    assert minting_master_db._cached_token() is None
+    assert minting_master_db._token_expiring()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_token_requests_mint_once(minting_master_db):
+    """Test concurrent callers share a single mint."""
+    mints = []
+
+    async def fake_mint():
+        mints.append(1)
+        await asyncio.sleep(0)
+        return minting_master_db._remember_token(_make_jwt(time.time() + 3600))
+
+    with patch.object(minting_master_db, "_mint_token_async", fake_mint):
+        tokens = await asyncio.gather(
+            *(minting_master_db._generate_db_token() for _ in range(5))
+        )
+
+    assert len(mints) == 1
+    assert len(set(tokens)) == 1
+    assert minting_master_db._token_generation == 1
+
+
+@pytest.mark.asyncio
+async def test_create_master_database_mints_after_creating(tmp_path, monkeypatch):
+    """Test the token is minted only after POST /databases, then the schema is applied."""
+    monkeypatch.setattr(settings, "master_db_url", str(tmp_path / "master.db"))
+    monkeypatch.setattr(settings, "master_db_auth_token", None)
+    manager = MasterDatabaseManager()
+    calls = []
+
+    async def create_database(url, **kwargs):
+        calls.append("create")
+        return Mock(status_code=201)
+
+    def mint_token(url, **kwargs):
+        calls.append("mint")
+        return Mock(status_code=200, json=lambda: {"jwt": _make_jwt(time.time() + 3600)})
+
+    http_client = Mock(post=AsyncMock(side_effect=create_database))
+    with patch("app.master_db.get_http_client", return_value=http_client), \
+            patch("app.master_db._TOKEN_HTTP_CLIENT") as token_client:
+        token_client.post.side_effect = mint_token
+        assert await manager.create_master_database()
+
+    try:
+        assert calls == ["create", "mint"]
+        with manager.connection() as conn:
+            assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone() == (2,)
+    finally:
+        manager.close_connection()
+
+
+# ========== Connection Pool Tests ==========
+
+def test_pool_reuses_returned_connection(master_db):
+    """Test the last returned connection is checked out again, nested blocks get their own."""
+    with master_db.connection() as first:
+        with master_db.connection() as nested:
+            assert nested is not first
+    with master_db.connection() as again:
+        assert again is first
+
+
+def test_pool_rolls_back_open_transaction_on_checkin(master_db):
+    """Test a connection returned mid-transaction is rolled back, not reused dirty."""
+    with master_db.connection() as conn:
+        conn.execute("CREATE TABLE pool_test (value INTEGER)")
+        conn.commit()
+
+    with master_db.connection() as conn:
+        conn.execute("INSERT INTO pool_test VALUES (1)")
+        assert conn.in_transaction
+
+    with master_db.connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM pool_test").fetchone() == (0,)
+
+
+def test_pool_closes_connections_from_old_token(master_db):
+    """Test connections opened before a token refresh are closed, not reused."""
+    with patch.object(master_db, "_close_quietly") as mock_close:
+        with master_db.connection() as checked_out:
+            with master_db.connection() as idle:
+                pass
+            master_db._token_generation += 1
+
+        mock_close.assert_called_once_with(checked_out)
+
+        with master_db.connection() as fresh:
+            assert fresh is not idle
+        assert mock_close.call_count == 2
+        mock_close.assert_called_with(idle)
+
+
+# ========== Migration Tests ==========
+
+def test_migrations_create_schema(master_db):
+    """Test a fresh database gets every table and the initial schema version."""
+    conn = master_db.get_connection()
+    tables = {
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall()
+    }
+    version = conn.execute("SELECT MIN(version) FROM schema_version").fetchone()
+
+    assert {"users", "user_devices", "user_add_ons", "receipts", "ai_usage_quota"} <= tables
+    assert version == (1,)
+
+
+def test_migration_statements_split_at_import():
+    """Test migrations are pre-split into one statement per execute call."""
+    assert len(_MIGRATION_V001_STATEMENTS) == _MIGRATION_V001_SQL.count(";")
+    assert len(_MIGRATION_V002_STATEMENTS) == 1
+    assert _MIGRATION_V002_STATEMENTS[0].endswith("VALUES (2, strftime('%s', 'now'))")
+
+
+def test_failed_migration_rolls_back(master_db):
+    """Test a failing statement undoes the statements before it."""
+    conn = master_db.get_connection()
+
+    with pytest.raises(Exception):
+        MasterDatabaseManager._execute_statements(conn, (
+            "CREATE TABLE half_applied (value INTEGER)",
+            "INSERT INTO missing_table VALUES (1)",
+        ))
+
+    assert not conn.in_transaction
+    assert conn.execute(
+        "SELECT name FROM sqlite_master WHERE name = 'half_applied'"
+    ).fetchall() == []
+
+
+# ========== Add-On Tests ==========
+
+def _activate(master_db, user_id, add_on_type, expires_at=None):
+    """Activate an add-on bought on iOS."""
+    master_db.activate_add_on(
+        user_id=user_id, add_on_type=add_on_type, platform="ios",
+        product_id=f"echolia.{add_on_type}", transaction_id=f"txn_{add_on_type}",
+        original_transaction_id=None, purchase_date=1700000000,
+        expires_at=expires_at, auto_renew=expires_at is not None,
+    )
+
+
+def test_add_on_flags_aggregate_matches_details(migrated_master_db):
+    """Test the one-row flags query agrees with the per-add-on rows."""
+    migrated_master_db.create_user("user_1", "google", "sub_1")
+    _activate(migrated_master_db, "user_1", "sync", expires_at=int(time.time()) + 3600)
+    _activate(migrated_master_db, "user_1", "ai", expires_at=int(time.time()) - 3600)
+    _activate(migrated_master_db, "user_1", "supporter")
+
+    flags = migrated_master_db.get_user_add_ons("user_1", include_details=False)
+    detailed = migrated_master_db.get_user_add_ons("user_1")
+
+    assert flags == {"sync_enabled": True, "ai_enabled": False, "supporter": True, "details": []}
+    assert len(detailed.pop("details")) == 3
+    assert detailed == {k: v for k, v in flags.items() if k != "details"}
+
+
+def test_add_on_flags_without_add_ons(migrated_master_db):
+    """Test a user with no add-on rows gets every flag off."""
+    migrated_master_db.create_user("user_1", "google", "sub_1")
+
+    flags = migrated_master_db.get_user_add_ons("user_1", include_details=False)
+
+    assert flags == {"sync_enabled": False, "ai_enabled": False, "supporter": False, "details": []}
+
+
+# ========== Lookup Tests ==========
+
+def test_user_lookups_return_dict_or_none(migrated_master_db):
+    """Test point lookups map the single row to a dict and a miss to None."""
+    migrated_master_db.create_user("user_1", "apple", "sub_1", email="a@example.com")
+
+    user = migrated_master_db.get_user("user_1")
+    assert user["provider"] == "apple"
+    assert user["email"] == "a@example.com"
+    assert user["name"] is None
+    assert migrated_master_db.get_user_by_provider("apple", "sub_1") == user
+
+    assert migrated_master_db.get_user("missing") is None
+    assert migrated_master_db.get_user_by_provider("google", "sub_1") is None
+
+
+def test_is_add_on_active_lookup(migrated_master_db):
+    """Test the add-on point lookup reads status and expiry from one row."""
+    migrated_master_db.create_user("user_1", "google", "sub_1")
+    _activate(migrated_master_db, "user_1", "ai", expires_at=int(time.time()) - 3600)
+    _activate(migrated_master_db, "user_1", "sync")
+
+    assert migrated_master_db.is_add_on_active("user_1", "sync")
+    assert not migrated_master_db.is_add_on_active("user_1", "ai")
+    assert not migrated_master_db.is_add_on_active("user_1", "supporter")
+
+
+def test_invalidate_add_ons_drops_only_that_user(migrated_master_db):
+    """Test invalidation forgets one user's cached status and keeps the rest."""
+    for user_id in ("user_1", "user_2"):
+        migrated_master_db.create_user(user_id, "google", f"sub_{user_id}")
+        migrated_master_db.is_add_on_active(user_id, "sync")
+        migrated_master_db.is_add_on_active(user_id, "ai")
+
+    migrated_master_db.invalidate_add_ons("user_1")
+
+    assert set(migrated_master_db._add_on_cache) == {("user_2", "sync"), ("user_2", "ai")}
+
+
+class CountingConnection:
+    """Connection wrapper counting executed statements and commits."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.statements = []
+        self.commits = 0
+
+    def execute(self, sql, *args):
+        self.statements.append(sql)
+        return self._conn.execute(sql, *args)
+
+    def commit(self):
+        self.commits += 1
+        self._conn.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def test_bulk_activation_writes_chunks_in_one_commit(migrated_master_db):
+    """Test bulk activation chunks the UPSERT, commits once and drops cached status."""
+    user_ids = [f"user_{i}" for i in range(2 * BULK_ADD_ON_ROWS + 15)]
+    for user_id in user_ids:
+        migrated_master_db.create_user(user_id, "google", f"sub_{user_id}")
+    assert not migrated_master_db.is_add_on_active("user_0", "ai")
+
+    activations = [
+        {
+            "user_id": user_id, "add_on_type": "ai", "platform": "ios",
+            "product_id": "echolia.ai", "transaction_id": f"txn_{user_id}",
+            "purchase_date": 1700000000, "expires_at": int(time.time()) + 3600,
+            "auto_renew": True,
+        }
+        for user_id in user_ids
+    ]
+    with migrated_master_db.connection() as conn:
+        counting = CountingConnection(conn)
+        with patch.object(migrated_master_db, "connection", return_value=nullcontext(counting)), \
+                patch("app.inference.service.invalidate_user_tier") as mock_invalidate_tier:
+            written = migrated_master_db.activate_add_ons_bulk(activations)
+
+    upserts = [sql for sql in counting.statements if "INSERT INTO user_add_ons" in sql]
+    assert written == len(user_ids)
+    assert len(upserts) == 3
+    assert counting.commits == 1
+    assert {c.args[0] for c in mock_invalidate_tier.call_args_list} == set(user_ids)
+    assert ("user_0", "ai") not in migrated_master_db._add_on_cache
+    assert migrated_master_db.is_add_on_active("user_0", "ai")
+    with migrated_master_db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM user_add_ons").fetchone() == (len(user_ids),)
+
+
+def test_activation_refreshes_cached_status(migrated_master_db):
+    """Test a cached inactive status is replaced once the add-on is activated."""
+    migrated_master_db.create_user("user_1", "google", "sub_1")
+    assert not migrated_master_db.is_add_on_active("user_1", "sync")
+
+    _activate(migrated_master_db, "user_1", "sync")
+
+    assert migrated_master_db.is_add_on_active("user_1", "sync")
+
+
+# ========== PRAGMA Tests ==========
+
+def test_local_master_db_gets_pragmas(master_db):
+    """Test a local master DB file is opened in WAL mode with foreign keys on."""
+    with master_db.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        assert conn.execute("PRAGMA foreign_keys").fetchone() == (1,)
+
+
+def test_remote_master_db_skips_pragmas(monkeypatch):
+    """Test a hosted master DB URL gets no local PRAGMA tuning."""
+    monkeypatch.setattr(settings, "master_db_url", "libsql://echolia-master.turso.io")
+
+    assert MasterDatabaseManager()._local_pragmas == ()
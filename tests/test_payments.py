@@ -5,7 +5,7 @@ Tests receipt verification, add-on activation, and webhook handling.
 """
 import pytest
 import os
-from unittest.mock import Mock, AsyncMock, patch
+from unittest.mock import Mock, MagicMock, AsyncMock, patch
 from fastapi import HTTPException
 
 # Set required environment variables for tests
@@ -31,7 +31,7 @@ from app.add_ons.models import AddOnType, Platform
 def mock_master_db():
     """Mock master database manager."""
     mock_db = Mock()
-    mock_db.get_connection.return_value = Mock()
+    mock_db.connection.return_value = MagicMock()
     return mock_db
 
 
@@ -112,7 +112,8 @@ async def test_verify_and_activate_ios_sync_subscription(
     )
 
     # Mock receipt not already verified
-    mock_master_db.get_connection.return_value.execute.return_value.rows = []
+    conn = mock_master_db.connection.return_value.__enter__.return_value
+    conn.execute.return_value.fetchall.return_value = []
 
     # Mock add-on activation
     mock_add_ons_service.activate_add_on.return_value = True
@@ -157,7 +158,8 @@ async def test_verify_and_activate_android_ai_subscription(
     )
 
     # Mock receipt not already verified
-    mock_master_db.get_connection.return_value.execute.return_value.rows = []
+    conn = mock_master_db.connection.return_value.__enter__.return_value
+    conn.execute.return_value.fetchall.return_value = []
 
     # Mock add-on activation
     mock_add_ons_service.activate_add_on.return_value = True
@@ -197,7 +199,8 @@ async def test_verify_and_activate_supporter_purchase(
     )
 
     # Mock receipt not already verified
-    mock_master_db.get_connection.return_value.execute.return_value.rows = []
+    conn = mock_master_db.connection.return_value.__enter__.return_value
+    conn.execute.return_value.fetchall.return_value = []
 
     # Mock add-on activation
     mock_add_ons_service.activate_add_on.return_value = True
@@ -264,9 +267,8 @@ async def test_verify_already_verified_receipt(
     )
 
     # Mock receipt already exists in database
-    mock_result = Mock()
-    mock_result.rows = [("receipt_id_123",)]
-    mock_master_db.get_connection.return_value.execute.return_value = mock_result
+    conn = mock_master_db.connection.return_value.__enter__.return_value
+    conn.execute.return_value.fetchall.return_value = [("receipt_id_123",)]
 
     # Create request
     request = VerifyReceiptRequest(
@@ -326,7 +328,8 @@ async def test_verify_add_on_activation_fails(
     )
 
     # Mock receipt not already verified
-    mock_master_db.get_connection.return_value.execute.return_value.rows = []
+    conn = mock_master_db.connection.return_value.__enter__.return_value
+    conn.execute.return_value.fetchall.return_value = []
 
     # Mock add-on activation failing
     mock_add_ons_service.activate_add_on.return_value = False